@@ -0,0 +1,58 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from dateutil.tz import UTC
+
+from src.bo.Trade import Trade
+from src.bo.Transaction import Transaction, TransactionType
+
+
+def create_transaction(transaction_type, currency, amount, converted_amount, timestamp):
+    transaction = Transaction()
+    transaction.type = transaction_type
+    transaction.currency = currency
+    transaction.amount = amount
+    transaction.converted_amount = converted_amount
+    transaction.timestamp = timestamp
+    return transaction
+
+
+def create_trade(index, timestamp, sell, buy, fee):
+    """
+    Creates a trade (not persisted).
+    :param sell: tuple (currency, amount, converted amount), the same for buy and fee
+    """
+
+    return Trade(str(index), timestamp, [create_transaction(TransactionType.SELL, *sell, timestamp),
+                                         create_transaction(TransactionType.BUY, *buy, timestamp),
+                                         create_transaction(TransactionType.FEE, *fee, timestamp)])
+
+
+def create_history(count, buy_share=0.6, seed=42):
+    """
+    Creates a synthetic trade history of EUR / BTC trades, one per minute, with random prices, amounts and fees.
+    :param count: the number of trades
+    :param buy_share: the probability of a trade to be a buy
+    :return: list of trades, sorted by time
+    """
+
+    rng = random.Random(seed)
+    timestamp = datetime(2017, 1, 1, tzinfo=UTC)
+    trades = []
+
+    for index in range(count):
+        price = Decimal(rng.randint(100000, 9999999)).scaleb(-3)
+        amount = Decimal(rng.randint(1, 10 ** 8)).scaleb(-8)
+        value = (amount * price).quantize(Decimal('1E-8'))
+        if rng.random() < buy_share:
+            fee = Decimal(rng.randint(0, 10 ** 6)).scaleb(-4)
+            trades.append(create_trade(index, timestamp, ('EUR', value, value), ('BTC', amount, value),
+                                       ('EUR', fee, fee)))
+        else:
+            fee = Decimal('0.00001')
+            trades.append(create_trade(index, timestamp, ('BTC', amount, value), ('EUR', value, value),
+                                       ('BTC', fee, (fee * price).quantize(Decimal('1E-8')))))
+        timestamp += timedelta(minutes=1)
+
+    return trades
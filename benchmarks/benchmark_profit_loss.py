@@ -0,0 +1,49 @@
+import argparse
+import gc
+import time
+
+from benchmarks.SyntheticHistory import create_history
+from src.BalanceQueue import BalanceQueue, QueueType
+
+
+def run(trades, fixed_point):
+    """
+    Simulates the trades on a new queue and calculates the profit / loss of every sale (which needs all other values
+    of the sale).
+    :return: tuple (seconds, sum of profit / loss)
+    """
+
+    queue = BalanceQueue(QueueType.FIFO, True, fixed_point)
+    total = 0
+
+    gc.collect()
+    gc.disable()  # like timeit, so that collections of the other run's garbage do not count
+    try:
+        start = time.perf_counter()
+        for trade in trades:
+            total += queue.trade(trade).pl
+        return time.perf_counter() - start, total
+    finally:
+        gc.enable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the Decimal and the fixed point profit / loss '
+                                                 'calculation on a synthetic trade history.')
+    parser.add_argument('-n', '--trades', type=int, default=100000, help='number of trades (default: 100000)')
+    arguments = parser.parse_args()
+
+    results = {}
+    for fixed_point in (False, True):
+        trades = create_history(arguments.trades)  # fresh trades, so that no run profits from the other
+        results[fixed_point] = run(trades, fixed_point)
+
+    (decimal_seconds, decimal_total), (fixed_point_seconds, fixed_point_total) = results[False], results[True]
+    print(f'{arguments.trades} trades')
+    print(f'Decimal:     {decimal_seconds:.2f} s')
+    print(f'fixed point: {fixed_point_seconds:.2f} s ({decimal_seconds / fixed_point_seconds:.1f}x)')
+    print(f'identical results: {decimal_total == fixed_point_total}')
+
+
+if __name__ == '__main__':
+    main()
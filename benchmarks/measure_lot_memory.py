@@ -0,0 +1,46 @@
+import argparse
+import gc
+import tracemalloc
+
+from benchmarks.SyntheticHistory import create_history
+from src.BalanceQueue import BalanceQueue, QueueType
+from src.bo.Transaction import TransactionType
+
+
+def measure_lot_memory(count):
+    """
+    Buys the amounts of a synthetic history into a balance queue and measures the memory taken by the queue.
+    The trades (with their transaction index) are created before the measurement, so only the open lots and the
+    queue itself are counted.
+    :return: bytes per open lot
+    """
+
+    trades = create_history(count, buy_share=1)
+    for trade in trades:
+        trade.get_transaction(TransactionType.BUY)
+    queue = BalanceQueue(QueueType.FIFO, True)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    for trade in trades:
+        queue.trade(trade)
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the memory per open lot of the balance queue.')
+    parser.add_argument('-n', '--lots', type=int, default=50000, help='number of open lots (default: 50000)')
+    arguments = parser.parse_args()
+
+    print(f'{measure_lot_memory(arguments.lots):.0f} bytes per open lot ({arguments.lots} lots)')
+
+
+if __name__ == '__main__':
+    main()
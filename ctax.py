@@ -2,7 +2,9 @@ import argparse
 import logging
 
 from src.Application import init_logging, init_db, save_orders, load_orders, find_exchange_rates, \
-    delete_transaction_data, delete_exchange_rate_data, calculate_profit_loss, import_files
+    delete_transaction_data, delete_exchange_rate_data, calculate_profit_loss, import_files, \
+    compile_exchange_rate_snapshots, compare_profit_loss, calculate_daily_balances
+from src.BalanceQueue import QueueType
 from src.Configuration import Configuration
 
 
@@ -12,9 +14,33 @@ def get_command_line_arguments():
 
     subparsers.add_parser('import-trades', help='import trades')
     subparsers.add_parser('import-exchange-rates', help='import exchange rates for all transactions')
+    subparsers.add_parser('compile-exchange-rates', help='compile snapshots of the exchange rate files')
     parser_calculate_profit = subparsers.add_parser('calculate-profit', help='calculate profit / loss')
 
     parser_calculate_profit.add_argument('-o', '--output-file', help='output file')
+    parser_calculate_profit.add_argument('--resume', action='store_true',
+                                         help='start from the balance snapshot saved for the end of the year before')
+    parser_calculate_profit.add_argument('--save-snapshot', action='store_true',
+                                         help='save a balance snapshot for the end of the tax year')
+    parser_calculate_profit.add_argument('--ledger-file',
+                                         help='export the ledger (and its buy items next to it) to this file')
+    parser_calculate_profit.add_argument('--ledger-format', choices=('parquet', 'arrow'), default='parquet',
+                                         help='format of the ledger export (default: parquet)')
+    parser_calculate_profit.add_argument('--open-positions', action='store_true',
+                                         help='report the open positions at the end of the tax year with their '
+                                              'market value and unrealised profit / loss')
+
+    parser_compare_profit = subparsers.add_parser('compare-profit',
+                                                  help='compare profit / loss of several queue types')
+    parser_compare_profit.add_argument('-q', '--queue-types', nargs='+', choices=QueueType.__members__,
+                                       help='queue types to compare (default: all)')
+    parser_compare_profit.add_argument('--details', action='store_true',
+                                       help='output profit / loss of each trade for every queue type')
+
+    parser_daily_balances = subparsers.add_parser('daily-balances',
+                                                  help='calculate the balances at the end of every day of the '
+                                                       'tax year')
+    parser_daily_balances.add_argument('-o', '--output-file', required=True, help='output file')
 
     return parser.parse_args()
 
@@ -43,10 +69,30 @@ if __name__ == "__main__":
         delete_exchange_rate_data(session)
         find_exchange_rates(session, orders, configuration)
 
+    elif mode == 'compile-exchange-rates':
+
+        logging.info('compiling exchange rate snapshots')
+        compile_exchange_rate_snapshots(configuration)
+
     elif mode == 'calculate-profit':
 
         logging.info('calculating profit / loss')
         orders = load_orders(session)
-        calculate_profit_loss(orders, configuration, arguments.output_file)
+        calculate_profit_loss(orders, configuration, arguments.output_file, session=session, resume=arguments.resume,
+                              save_snapshot=arguments.save_snapshot, ledger_file=arguments.ledger_file,
+                              ledger_format=arguments.ledger_format, open_positions=arguments.open_positions)
+
+    elif mode == 'compare-profit':
+
+        logging.info('comparing profit / loss')
+        orders = load_orders(session)
+        queue_types = None if arguments.queue_types is None else [QueueType[name] for name in arguments.queue_types]
+        compare_profit_loss(orders, configuration, queue_types, details=arguments.details)
+
+    elif mode == 'daily-balances':
+
+        logging.info('calculating daily balances')
+        orders = load_orders(session)
+        calculate_daily_balances(orders, configuration, arguments.output_file)
 
     logging.info('done')
@@ -2,22 +2,35 @@ import logging
 import os
 import sys
 import time
+from contextlib import ExitStack
 from decimal import Decimal
+from functools import partial
 
 import ccxt
 import sqlalchemy
 from ccxt import NetworkError
+from dateutil.relativedelta import relativedelta
 from sqlalchemy.orm import sessionmaker
 
 from src.BalanceQueue import BalanceQueue, QueueType
 from src.CcxtOrderImporter import CcxtOrderImporter
 from src.CsvOrderImporter import CsvOrderImporter
+from src.CsvReportWriter import CsvReportWriter
+from src.DailyBalances import sweep_daily_balances
 from src.DateUtils import get_start_of_year, get_start_of_year_after, date_and_time_to_string
+from src.ExchangeRateSnapshot import compile_snapshots
+from src.Error import Error
+from src.LedgerWriter import LedgerWriter, is_pyarrow_available, get_buy_items_file
 from src.ExchangeRates import ExchangeRates
 from src.NumberUtils import currency_to_string
+from src.OpenPositions import get_open_positions, value_open_positions, log_open_positions
+from src.ProfitLossSummary import ProfitLossSummary, VALUES, create_summaries
+from src.TradePartitions import calculate_sell_infos
+from src.bo.BalanceSnapshot import BalanceSnapshot
+from src.bo.BalanceSnapshotLot import BalanceSnapshotLot, get_trade_key
 from src.bo.Base import Base
 from src.bo.ExchangeRateSource import ExchangeRateSource
-from src.bo.Order import Order, sort_orders_by_time
+from src.bo.Order import Order, sort_orders_by_time, get_currencies
 from src.bo.Trade import Trade
 from src.bo.Transaction import TransactionType
 
@@ -134,7 +147,7 @@ def delete_transaction_data(session):
     Deletes all the transaction-related data that was imported.
     """
 
-    session.query(Order).delete()
+    session.query(Order).delete()  # balance snapshots are kept, they are linked to the trades when loaded
     session.commit()
     logging.info('deleted all transaction data from DB')
     pass
@@ -181,6 +194,103 @@ def load_trades(session):
     return session.query(Trade)
 
 
+def save_balance_snapshot(session, queue, timestamp):
+    """
+    Persists the open lots of the queue as snapshot at the specified cut-off time,
+    replacing an existing snapshot for the same time.
+    """
+
+    session.query(BalanceSnapshot).filter(BalanceSnapshot.timestamp == timestamp).delete()
+
+    orders = {order.id: order for order in load_orders(session)}
+    lots = [BalanceSnapshotLot(position, currency, amount, orders[trade.order_id], trade)
+            for position, (currency, trade, amount) in enumerate(queue.get_open_lots())]
+    session.add(BalanceSnapshot(timestamp, queue.queue_type.name, lots))
+    session.commit()
+
+    logging.info(f'saved balance snapshot at {date_and_time_to_string(timestamp)} ({len(lots)} open lots)')
+
+
+def load_balance_snapshot(session, timestamp):
+    """
+    Retrieves the latest snapshot with a cut-off time not after the specified time, and links its lots to the
+    imported trades (see BalanceSnapshotLot).
+    :return: snapshot or None if there is none
+    :raises Error: if a lot refers to a trade that is not in the DB (any more) or cannot be told apart
+    """
+
+    snapshot = session.query(BalanceSnapshot) \
+        .filter(BalanceSnapshot.timestamp <= timestamp) \
+        .order_by(BalanceSnapshot.timestamp.desc()) \
+        .first()
+
+    if snapshot is None:
+        return None
+
+    trades = {}  # trade key -> trade, None if the key is ambiguous
+    for order in load_orders(session):
+        for trade in order.trades:
+            key = get_trade_key(order, trade)
+            trades[key] = None if key in trades else trade
+
+    for lot in snapshot.lots:
+        lot.trade = trades.get(lot.trade_key)
+        if lot.trade is None:
+            state = 'ambiguous' if lot.trade_key in trades else 'not imported'
+            raise Error(f'balance snapshot at {date_and_time_to_string(snapshot.timestamp)} does not match the '
+                        f'imported trades: buy trade of {lot.currency} lot is {state} '
+                        f'(exchange: {lot.exchange}, order: {lot.order_source_id}, trade: {lot.trade_source_id}, '
+                        f'timestamp: {date_and_time_to_string(lot.trade_timestamp)})')
+
+    return snapshot
+
+
+def get_queue_type(configuration):
+    """
+    Returns the configured queue type (default: FIFO).
+    """
+
+    name = configuration.get('queue-type', default=QueueType.FIFO.name)
+    if name not in QueueType.__members__:
+        raise Error(f'invalid queue type: {name} (must be one of {", ".join(QueueType.__members__)})')
+    return QueueType[name]
+
+
+def get_holding_period(configuration):
+    """
+    Returns the configured holding period, after which bought amounts can be sold tax free.
+    :return: relativedelta or None if no holding period is configured
+    """
+
+    months = configuration.get('holding-period-months')
+    if months is None:
+        return None
+    if not isinstance(months, int) or isinstance(months, bool) or months < 0:
+        raise Error(f'invalid holding period: {months} (must be a number of months)')
+    return relativedelta(months=months)
+
+
+def create_balance_queue(queue_type, snapshot=None, fixed_point=False, holding_period=None):
+    """
+    Creates a balance queue, restoring the open lots of the snapshot if specified.
+    :param fixed_point: if True, profit / loss is calculated with scaled integers (see SellInfo)
+    :param holding_period: period after which bought amounts can be sold tax free (see SellInfo)
+    """
+
+    queue = BalanceQueue(queue_type, True, fixed_point, holding_period)
+
+    if snapshot is not None:
+
+        if snapshot.queue_type != queue_type.name:
+            raise Error(f'balance snapshot at {date_and_time_to_string(snapshot.timestamp)} was saved with '
+                        f'queue type {snapshot.queue_type}, cannot continue with {queue_type.name}')
+
+        for lot in snapshot.lots:
+            queue.add_open_lot(lot.currency, lot.trade, lot.amount)
+
+    return queue
+
+
 def find_exchange_rates(session, orders, configuration):
     """
     Queries the exchange rates from base / quote currency to tax currency at time of order
@@ -190,122 +300,387 @@ def find_exchange_rates(session, orders, configuration):
     orders = sort_orders_by_time(orders)
 
     tax_currency = configuration.get_mandatory('tax-currency')
-    exchange_rates = ExchangeRates(configuration)
+    with ExchangeRates(configuration, get_currencies(orders) | {tax_currency}) as exchange_rates:
 
-    for order in orders:
-        for trade in order.trades:
+        requests = []
+        requesting_transactions = []
+
+        for order in orders:
+            for trade in order.trades:
+
+                buy = trade.get_transaction(TransactionType.BUY)
+                sell = trade.get_transaction(TransactionType.SELL)
+
+                # base amount * rate = quote amount
+                implicit_exchange_rate = exchange_rates.get_implicit_exchange_rate(buy.currency, sell.currency,
+                                                                                   sell.amount / buy.amount,
+                                                                                   trade.timestamp)
 
-            buy = trade.get_transaction(TransactionType.BUY)
-            sell = trade.get_transaction(TransactionType.SELL)
+                for transaction in trade.transactions:
 
-            implicit_exchange_rate = exchange_rates.get_implicit_exchange_rate(buy.currency, sell.currency,
-                                                                               buy.amount / sell.amount,
-                                                                               trade.timestamp)
+                    # use the trade's exchange rate if possible
+                    if implicit_exchange_rate.can_convert(transaction.currency, tax_currency):
+                        set_exchange_rate(transaction, implicit_exchange_rate,
+                                          implicit_exchange_rate.get_rate(transaction.currency, tax_currency))
+                    else:
+                        requests.append((transaction.currency, tax_currency, transaction.timestamp))
+                        requesting_transactions.append(transaction)
 
-            for transaction in trade.transactions:
+        # all other exchange rates are fetched and looked up in one batch
+        exchange_rates.prefetch_exchange_rates(requests)
+        results = exchange_rates.get_exchange_rates(requests)
 
-                # use the trade's exchange rate if possible
-                if implicit_exchange_rate.can_convert(transaction.currency, tax_currency):
-                    exchange_rate = implicit_exchange_rate
-                else:
-                    exchange_rate = exchange_rates.get_exchange_rate(transaction.currency, tax_currency,
-                                                                     transaction.timestamp)
+        for transaction, (exchange_rate, rate) in zip(requesting_transactions, results):
 
-                if exchange_rate is None:
-                    # this HAS to be a fatal error: without exchange rate, we cannot calculate tax
-                    raise MissingDataError(f'no exchange rate found for transaction {transaction}')
+            if exchange_rate is None:
+                # this HAS to be a fatal error: without exchange rate, we cannot calculate tax
+                raise MissingDataError(f'no exchange rate found for transaction {transaction}')
 
-                transaction.exchange_rate = exchange_rate
-                transaction.converted_amount = transaction.amount * exchange_rate.get_rate(transaction.currency,
-                                                                                           tax_currency)
+            set_exchange_rate(transaction, exchange_rate, rate)
 
     session.add_all(orders)
     session.commit()
 
 
-def calculate_profit_loss(orders, configuration, output_file):
+def compile_exchange_rate_snapshots(configuration):
     """
-    Calculates and outputs profit / loss from trades (and related data).
+    Compiles the binary snapshots of all configured exchange rate files, so that subsequent runs can map them
+    instead of parsing the files.
+    """
+
+    compile_snapshots(configuration.get_mandatory('exchange-rate-snapshot-dir'),
+                      configuration.get('exchange-rate-files', default=[]))
+
+
+def set_exchange_rate(transaction, exchange_rate, rate):
     """
+    Sets the exchange rate of the transaction and converts its amount to tax currency.
+    :param rate: the rate to convert from transaction currency to tax currency
+    """
+
+    transaction.exchange_rate = exchange_rate
+    transaction.converted_amount = transaction.amount * rate
+
+
+def calculate_profit_loss(orders, configuration, output_file, session=None, resume=False, save_snapshot=False,
+                          ledger_file=None, ledger_format='parquet', open_positions=False):
+    """
+    Calculates and outputs profit / loss from trades (and related data).
+    :param output_file: CSV file for the report, None to output the report to the log
+    :param session: DB session, needed for snapshots only
+    :param resume: if True, starts from the latest balance snapshot at or before the start of the tax year and
+                   only replays the trades after it
+    :param save_snapshot: if True, saves a balance snapshot at the end of the tax year
+    :param ledger_file: file for the columnar export of the ledger (see LedgerWriter), None for no export
+    :param ledger_format: format of the ledger export, 'parquet' or 'arrow'
+    :param open_positions: if True, also outputs the open positions at the end of the tax year with their market
+                           value and unrealised profit / loss
+    """
+
+    with ExitStack() as stack:
+
+        writer = None
+        if output_file is not None:
+            writer = stack.enter_context(CsvReportWriter(output_file))
+
+        ledger = None
+        if ledger_file is not None:
+            if not is_pyarrow_available():
+                raise Error('pyarrow is required for the ledger export')
+            ledger = stack.enter_context(LedgerWriter(ledger_file, configuration.get_mandatory('tax-currency'),
+                                                      ledger_format))
+
+        summaries = create_summaries(configuration.get_mandatory('tax-currency'),
+                                     configuration.get_mandatory('tax-year'))
+
+        positions = report_profit_loss(orders, configuration, writer, ledger, summaries, session, resume,
+                                       save_snapshot, open_positions)
+
+    for summary in summaries:
+        summary.log()
+
+    if open_positions:
+        tax_currency = configuration.get_mandatory('tax-currency')
+        cut_off = get_start_of_year_after(configuration.get_mandatory('tax-year'))
+        # all currencies are read: cross rates may need currencies that are neither positions nor tax currency
+        with ExchangeRates(configuration) as exchange_rates:
+            value_open_positions(positions, exchange_rates, tax_currency, cut_off)
+        log_open_positions(positions, tax_currency, cut_off)
 
     if output_file is not None:
-        pass
+        logging.info(f'profit / loss report written to {output_file}')
+    if ledger_file is not None:
+        logging.info(f'ledger written to {ledger_file} and {get_buy_items_file(ledger_file)}')
+
+
+def report_profit_loss(orders, configuration, writer, ledger, summaries, session, resume, save_snapshot,
+                       open_positions=False):
+    """
+    Calculates profit / loss and outputs the report (see calculate_profit_loss).
+    :param writer: report writer, None to output the report to the log
+    :param ledger: ledger writer, None for no ledger export
+    :param summaries: summaries (see ProfitLossSummary) that are fed with every trade
+    :param open_positions: if True, collects the open positions at the end of the tax year
+    :return: dictionary currency -> OpenPosition at the end of the tax year (not valued yet), None if open
+             positions were not requested
+    """
 
     orders = sort_orders_by_time(orders)
 
     tax_currency = configuration.get_mandatory('tax-currency')
 
-    logging.info(f'date / time, '
-                 f'order id, '
-                 f'trade id, '
-                 f'sell amount, '
-                 f'sell currency, '
-                 f'sell exchange rate vs {tax_currency}, '
-                 f'sell exchange rate date / time, '
-                 f'sell exchange rate source, '
-                 f'sell value in {tax_currency}, '
-                 f'buy amount, '
-                 f'buy currency, '
-                 f'buy exchange rate vs {tax_currency}, '
-                 f'buy exchange rate date / time, '
-                 f'buy exchange rate source, '
-                 f'buy value in {tax_currency}, '
-                 f'fee amount, '
-                 f'fee currency, '
-                 f'fee exchange rate vs {tax_currency}, '
-                 f'fee exchange rate date / time, '
-                 f'fee exchange rate source, '
-                 f'fee value in {tax_currency}, '
-                 f'FIFO entries, '
-                 f'cost {tax_currency}, '
-                 f'buying fees {tax_currency}, '
-                 f'cost + buying fees {tax_currency}, '
-                 f'proceeds {tax_currency}, '
-                 f'selling fees {tax_currency}, '
-                 f'proceeds - selling fees {tax_currency}, '
-                 f'profit / loss {tax_currency}')
-
-    queue = BalanceQueue(tax_currency, QueueType.FIFO)
+    queue_type = get_queue_type(configuration)
+    log_header(tax_currency, queue_type, writer)
+
+    tax_year = configuration.get_mandatory('tax-year')
+    snapshot = None
+
+    if resume:
+        snapshot = load_balance_snapshot(session, get_start_of_year(tax_year))
+        if snapshot is None:
+            logging.info('no balance snapshot found, starting with the first trade')
+        else:
+            logging.info(f'starting with balance snapshot at {date_and_time_to_string(snapshot.timestamp)}')
+
+    queue = create_balance_queue(queue_type, snapshot,
+                                 configuration.is_true('fixed-point-arithmetic'), get_holding_period(configuration))
+
+    trades = [(order, trade) for order in orders for trade in order.trades]
+
+    if snapshot is not None:  # the snapshot contains the effects of all earlier trades
+        trades = [(order, trade) for order, trade in trades if trade.timestamp >= snapshot.timestamp]
+
+    workers = configuration.get('parallel-workers')
+    pool_per_exchange = configuration.is_true('pool-per-exchange')
+
+    if workers is not None or pool_per_exchange:  # one queue per group of trades that do not share balances
+        if resume or save_snapshot:
+            raise Error('balance snapshots cannot be used with parallel-workers or pool-per-exchange')
+        if open_positions:
+            raise Error('open positions cannot be reported with parallel-workers or pool-per-exchange')
+        create_queue = partial(BalanceQueue, queue_type, True, configuration.is_true('fixed-point-arithmetic'),
+                               get_holding_period(configuration))
+        sell_infos = calculate_sell_infos(trades, create_queue, pool_per_exchange, workers)
+        for (order, trade), sell_info in zip(trades, sell_infos):
+            log_trade(order, trade, sell_info, tax_currency, writer, ledger, summaries)
+    elif save_snapshot or open_positions:  # all trades before the cut-off have to be processed at the cut-off
+        cut_off = get_start_of_year_after(tax_year)
+        trades_before = [(order, trade) for order, trade in trades if trade.timestamp < cut_off]
+        trades_after = [(order, trade) for order, trade in trades if trade.timestamp >= cut_off]
+        log_trades(queue, trades_before, tax_currency, writer, ledger, summaries)
+        if save_snapshot:
+            save_balance_snapshot(session, queue, cut_off)
+        positions = get_open_positions(queue, tax_currency) if open_positions else None
+        log_trades(queue, trades_after, tax_currency, writer, ledger, summaries)
+        return positions
+    else:
+        log_trades(queue, trades, tax_currency, writer, ledger, summaries)
+
+    return None
+
+
+def calculate_daily_balances(orders, configuration, output_file):
+    """
+    Calculates the balance of every currency at the end of every day of the tax year, in a single pass over the
+    trades, values the balances in tax currency and writes them to a CSV file (see DailyBalances.get_rows).
+    """
+
+    orders = sort_orders_by_time(orders)
+
+    tax_currency = configuration.get_mandatory('tax-currency')
+    tax_year = configuration.get_mandatory('tax-year')
+
+    trades = [(order, trade) for order in orders for trade in order.trades]
+    queue = create_balance_queue(get_queue_type(configuration), None, configuration.is_true('fixed-point-arithmetic'))
+    daily_balances = sweep_daily_balances(trades, queue, tax_year)
+
+    # all currencies are read: cross rates may need currencies that have no balance and are not the tax currency
+    with ExchangeRates(configuration) as exchange_rates:
+        daily_balances.value(exchange_rates, tax_currency)
+
+    with CsvReportWriter(output_file) as writer:
+        for row in daily_balances.get_rows():
+            writer.write_row(row)
+
+    logging.info(f'daily balances written to {output_file}')
+
+
+def compare_profit_loss(orders, configuration, queue_types=None, details=False):
+    """
+    Calculates profit / loss with several queue types in a single pass over the trades and outputs the totals
+    of the tax year side by side. Sales of the tax currency (i.e. purchases with it) are not included in the totals.
+    :param queue_types: the queue types to compare (default: all)
+    :param details: if True, also outputs profit / loss of each trade for every queue type
+    :return: dictionary queue type -> totals (see ProfitLossSummary.VALUES)
+    """
+
+    orders = sort_orders_by_time(orders)
+
+    tax_currency = configuration.get_mandatory('tax-currency')
+    tax_year = configuration.get_mandatory('tax-year')
+
+    if queue_types is None:
+        queue_types = list(QueueType)
+
+    fixed_point = configuration.is_true('fixed-point-arithmetic')
+    holding_period = get_holding_period(configuration)
+    queues = [create_balance_queue(queue_type, None, fixed_point, holding_period) for queue_type in queue_types]
+
+    # one summary per queue type, with a single group for the tax year
+    summaries = [ProfitLossSummary('queue type', lambda order, trade, sell_info: tax_year, tax_currency, tax_year)
+                 for _ in queue_types]
+    sell_infos = {queue_type: [] for queue_type in queue_types}  # only filled if details are requested
 
     for order in orders:
         for trade in order.trades:
+            for queue_type, queue, summary in zip(queue_types, queues, summaries):
+                sell_info = queue.trade(trade)
+                summary.add_trade(order, trade, sell_info)
+                if details:
+                    sell_infos[queue_type].append((order, trade, sell_info))
+
+    if details:
+        for queue_type in queue_types:
+            logging.info(f'profit / loss by {queue_type.name}')
+            log_header(tax_currency, queue_type)
+            for order, trade, sell_info in sell_infos[queue_type]:
+                log_trade(order, trade, sell_info, tax_currency)
 
-            sell_info = queue.trade(trade)
-
-            sell = trade.get_transaction(TransactionType.SELL)
-            buy = trade.get_transaction(TransactionType.BUY)
-            fee = trade.get_transaction(TransactionType.FEE)
-
-            logging.info(f'{date_and_time_to_string(trade.timestamp)}, '
-                         f'{order.id}, '
-                         f'{trade.id}, '
-                         f'{currency_to_string(sell.amount, sell.currency)}, '
-                         f'{sell.currency}, '
-                         f'{exchange_rate_to_string(sell, tax_currency)}, '
-                         f'{date_and_time_to_string(sell.exchange_rate.timestamp)}, '
-                         f'{sell.exchange_rate.source.short_description}, '
-                         f'{currency_to_string(sell.converted_amount, tax_currency)}, '
-                         f'{currency_to_string(buy.amount, buy.currency)}, '
-                         f'{buy.currency}, '
-                         f'{exchange_rate_to_string(buy, tax_currency)}, '
-                         f'{date_and_time_to_string(buy.exchange_rate.timestamp)}, '
-                         f'{buy.exchange_rate.source.short_description}, '
-                         f'{currency_to_string(buy.converted_amount, tax_currency)}, '
-                         f'{currency_to_string(fee.amount, fee.currency)}, '
-                         f'{fee.currency}, '
-                         f'{exchange_rate_to_string(fee, tax_currency)}, '
-                         f'{date_and_time_to_string(fee.exchange_rate.timestamp)}, '
-                         f'{fee.exchange_rate.source.short_description}, '
-                         f'{currency_to_string(fee.converted_amount, tax_currency)}, '
-                         f'{buy_items_to_string(sell_info)}, '
-                         f'{currency_to_string(sell_info.cost, tax_currency)}, '
-                         f'{currency_to_string(sell_info.buying_fees, tax_currency)}, '
-                         f'{currency_to_string(sell_info.cost + sell_info.buying_fees, tax_currency)}, '
-                         f'{currency_to_string(sell_info.proceeds, tax_currency)}, '
-                         f'{currency_to_string(sell_info.selling_fees, tax_currency)}, '
-                         f'{currency_to_string(sell_info.proceeds - sell_info.selling_fees, tax_currency)}, '
-                         f'{currency_to_string(sell_info.pl, tax_currency)}, '
-                         f'')
+    totals = {}
+    logging.info(f'total profit / loss {tax_year}')
+    logging.info(', '.join(summaries[0].get_header()))
+    for queue_type, summary in zip(queue_types, summaries):
+        totals[queue_type] = summary.get_totals().get(tax_year, dict.fromkeys(VALUES, Decimal(0)))
+        logging.info(', '.join([queue_type.name] + summary.get_row(tax_year)[1:]))
+
+    return totals
+
+
+def get_report_header(tax_currency, queue_type):
+    """
+    Returns the column names of the profit / loss report (see get_report_row).
+    """
+
+    return ['date / time',
+            'order id',
+            'trade id',
+            'sell amount',
+            'sell currency',
+            f'sell exchange rate vs {tax_currency}',
+            'sell exchange rate date / time',
+            'sell exchange rate source',
+            f'sell value in {tax_currency}',
+            'buy amount',
+            'buy currency',
+            f'buy exchange rate vs {tax_currency}',
+            'buy exchange rate date / time',
+            'buy exchange rate source',
+            f'buy value in {tax_currency}',
+            'fee amount',
+            'fee currency',
+            f'fee exchange rate vs {tax_currency}',
+            'fee exchange rate date / time',
+            'fee exchange rate source',
+            f'fee value in {tax_currency}',
+            f'{queue_type.name} entries',
+            f'cost {tax_currency}',
+            f'buying fees {tax_currency}',
+            f'cost + buying fees {tax_currency}',
+            f'proceeds {tax_currency}',
+            f'selling fees {tax_currency}',
+            f'proceeds - selling fees {tax_currency}',
+            f'profit / loss {tax_currency}',
+            f'taxable profit / loss {tax_currency}',
+            f'tax free profit / loss {tax_currency}']
+
+
+def log_header(tax_currency, queue_type, writer=None):
+    """
+    Outputs the column names of the profit / loss report.
+    :param writer: report writer (see CsvReportWriter), None to output the report to the log
+    """
+
+    header = get_report_header(tax_currency, queue_type)
+    if writer is None:
+        logging.info(', '.join(header))
+    else:
+        writer.write_row(header)
+
+
+def log_trades(queue, trades, tax_currency, writer=None, ledger=None, summaries=()):
+    """
+    Simulates the trades on the queue and outputs profit / loss for each of them.
+    :param trades: list of (order, trade)
+    :param writer: report writer (see CsvReportWriter), None to output the report to the log
+    :param ledger: ledger writer (see LedgerWriter), None for no ledger export
+    :param summaries: summaries (see ProfitLossSummary) that are fed with every trade
+    """
+
+    for order, trade in trades:
+        log_trade(order, trade, queue.trade(trade), tax_currency, writer, ledger, summaries)
+
+
+def log_trade(order, trade, sell_info, tax_currency, writer=None, ledger=None, summaries=()):
+    """
+    Outputs profit / loss of a trade.
+    :param writer: report writer (see CsvReportWriter), None to output the report to the log
+    :param ledger: ledger writer (see LedgerWriter), None for no ledger export
+    :param summaries: summaries (see ProfitLossSummary) that are fed with every trade
+    """
+
+    row = get_report_row(order, trade, sell_info, tax_currency)
+    if writer is None:
+        logging.info(', '.join(row))
+    else:
+        writer.write_row(row)
+
+    if ledger is not None:
+        ledger.write_trade(order, trade, sell_info)
+
+    for summary in summaries:
+        summary.add_trade(order, trade, sell_info)
+
+
+def get_report_row(order, trade, sell_info, tax_currency):
+    """
+    Returns the values of the profit / loss report for a trade.
+    """
+
+    sell = trade.get_transaction(TransactionType.SELL)
+    buy = trade.get_transaction(TransactionType.BUY)
+    fee = trade.get_transaction(TransactionType.FEE)
+
+    return [date_and_time_to_string(trade.timestamp),
+            str(order.id),
+            str(trade.id),
+            currency_to_string(sell.amount, sell.currency),
+            sell.currency,
+            exchange_rate_to_string(sell, tax_currency),
+            date_and_time_to_string(sell.exchange_rate.timestamp),
+            sell.exchange_rate.source.short_description,
+            currency_to_string(sell.converted_amount, tax_currency),
+            currency_to_string(buy.amount, buy.currency),
+            buy.currency,
+            exchange_rate_to_string(buy, tax_currency),
+            date_and_time_to_string(buy.exchange_rate.timestamp),
+            buy.exchange_rate.source.short_description,
+            currency_to_string(buy.converted_amount, tax_currency),
+            currency_to_string(fee.amount, fee.currency),
+            fee.currency,
+            exchange_rate_to_string(fee, tax_currency),
+            date_and_time_to_string(fee.exchange_rate.timestamp),
+            fee.exchange_rate.source.short_description,
+            currency_to_string(fee.converted_amount, tax_currency),
+            buy_items_to_string(sell_info),
+            currency_to_string(sell_info.cost, tax_currency),
+            currency_to_string(sell_info.buying_fees, tax_currency),
+            currency_to_string(sell_info.cost + sell_info.buying_fees, tax_currency),
+            currency_to_string(sell_info.proceeds, tax_currency),
+            currency_to_string(sell_info.selling_fees, tax_currency),
+            currency_to_string(sell_info.proceeds - sell_info.selling_fees, tax_currency),
+            currency_to_string(sell_info.pl, tax_currency),
+            currency_to_string(sell_info.taxable_pl, tax_currency),
+            currency_to_string(sell_info.tax_free_pl, tax_currency)]
 
 
 def exchange_rate_to_string(transaction, tax_currency):
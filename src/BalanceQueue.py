@@ -1,12 +1,18 @@
+import heapq
 from collections import deque, defaultdict
+from itertools import count
 from decimal import Decimal
 from enum import Enum
-from functools import reduce
 
-from src.NumberUtils import currency_to_string
-from src.bo.SellInfo import SellInfo
+from src.NumberUtils import currency_to_string, value_to_scaled_integer, divide_scaled_integers
+from src.bo.SellInfo import SellInfo, AMOUNT_PRECISION, DECIMAL_CONTEXT, to_decimal, round_amount
 from src.bo.Transaction import TransactionType
 
+# precision of the cost and fee per unit of the items: the per unit values are rounded, but the error of the cost of
+# an item (amount * cost per unit) stays far below the precision of the amounts
+UNIT_PRECISION = 2 * AMOUNT_PRECISION
+UNIT_SCALE = 10 ** UNIT_PRECISION
+
 
 class QueueType(Enum):
     """
@@ -14,25 +20,62 @@ class QueueType(Enum):
     """
     FIFO = 0
     LIFO = 1
+    HIFO = 2  # highest cost (per unit) first
+    LOFO = 3  # lowest cost (per unit) first
 
 
 class BalanceQueue:
     """
     Queue that keeps a tab of amounts bought, their price, and the current balance.
-    When an amount is sold, its cost and buying fees are calculated by FIFO (default) or LIFO principle.
+    When an amount is sold, its cost and buying fees are calculated by FIFO (default), LIFO, HIFO or LOFO principle.
     """
 
-    def __init__(self, queue_type, fees_are_tax_deductible):
+    def __init__(self, queue_type, fees_are_tax_deductible, fixed_point=False, holding_period=None):
+        """
+        :param fixed_point: if True, the SellInfo objects calculate with scaled integers instead of Decimals
+        :param holding_period: period (relativedelta) after which bought amounts can be sold tax free,
+                               None if there is no such period
+        """
         self.queue_type = queue_type
         self.fees_are_tax_deductible = fees_are_tax_deductible
-        self.queues = defaultdict(lambda: deque())
+        self.fixed_point = fixed_point
+        self.holding_period = holding_period
+        self.queues = defaultdict(self._create_queue)
+        self._balances = defaultdict(int)  # sum of the (scaled) amounts in each queue, kept up to date on every change
 
     def get_balance(self, currency):
         """
         Returns the balance for the specified currency.
         """
 
-        return reduce(lambda a, b: a + b.amount, self.queues[currency], Decimal(0))
+        return to_decimal(self._balances.get(currency, 0))
+
+    def get_balances(self):
+        """
+        Returns the balances of all currencies that were traded so far.
+        :return: dictionary currency -> balance (a copy)
+        """
+
+        return {currency: to_decimal(balance) for currency, balance in self._balances.items()}
+
+    def get_open_lots(self):
+        """
+        Returns all lots that were bought and not sold yet, in queue order per currency.
+        :return: list of (currency, buy trade, remaining amount)
+        """
+
+        return [(currency, item.trade, item.amount) for currency, queue in self.queues.items() for item in queue]
+
+    def add_open_lot(self, currency, trade, amount):
+        """
+        Adds a lot to the end of the currency's queue, e.g. to restore the queue from open lots saved earlier.
+        :param trade: the buy trade the lot originates from
+        :param amount: the remaining amount of the lot
+        """
+
+        item = Item(value_to_scaled_integer(amount, AMOUNT_PRECISION), trade)
+        self._put(self.queues[currency], item)
+        self._balances[currency] += item._amount
 
     def trade(self, trade):
         """
@@ -48,31 +91,41 @@ class BalanceQueue:
         return sell_info
 
     def _buy(self, queue, trade):
-        self._put(queue, Item(trade.get_transaction(TransactionType.BUY).amount, trade))
+        buy = trade.get_transaction(TransactionType.BUY)
+        self._put(queue, Item(buy._amount, trade))
+        self._balances[buy.currency] += buy._amount
 
     def _sell(self, queue, trade):
 
-        remaining_sell_amount = trade.get_transaction(TransactionType.SELL).amount
+        sell = trade.get_transaction(TransactionType.SELL)
+        remaining_sell_amount = sell._amount  # scaled integer, like the amounts of the items
         items_bought = []
 
-        while remaining_sell_amount > Decimal('0'):
+        while remaining_sell_amount > 0:
 
             if self._is_empty(queue):  # no bought items left but sell is not fully covered
                 items_bought.append(Item(remaining_sell_amount, None))
                 break
 
             item = self._pop(queue, self.queue_type)
+            self._balances[sell.currency] -= item._amount
 
-            if remaining_sell_amount < item.amount:  # sell amount is entirely covered by bought items
-                items_bought.append(Item(remaining_sell_amount, item.trade))
-                item.amount -= remaining_sell_amount
-                self._put_back(queue, self.queue_type, item)
+            if remaining_sell_amount < item._amount:  # sell amount is entirely covered by bought items
+                items_bought.append(item.split(remaining_sell_amount))
+                self._put_back(queue, self.queue_type, item, sell.currency)
                 break
-            elif remaining_sell_amount >= item.amount:  # bought item is fully consumed by sell
+            elif remaining_sell_amount >= item._amount:  # bought item is fully consumed by sell
                 items_bought.append(item)
-                remaining_sell_amount -= item.amount
+                remaining_sell_amount -= item._amount
 
-        return SellInfo(trade, items_bought)
+        return SellInfo(trade, items_bought, self.fixed_point, self.holding_period)
+
+    def _create_queue(self):
+        if self.queue_type == QueueType.HIFO:
+            return LotHeap(highest_cost_first=True)
+        if self.queue_type == QueueType.LOFO:
+            return LotHeap(highest_cost_first=False)
+        return deque()
 
     @staticmethod
     def _is_empty(queue):
@@ -83,15 +136,17 @@ class BalanceQueue:
         if queue_type == QueueType.FIFO:
             item = queue.popleft()
         else:
-            item = queue.pop()
+            item = queue.pop()  # LIFO: last item, HIFO / LOFO: item with highest / lowest cost
         return item
 
-    @staticmethod
-    def _put_back(queue, queue_type, item):
+    def _put_back(self, queue, queue_type, item, currency):
         if queue_type == QueueType.FIFO:
             queue.appendleft(item)
-        else:
+        elif queue_type == QueueType.LIFO:
             queue.append(item)
+        else:
+            queue.put_back(item)
+        self._balances[currency] += item._amount
 
     @staticmethod
     def _put(queue, item):
@@ -100,50 +155,154 @@ class BalanceQueue:
     def __str__(self) -> str:
         amounts = []
         for currency in self.queues:
-            amounts.append(currency_to_string(self.get_balance('currency'), currency))
+            amounts.append(currency_to_string(self.get_balance(currency), currency))
         return f'{amounts}'
 
 
+class LotHeap:
+    """
+    Priority queue of items by cost per unit (in tax currency), used instead of a deque for HIFO and LOFO.
+    Supports the deque operations used by the balance queue: append and pop take O(log n).
+    Items with the same cost per unit are taken in the order they were added.
+    """
+
+    def __init__(self, highest_cost_first):
+        self._sign = -1 if highest_cost_first else 1
+        self._heap = []  # (key, sequence number, item)
+        self._sequence = count()
+        self._last_popped = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        """
+        Iterates over the items in the order they would be popped.
+        """
+        return (item for key, sequence, item in sorted(self._heap, key=lambda entry: entry[:2]))
+
+    def append(self, item):
+        heapq.heappush(self._heap, (self._sign * item._unit_cost, next(self._sequence), item))
+
+    def pop(self):
+        """
+        Removes and returns the item with the highest priority.
+        """
+        self._last_popped = heapq.heappop(self._heap)
+        return self._last_popped[2]
+
+    def put_back(self, item):
+        """
+        Puts the item that was popped last back (e.g. after part of it was sold), at the same position.
+        """
+
+        key, sequence, popped_item = self._last_popped
+        if item is not popped_item:
+            raise ValueError('only the item popped last can be put back')
+        heapq.heappush(self._heap, (key, sequence, item))
+        self._last_popped = None
+
+
 class Item:
     """
     Represents an percentage of a an amount bought in the past, and the corresponding trade.
+    Amounts are kept as scaled integers. The cost and fee per unit are calculated once when the item is created
+    (scaled integers with UNIT_PRECISION decimals, rounded half to even), so that selling never needs to look at the
+    trade or its transactions again; the trade is only kept as identity of the lot (for ledger, reports and
+    snapshots). Items are slotted, because a queue may hold a very large number of them.
     """
 
-    def __init__(self, amount, trade):
+    __slots__ = ('_amount', 'trade', 'timestamp', '_unit_cost', '_unit_fee')
+
+    def __init__(self, scaled_amount, trade):
         """
+        :param scaled_amount: the amount (scaled integer)
         :param trade: corresponding trade or None if unaccounted
         """
-        self.amount = amount
+        self._amount = scaled_amount
         self.trade = trade
 
+        if trade is None:  # unaccounted means no cost and no fee
+            self.timestamp = None
+            self._unit_cost = self._unit_fee = 0
+        else:
+            self.timestamp = trade.timestamp  # time of buying
+            bought_amount = trade.get_transaction(TransactionType.BUY)._amount
+            self._unit_cost = get_scaled_unit_value(trade.get_transaction(TransactionType.SELL)._converted_amount,
+                                                    bought_amount)
+            self._unit_fee = get_scaled_unit_value(trade.get_transaction(TransactionType.FEE)._converted_amount,
+                                                   bought_amount)
+
     @property
-    def percent(self):
+    def amount(self):
+        return to_decimal(self._amount)
+
+    @amount.setter
+    def amount(self, value):
+        self._amount = value_to_scaled_integer(value, AMOUNT_PRECISION)
+
+    def split(self, scaled_amount):
         """
-        How much of the trade amount this item represents, in percent (0.0 - 1.0).
+        Takes part of the item.
+        :param scaled_amount: the amount to take (scaled integer), less than the amount of the item
+        :return: a new item with the amount taken, the amount of this item is reduced accordingly
         """
-        if self.trade is None:  # no trade means unaccounted
-            return Decimal('1.0')  # 100 percent of unaccounted trade are relevant
 
-        return self.amount / self.trade.get_transaction(TransactionType.BUY).amount
+        part = Item.__new__(Item)
+        part._amount = scaled_amount
+        part.trade = self.trade
+        part.timestamp = self.timestamp
+        part._unit_cost = self._unit_cost
+        part._unit_fee = self._unit_fee
+
+        self._amount -= scaled_amount
+        return part
+
+    @property
+    def unit_cost(self):
+        """
+        The cost of one unit of the item (converted to tax currency).
+        """
+        return Decimal(self._unit_cost).scaleb(-UNIT_PRECISION)  # exact
 
     @property
     def cost(self):
         """
-        The cost of the item (converted to tax currency).
+        The cost of the item (converted to tax currency), rounded half to even like scaled_cost.
         """
+        return round_amount(DECIMAL_CONTEXT.multiply(self.amount, self.unit_cost))
 
-        if self.trade is None:  # no trade means unaccounted
-            return Decimal('0.0')  # unaccounted means no cost
+    @property
+    def fee(self):
+        """
+        The fee of the item (converted to tax currency), rounded half to even like scaled_fee.
+        """
+        return round_amount(DECIMAL_CONTEXT.multiply(self.amount, Decimal(self._unit_fee).scaleb(-UNIT_PRECISION)))
 
-        return self.percent * self.trade.get_transaction(TransactionType.SELL).converted_amount
+    @property
+    def scaled_cost(self):
+        """
+        The cost of the item (converted to tax currency, scaled integer), rounded half to even.
+        """
+        return divide_scaled_integers(self._unit_cost, self._amount, UNIT_SCALE)
 
     @property
-    def fee(self):
+    def scaled_fee(self):
         """
-        The cost of the item (converted to tax currency).
+        The fee of the item (converted to tax currency, scaled integer), rounded half to even.
         """
+        return divide_scaled_integers(self._unit_fee, self._amount, UNIT_SCALE)
+
+
+def get_scaled_unit_value(scaled_value, scaled_amount):
+    """
+    Returns the value of one unit of an amount (e.g. the cost per unit of an amount bought), rounded half to even.
+    :param scaled_value: the value of the whole amount (scaled integer with AMOUNT_PRECISION decimals)
+    :param scaled_amount: the amount (scaled integer with AMOUNT_PRECISION decimals)
+    :return: scaled integer with UNIT_PRECISION decimals, 0 if the amount is 0
+    """
 
-        if self.trade is None:  # no trade means unaccounted
-            return Decimal('0.0')  # unaccounted means no fee
+    if scaled_amount == 0:
+        return 0
 
-        return self.percent * self.trade.get_transaction(TransactionType.FEE).converted_amount
+    return divide_scaled_integers(scaled_value, UNIT_SCALE, scaled_amount)
@@ -0,0 +1,134 @@
+from decimal import Decimal
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, only needed for the columnar backend
+    np = None
+
+from src.NumberUtils import scaled_integer_to_decimal
+from src.bo.ExchangeRate import RATE_PRECISION
+
+# the pair id is stored above the epoch in the combined keys (epochs of +/- 2^39 seconds are plenty)
+PAIR_ID_SHIFT = 40
+
+
+def is_numpy_available():
+    """
+    Returns True if numpy is installed and the columnar store can be used.
+    """
+    return np is not None
+
+
+class ColumnarRateStore:
+    """
+    Read-only columnar copy of the in-memory exchange rate series, for looking up many rates at once.
+    For every currency pair, the epochs (seconds) and the scaled integer rates are held in int64 arrays.
+    The epochs of all pairs are combined with their pair ids into one sorted array of keys
+    (pair id * 2^40 + epoch), so that the closest rates for any number of (pair, timestamp) requests are found
+    with a single searchsorted pass. Exchange rate objects are only taken from the series for the rows that
+    are actually referenced (see ExchangeRateSeries.put_raw). Requires numpy.
+    """
+
+    def __init__(self, series_list):
+        """
+        :param series_list: the exchange rate series to copy, the series must not change while the store is in use
+        """
+
+        if np is None:
+            raise ImportError('numpy is required for the columnar exchange rate store')
+
+        self._pair_ids = {}  # (base currency, quote currency) -> pair id
+        self._series = []  # pair id -> series
+        self._timestamps = []  # row -> timestamp
+
+        keys = []
+        rates = []
+        starts = []
+        ends = []
+
+        for series in series_list:
+
+            timestamps = series.get_timestamps()
+            if not timestamps:
+                continue
+
+            pair_id = len(self._series)
+            self._pair_ids[(series.base_currency, series.quote_currency)] = pair_id
+            self._series.append(series)
+
+            epochs = np.fromiter((int(timestamp.timestamp()) for timestamp in timestamps), dtype=np.int64,
+                                 count=len(timestamps))
+            keys.append((np.int64(pair_id) << PAIR_ID_SHIFT) + epochs)
+            rates.append(np.fromiter((series.get_scaled_rate(timestamp) for timestamp in timestamps), dtype=np.int64,
+                                     count=len(timestamps)))
+            starts.append(len(self._timestamps))
+            self._timestamps.extend(timestamps)
+            ends.append(len(self._timestamps))
+
+        self._keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        self._rates = np.concatenate(rates) if rates else np.empty(0, dtype=np.int64)
+        self._starts = np.array(starts, dtype=np.int64)
+        self._ends = np.array(ends, dtype=np.int64)
+        self._row_pair_ids = np.repeat(np.arange(len(self._series), dtype=np.int64), self._ends - self._starts)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def find_closest(self, requests):
+        """
+        Finds the rows closest in time for all requests. A currency pair is also found in its inverse series.
+        If two rows are equally close, the earlier one is chosen (same as ExchangeRateSeries).
+        :param requests: list of (base currency, quote currency, timestamp)
+        :return: tuple of three arrays: row (-1 if the store has no series for the pair), inverted (True if the
+                 row belongs to the inverse pair), distance in seconds between the row and the requested timestamp
+        """
+
+        count = len(requests)
+        pair_ids = np.full(count, -1, dtype=np.int64)
+        inverted = np.zeros(count, dtype=bool)
+        epochs = np.empty(count, dtype=np.int64)
+
+        for i, (base_currency, quote_currency, timestamp) in enumerate(requests):
+            epochs[i] = int(timestamp.timestamp())
+            pair_id = self._pair_ids.get((base_currency, quote_currency))
+            if pair_id is None:
+                pair_id = self._pair_ids.get((quote_currency, base_currency))
+                inverted[i] = pair_id is not None
+            if pair_id is not None:
+                pair_ids[i] = pair_id
+
+        found = pair_ids >= 0
+        if not found.any():
+            return pair_ids, inverted, np.zeros(count, dtype=np.int64)
+
+        safe_pair_ids = np.where(found, pair_ids, 0)
+        queries = (safe_pair_ids << PAIR_ID_SHIFT) + epochs
+        index = np.searchsorted(self._keys, queries, side='left')
+
+        # neighbours within the pair's rows: the insertion point is at most one past the pair's last row
+        after = np.minimum(index, self._ends[safe_pair_ids] - 1)
+        before = np.maximum(index - 1, self._starts[safe_pair_ids])
+
+        distance_after = self._keys[after] - queries
+        distance_before = queries - self._keys[before]
+        use_after = (distance_after >= 0) & (distance_after < distance_before)
+
+        rows = np.where(found, np.where(use_after, after, before), -1)
+        distances = np.where(found, np.abs(np.where(use_after, distance_after, distance_before)), 0)
+
+        return rows, inverted, distances
+
+    def get_exchange_rate(self, row):
+        """
+        Returns the exchange rate object of the row.
+        """
+
+        return self._series[self._row_pair_ids[row]].get(self._timestamps[row])
+
+    def get_rate(self, row, inverted):
+        """
+        Returns the rate of the row (as Decimal), inverted if the row belongs to the inverse pair.
+        """
+
+        rate = scaled_integer_to_decimal(int(self._rates[row]), RATE_PRECISION)
+        return Decimal('1') / rate if inverted else rate
@@ -0,0 +1,32 @@
+import csv
+
+# size of the write buffer (bytes)
+BUFFER_SIZE = 1 << 20
+
+
+class CsvReportWriter:
+    """
+    Writes report rows to a CSV file as they are produced, through a buffered stream, so that memory use does not
+    depend on the size of the report.
+    Can be used as context manager, the file is closed on exit.
+    """
+
+    def __init__(self, file, delimiter=',', quotechar='"', encoding='utf8'):
+        self._stream = open(file, 'wt', newline='', encoding=encoding, buffering=BUFFER_SIZE)
+        self._writer = csv.writer(self._stream, delimiter=delimiter, quotechar=quotechar)
+
+    def write_row(self, row):
+        """
+        Writes a row.
+        :param row: list of values
+        """
+        self._writer.writerow(row)
+
+    def close(self):
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
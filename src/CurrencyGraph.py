@@ -0,0 +1,63 @@
+from collections import defaultdict, deque
+
+
+class CurrencyGraph:
+    """
+    Undirected graph of currencies, where two currencies are connected if an exchange rate between them is known.
+    Used to find conversion paths between currencies that have no direct exchange rate.
+    Paths are cached until the graph changes.
+    """
+
+    def __init__(self):
+        self._neighbours = defaultdict(set)
+        self._paths = {}
+
+    def add_pair(self, currency_a, currency_b):
+        """
+        Connects the two currencies.
+        """
+
+        if currency_a == currency_b or currency_b in self._neighbours[currency_a]:
+            return
+
+        self._neighbours[currency_a].add(currency_b)
+        self._neighbours[currency_b].add(currency_a)
+        self._paths.clear()  # new connections may lead to new or shorter paths
+
+    def find_path(self, currency_from, currency_to):
+        """
+        Finds a shortest conversion path (breadth first search) between the two currencies.
+        :return: list of currencies starting with currency_from and ending with currency_to,
+                 or None if the currencies are not connected
+        """
+
+        key = (currency_from, currency_to)
+        if key not in self._paths:
+            self._paths[key] = self._search(currency_from, currency_to)
+        return self._paths[key]
+
+    def _search(self, currency_from, currency_to):
+
+        if currency_from not in self._neighbours or currency_to not in self._neighbours:
+            return None
+
+        predecessors = {currency_from: None}
+        queue = deque([currency_from])
+
+        while queue:
+
+            currency = queue.popleft()
+
+            if currency == currency_to:
+                path = []
+                while currency is not None:
+                    path.append(currency)
+                    currency = predecessors[currency]
+                return path[::-1]
+
+            for neighbour in sorted(self._neighbours[currency]):  # sorted for deterministic paths
+                if neighbour not in predecessors:
+                    predecessors[neighbour] = currency
+                    queue.append(neighbour)
+
+        return None
@@ -0,0 +1,126 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from src.DateUtils import get_start_of_year, get_start_of_year_after, date_to_string
+from src.NumberUtils import currency_to_string
+
+ONE_DAY = timedelta(days=1)
+
+
+class DailyBalances:
+    """
+    The balance of every currency at the end of every day of a year (currency x day matrix), and optionally its
+    value in tax currency. Days end at midnight UTC.
+    """
+
+    def __init__(self, days, balances):
+        """
+        :param days: list of the end of each day (i.e. midnight of the next day)
+        :param balances: dictionary currency -> list of balances, one per day
+        """
+
+        self.days = days
+        self.balances = balances
+        self.values = None  # set by value, dictionary currency -> list of values (None if there is no rate)
+        self.tax_currency = None
+
+    def value(self, exchange_rates, tax_currency):
+        """
+        Converts the balances to tax currency, with the exchange rates closest to the end of each day. All rates are
+        looked up in one batch (see ExchangeRates.get_exchange_rates); zero balances need no rate.
+        """
+
+        requests = []
+        cells = []
+        values = {}
+
+        for currency, balances in self.balances.items():
+            if currency == tax_currency:
+                values[currency] = list(balances)
+                continue
+            values[currency] = [None if balance else balance for balance in balances]
+            for index, (day, balance) in enumerate(zip(self.days, balances)):
+                if balance:
+                    requests.append((currency, tax_currency, day))
+                    cells.append((currency, index))
+
+        missing = set()
+        for (currency, index), (exchange_rate, rate) in zip(cells, exchange_rates.get_exchange_rates(requests)):
+            if exchange_rate is None:
+                missing.add(currency)
+            else:
+                values[currency][index] = self.balances[currency][index] * rate
+
+        for currency in sorted(missing):
+            logging.warning(f'no exchange rate found to value the balance of {currency} on some days')
+
+        self.values = values
+        self.tax_currency = tax_currency
+
+    def get_rows(self):
+        """
+        Returns the matrix as table: a header with the days, then a row of balances per currency, followed by a row
+        of values ('-' if there is no exchange rate) and a row of total values if the balances have been valued.
+        :return: list of rows (lists of strings)
+        """
+
+        rows = [['currency', 'unit'] + [date_to_string(day - ONE_DAY) for day in self.days]]
+
+        for currency, balances in self.balances.items():
+            rows.append([currency, currency] + [currency_to_string(balance, currency) for balance in balances])
+            if self.values is not None:
+                rows.append([currency, self.tax_currency] + [
+                    '-' if value is None else currency_to_string(value, self.tax_currency)
+                    for value in self.values[currency]])
+
+        if self.values is not None:
+            totals = [sum(value for value in day_values if value is not None)
+                      for day_values in zip(*self.values.values())]
+            rows.append(['total', self.tax_currency] + [currency_to_string(total, self.tax_currency)
+                                                        for total in totals])
+
+        return rows
+
+
+def sweep_daily_balances(trades, queue, year):
+    """
+    Simulates the trades on the queue and records its balances at the end of every day of the year, in a single
+    pass over the trades. Trades after the year are not simulated. Fees do not change the balances, like in the
+    queue itself.
+    :param trades: list of (order, trade), sorted by time
+    :param queue: the balance queue, empty or with the balances at the start of the first trade
+    :return: DailyBalances with all currencies that had a balance on any day of the year, sorted by currency
+    """
+
+    date_to = get_start_of_year_after(year)
+    days = [get_start_of_year(year) + ONE_DAY]  # end of each day of the year
+    while days[-1] < date_to:
+        days.append(days[-1] + ONE_DAY)
+
+    snapshots = []  # balances at the end of each day, shared by consecutive days without trades
+    balances = queue.get_balances()
+
+    for order, trade in trades:
+
+        if trade.timestamp >= date_to:
+            break
+
+        if days[len(snapshots)] <= trade.timestamp:  # day(s) ended before the trade
+            if balances is None:
+                balances = queue.get_balances()
+            while days[len(snapshots)] <= trade.timestamp:
+                snapshots.append(balances)
+
+        queue.trade(trade)
+        balances = None
+
+    if balances is None:
+        balances = queue.get_balances()
+    snapshots.extend([balances] * (len(days) - len(snapshots)))
+
+    unique_snapshots = {id(balances): balances for balances in snapshots}.values()
+    currencies = sorted({currency for balances in unique_snapshots for currency, balance in balances.items()
+                         if balance})
+    return DailyBalances(days, {currency: [balances.get(currency, Decimal(0)) for balances in snapshots]
+                                for currency in currencies})
@@ -14,6 +14,8 @@ def date_to_string(date):
 
 
 def date_and_time_to_string(date):
+    if date is None:
+        return '-'  # e.g. exchange rate of a currency to itself, which is valid at any time
     return date.strftime("%d.%m.%Y %H:%M:%S %Z")
 
 
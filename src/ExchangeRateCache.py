@@ -0,0 +1,204 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from dateutil.tz import UTC
+
+SECONDS_PER_HOUR = 3600
+
+
+def get_start_of_day(day):
+    """
+    Returns the first instant of the specified day (UTC).
+    """
+
+    return datetime(day.year, day.month, day.day, tzinfo=UTC)
+
+
+def parse_day(text):
+    """
+    Returns the day of an ISO date string (YYYY-MM-DD) as stored in the cache.
+    """
+
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def get_days(date_from, date_to):
+    """
+    Returns all days from date_from (inclusive) to date_to (exclusive).
+    """
+
+    days = []
+    day = date_from
+    while day < date_to:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+class ExchangeRateCache:
+    """
+    Persistent local cache for exchange rates that were queried from APIs.
+    Rates are stored in an SQLite file, keyed by source, currency pair and day.
+    A rate that was fetched after its day had ended is final and kept forever.
+    A rate that was fetched while its day was still running expires after the configured TTL.
+    For sources that do not publish a rate for every day (e.g. no fiat rates on weekends), the cache also records
+    which date ranges were fetched completely, with the same expiry rules applied to the last day of the range.
+    The cache may be shared between threads.
+    Can be used as context manager, the cache file is closed on exit.
+    """
+
+    @classmethod
+    def from_configuration(cls, configuration):
+        """
+        Creates the cache configured in section "exchange-rate-cache".
+        :returns: the cache or None if no cache is configured
+        """
+
+        file = configuration.get('exchange-rate-cache', 'file')
+        if file is None:
+            return None
+
+        ttl_hours = configuration.get('exchange-rate-cache', 'ttl-hours', default=24)
+        return cls(file, ttl_hours * SECONDS_PER_HOUR)
+
+    def __init__(self, file, ttl, clock=time.time):
+        """
+        :param file: the cache file
+        :param ttl: time (seconds) after which rates for days that were not yet closed when fetched expire
+        :param clock: function returning the current time (seconds since epoch)
+        """
+
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(file, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS exchange_rate ('
+                                 'source TEXT NOT NULL, '
+                                 'base_currency TEXT NOT NULL, '
+                                 'quote_currency TEXT NOT NULL, '
+                                 'day TEXT NOT NULL, '
+                                 'rate TEXT NOT NULL, '
+                                 'fetched REAL NOT NULL, '
+                                 'PRIMARY KEY (source, base_currency, quote_currency, day))')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS fetched_range ('
+                                 'source TEXT NOT NULL, '
+                                 'base_currency TEXT NOT NULL, '
+                                 'quote_currency TEXT NOT NULL, '
+                                 'date_from TEXT NOT NULL, '
+                                 'date_to TEXT NOT NULL, '
+                                 'fetched REAL NOT NULL, '
+                                 'PRIMARY KEY (source, base_currency, quote_currency, date_from, date_to))')
+        self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, source, base_currency, quote_currency, day):
+        """
+        Returns the cached rate for the specified day.
+        :returns: rate or None if the rate is not cached or has expired
+        """
+
+        return self.get_range(source, base_currency, quote_currency, day, day + timedelta(days=1)).get(day)
+
+    def get_range(self, source, base_currency, quote_currency, date_from, date_to):
+        """
+        Returns all cached rates from date_from (inclusive) to date_to (exclusive).
+        :returns: dictionary day -> rate, expired rates are left out
+        """
+
+        with self._lock:
+            rows = self._connection.execute('SELECT day, rate, fetched FROM exchange_rate '
+                                            'WHERE source = ? AND base_currency = ? AND quote_currency = ? '
+                                            'AND day >= ? AND day < ?',
+                                            (source, base_currency, quote_currency,
+                                             date_from.isoformat(), date_to.isoformat())).fetchall()
+
+        now = self._clock()
+        rates = {}
+
+        for day_string, rate, fetched in rows:
+            day = parse_day(day_string)
+            if self._is_valid(day, fetched, now):
+                rates[day] = Decimal(rate)
+
+        return rates
+
+    def put(self, source, base_currency, quote_currency, day, rate):
+        """
+        Stores a rate in the cache.
+        """
+
+        self.put_all(source, base_currency, quote_currency, {day: rate})
+
+    def put_all(self, source, base_currency, quote_currency, rates):
+        """
+        Stores several rates for the same pair in the cache.
+        :param rates: dictionary day -> rate
+        """
+
+        fetched = self._clock()
+        with self._lock:
+            self._connection.executemany('INSERT OR REPLACE INTO exchange_rate '
+                                         '(source, base_currency, quote_currency, day, rate, fetched) '
+                                         'VALUES (?, ?, ?, ?, ?, ?)',
+                                         [(source, base_currency, quote_currency, day.isoformat(), str(rate),
+                                           fetched)
+                                          for day, rate in rates.items()])
+            self._connection.commit()
+
+    def put_range(self, source, base_currency, quote_currency, date_from, date_to, rates):
+        """
+        Stores all rates that were fetched for a date range and records the range as completely fetched.
+        :param date_from: first day of the range (inclusive)
+        :param date_to: last day of the range (exclusive)
+        :param rates: dictionary day -> rate, days without a rate are allowed
+        """
+
+        with self._lock:
+            self.put_all(source, base_currency, quote_currency, rates)
+            self._connection.execute('INSERT OR REPLACE INTO fetched_range '
+                                     '(source, base_currency, quote_currency, date_from, date_to, fetched) '
+                                     'VALUES (?, ?, ?, ?, ?, ?)',
+                                     (source, base_currency, quote_currency, date_from.isoformat(),
+                                      date_to.isoformat(), self._clock()))
+            self._connection.commit()
+
+    def is_range_fetched(self, source, base_currency, quote_currency, date_from, date_to):
+        """
+        Returns True if a range containing the specified range was fetched completely and has not expired.
+        :param date_from: first day of the range (inclusive)
+        :param date_to: last day of the range (exclusive)
+        """
+
+        with self._lock:
+            rows = self._connection.execute('SELECT date_to, fetched FROM fetched_range '
+                                            'WHERE source = ? AND base_currency = ? AND quote_currency = ? '
+                                            'AND date_from <= ? AND date_to >= ?',
+                                            (source, base_currency, quote_currency,
+                                             date_from.isoformat(), date_to.isoformat())).fetchall()
+
+        now = self._clock()
+
+        for range_date_to, fetched in rows:
+            last_day = parse_day(range_date_to) - timedelta(days=1)
+            if self._is_valid(last_day, fetched, now):
+                return True
+
+        return False
+
+    def _is_valid(self, day, fetched, now):
+        end_of_day = get_start_of_day(day + timedelta(days=1)).timestamp()
+        if fetched >= end_of_day:
+            return True  # the day was closed when the rate was fetched, the rate is final
+        return (now - fetched) < self._ttl
@@ -0,0 +1,166 @@
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime
+
+from dateutil.tz import UTC
+
+from src.NumberUtils import value_to_decimal, value_to_scaled_integer, scaled_integer_to_decimal
+from src.bo.ExchangeRate import ExchangeRate, RATE_PRECISION
+
+# an exchange rate that has not been turned into an exchange rate object yet
+RawExchangeRate = namedtuple('RawExchangeRate', 'rate source')
+
+
+class ExchangeRateSeries:
+    """
+    Time series of exchange rates for one currency pair.
+    Rates are indexed by timestamp; the index is kept sorted so that the rate closest to a given timestamp
+    can be found by binary search. Adding a rate is O(1), the index is re-sorted lazily on the next lookup.
+    Rates can be added raw (number and source); the exchange rate object is only created when the rate is
+    returned by a lookup, and then kept. Rates can also be added as arrays mapped from a snapshot; these are only
+    unpacked when the series is accessed.
+    """
+
+    def __init__(self, base_currency, quote_currency):
+        self.base_currency = base_currency
+        self.quote_currency = quote_currency
+        self._rates = {}  # timestamp -> exchange rate
+        self._timestamps = []  # all timestamps in _rates, sorted unless _unsorted is set
+        self._unsorted = False
+        self._mapped = []  # (epochs, scaled rates, source) added by put_mapped and not unpacked yet
+        self.version = 0  # incremented whenever rates are added, for copies of the series (see ColumnarRateStore)
+
+    def __len__(self):
+        self._unpack_mapped()
+        return len(self._rates)
+
+    def __contains__(self, timestamp):
+        self._unpack_mapped()
+        return timestamp in self._rates
+
+    def put(self, timestamp, exchange_rate):
+        """
+        Adds an exchange rate to the series. An existing rate for the same timestamp is replaced.
+        """
+
+        self._unpack_mapped()
+
+        if timestamp not in self._rates:
+            if self._timestamps and timestamp < self._timestamps[-1]:
+                self._unsorted = True
+            self._timestamps.append(timestamp)
+
+        self._rates[timestamp] = exchange_rate
+        self.version += 1
+
+    def put_raw(self, timestamp, rate, source):
+        """
+        Adds an exchange rate to the series without creating the exchange rate object.
+        :param rate: the rate (Decimal)
+        :param source: the exchange rate source
+        """
+
+        self.put(timestamp, RawExchangeRate(rate, source))
+
+    def put_mapped(self, epochs, rates, source):
+        """
+        Adds exchange rates from arrays (e.g. memoryviews of a snapshot) without reading them yet.
+        Rates added later on replace these rates as if they had been added one by one.
+        :param epochs: sequence of timestamps (seconds since epoch)
+        :param rates: sequence of scaled integer rates (see ExchangeRate)
+        :param source: the exchange rate source
+        """
+
+        self._mapped.append((epochs, rates, source))
+        self.version += 1
+
+    def _unpack_mapped(self):
+        if not self._mapped:
+            return
+
+        mapped = self._mapped
+        self._mapped = []
+        version = self.version
+
+        for epochs, rates, source in mapped:
+            for epoch, rate in zip(epochs, rates):
+                self.put_raw(datetime.fromtimestamp(epoch, tz=UTC), scaled_integer_to_decimal(rate, RATE_PRECISION),
+                             source)
+
+        self.version = version  # unpacking does not change the rates
+
+    def get(self, timestamp):
+        """
+        Returns the exchange rate for exactly the specified timestamp or None if there is none.
+        """
+
+        self._unpack_mapped()
+        exchange_rate = self._rates.get(timestamp)
+        if isinstance(exchange_rate, RawExchangeRate):
+            exchange_rate = self._materialize(timestamp, exchange_rate)
+        return exchange_rate
+
+    def get_scaled_rate(self, timestamp):
+        """
+        Returns the rate for exactly the specified timestamp as scaled integer (see ExchangeRate),
+        without creating the exchange rate object.
+        """
+
+        self._unpack_mapped()
+        exchange_rate = self._rates[timestamp]
+        if isinstance(exchange_rate, RawExchangeRate):
+            return value_to_scaled_integer(value_to_decimal(exchange_rate.rate), RATE_PRECISION)
+        return exchange_rate._rate
+
+    def _materialize(self, timestamp, raw_exchange_rate):
+        exchange_rate = ExchangeRate(self.base_currency, self.quote_currency,
+                                     value_to_decimal(raw_exchange_rate.rate), timestamp, raw_exchange_rate.source)
+        self._rates[timestamp] = exchange_rate
+        return exchange_rate
+
+    def get_closest(self, timestamp):
+        """
+        Returns the exchange rate closest to the specified timestamp.
+        If two rates are equally close, the earlier one is returned.
+        :returns: an exchange rate or None if the series is empty
+        """
+
+        closest_timestamp = self.get_closest_timestamp(timestamp)
+        if closest_timestamp is None:
+            return None
+        return self.get(closest_timestamp)
+
+    def get_closest_timestamp(self, timestamp):
+        """
+        Returns the timestamp in the series that is closest to the specified timestamp.
+        :returns: a timestamp or None if the series is empty
+        """
+
+        timestamps = self.get_timestamps()
+
+        if not timestamps:
+            return None
+
+        index = bisect_left(timestamps, timestamp)
+
+        if index == 0:
+            return timestamps[0]
+        if index == len(timestamps):
+            return timestamps[-1]
+
+        before = timestamps[index - 1]
+        after = timestamps[index]
+
+        # on a tie the earlier timestamp wins
+        return after if (after - timestamp) < (timestamp - before) else before
+
+    def get_timestamps(self):
+        """
+        Returns all timestamps of the series (earliest first).
+        """
+
+        self._unpack_mapped()
+        if self._unsorted:
+            self._timestamps.sort()
+            self._unsorted = False
+        return self._timestamps
@@ -0,0 +1,308 @@
+import csv
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+from array import array
+from decimal import Decimal, InvalidOperation
+
+from src.DateUtils import parse_date
+from src.NumberUtils import value_to_scaled_integer, value_to_decimal
+from src.bo.ExchangeRate import RATE_PRECISION
+
+MAGIC = b'CTAXERS1'
+
+# magic, length of metadata, offset of the arrays
+HEADER = struct.Struct('=8sqq')
+
+INT64_MAX = 2 ** 63 - 1
+
+# options of an exchange rate file section that determine the content of the snapshot
+SNAPSHOT_OPTIONS = ('base-currency', 'delimiter', 'quotechar', 'encoding', 'empty-marker')
+
+
+class ExchangeRateSnapshotError(Exception):
+    """
+    Signals that an exchange rate file cannot be stored in a snapshot.
+    """
+
+    def __init__(self, *args: object, **kwargs: object) -> None:
+        super().__init__(*args, **kwargs)
+
+
+def get_file_hash(file):
+    """
+    Returns the SHA-256 hash of the file contents (hex).
+    """
+
+    digest = hashlib.sha256()
+    with open(file, 'rb') as stream:
+        for block in iter(lambda: stream.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_snapshot_file(snapshot_dir, section):
+    """
+    Returns the snapshot file for an exchange rate file section. Sections for the same file with the same options
+    share the snapshot, regardless of their id.
+    """
+
+    key = json.dumps([os.path.abspath(section['file'])] + [section[option] for option in SNAPSHOT_OPTIONS])
+    return os.path.join(snapshot_dir, hashlib.sha256(key.encode('utf-8')).hexdigest()[:16] + '.snapshot')
+
+
+class ExchangeRateSnapshot:
+    """
+    Binary snapshot of an exchange rate file, opened via mmap.
+    For every quote currency of the file, the snapshot holds the sorted epochs (seconds) and the scaled integer
+    rates as int64 arrays, which are accessed as memoryviews without being copied or parsed.
+    The snapshot records size, modification time and hash of the source file and the options it was read with;
+    it is compiled again when these do not match any more.
+
+    Layout: magic (8 bytes), metadata length (int64), arrays offset (int64), metadata (JSON), padding to a
+    multiple of 8 bytes, arrays (native byte order, snapshots are local to the machine).
+    """
+
+    @classmethod
+    def open_or_compile(cls, snapshot_dir, section):
+        """
+        Opens the snapshot for the exchange rate file section, compiling it first if it is missing, out of date or
+        damaged. If only the modification time of the file changed, it is updated in the snapshot, so that the file
+        is not hashed again next time.
+        :returns: the snapshot
+        :raises ExchangeRateSnapshotError: if the file cannot be stored in a snapshot
+        """
+
+        snapshot_file = get_snapshot_file(snapshot_dir, section)
+
+        if os.path.exists(snapshot_file):
+            try:
+                snapshot = cls(snapshot_file)
+            except ExchangeRateSnapshotError as e:
+                logging.info(f'warning: compiling exchange rate snapshot again: {e}')
+            else:
+                if snapshot.is_valid(section):
+                    snapshot.update_modification_time(section)
+                    return snapshot
+                snapshot.close()
+
+        compile_snapshot(snapshot_file, section)
+        return cls(snapshot_file)
+
+    def __init__(self, snapshot_file):
+        """
+        :raises ExchangeRateSnapshotError: if the file is not a (complete) snapshot
+        """
+
+        self._file = snapshot_file
+        self._map()
+
+    def _map(self):
+        snapshot_file = self._file
+
+        with open(snapshot_file, 'rb') as stream:
+            try:
+                self._mmap = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                raise ExchangeRateSnapshotError(f'empty exchange rate snapshot: {snapshot_file}') from None
+
+        try:
+            magic, metadata_length, self._data_offset = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise ExchangeRateSnapshotError(f'not an exchange rate snapshot: {snapshot_file}')
+
+            self._metadata = json.loads(self._mmap[HEADER.size:HEADER.size + metadata_length].decode('utf-8'))
+            size = self._data_offset + sum(pair['count'] * 16 for pair in self._metadata['pairs'])
+            if len(self._mmap) < size:
+                raise ExchangeRateSnapshotError(f'truncated exchange rate snapshot: {snapshot_file}')
+
+        except (struct.error, ValueError, KeyError, TypeError) as e:  # ValueError includes JSON and decoding errors
+            self._mmap.close()
+            raise ExchangeRateSnapshotError(f'damaged exchange rate snapshot: {snapshot_file} ({e})') from None
+        except ExchangeRateSnapshotError:
+            self._mmap.close()
+            raise
+
+        self._view = memoryview(self._mmap)
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+
+    @property
+    def base_currency(self):
+        return self._metadata['options']['base-currency']
+
+    def get_quote_currencies(self):
+        """
+        Returns the quote currencies of the file, in the order of its header.
+        """
+
+        return [pair['quote-currency'] for pair in self._metadata['pairs']]
+
+    def get_arrays(self, quote_currency):
+        """
+        Returns the rates for the quote currency.
+        :return: tuple (epochs, scaled rates) of memoryviews with format 'q' (int64)
+        """
+
+        for pair in self._metadata['pairs']:
+            if pair['quote-currency'] == quote_currency:
+                offset = self._data_offset + pair['offset']
+                count = pair['count']
+                epochs = self._view[offset:offset + count * 8].cast('q')
+                rates = self._view[offset + count * 8:offset + count * 16].cast('q')
+                return epochs, rates
+
+        return None
+
+    def is_valid(self, section):
+        """
+        Returns True if the snapshot is up to date with the exchange rate file section.
+        The file is only hashed if its size is unchanged but its modification time is not.
+        """
+
+        source = self._metadata['source']
+        options = self._metadata['options']
+
+        if any(options[option] != section[option] for option in SNAPSHOT_OPTIONS):
+            return False
+
+        try:
+            stat = os.stat(section['file'])
+        except FileNotFoundError:
+            return False
+
+        if stat.st_size != source['size']:
+            return False
+
+        if stat.st_mtime_ns == source['mtime-ns']:
+            return True
+
+        return get_file_hash(section['file']) == source['sha256']
+
+    def update_modification_time(self, section):
+        """
+        Records the current modification time of the exchange rate file in the snapshot file, if it differs (e.g.
+        the file was copied with the same content). The snapshot is written again; the file is unmapped before it is
+        replaced (which is not possible while it is mapped on some platforms) and mapped again afterwards, so
+        arrays returned before by get_arrays must not be used any more.
+        """
+
+        mtime_ns = os.stat(section['file']).st_mtime_ns
+        if mtime_ns == self._metadata['source']['mtime-ns']:
+            return
+
+        self._metadata['source']['mtime-ns'] = mtime_ns
+        temporary_file = write_temporary_snapshot(self._file, self._metadata, [self._view[self._data_offset:]])
+        self.close()
+        os.replace(temporary_file, self._file)
+        self._map()
+
+
+def compile_snapshot(snapshot_file, section):
+    """
+    Reads an exchange rate file (all rows and columns) and writes its snapshot (see write_snapshot).
+    :raises ExchangeRateSnapshotError: if the file cannot be stored in a snapshot
+    """
+
+    file = section['file']
+    stat = os.stat(file)
+    sha256 = get_file_hash(file)
+    empty_marker = section['empty-marker']
+
+    logging.info(f'compiling exchange rate snapshot for {file}')
+
+    with open(file, 'rt', encoding=section['encoding']) as csvfile:
+        reader = csv.reader(csvfile, delimiter=section['delimiter'], quotechar=section['quotechar'])
+
+        header = None
+        columns = {}  # quote currency -> {epoch: scaled rate}
+
+        for row_count, row in enumerate(reader, start=1):
+
+            if header is None:  # first row must always be header
+                header = [(index, currency) for index, currency in enumerate(row) if index > 0 and currency]
+                for index, currency in header:
+                    columns[currency] = {}
+                continue
+
+            epoch = int(parse_date(row[0]).timestamp())
+
+            for index, quote_currency in header:
+                exchange_rate = row[index].strip()
+                if exchange_rate and exchange_rate != empty_marker:
+                    try:
+                        rate = value_to_scaled_integer(value_to_decimal(Decimal(exchange_rate)), RATE_PRECISION)
+                    except InvalidOperation:
+                        raise ExchangeRateSnapshotError(f'"{exchange_rate}" is not a valid number '
+                                                        f'({file}, row {row_count})') from None
+                    if rate > INT64_MAX:
+                        raise ExchangeRateSnapshotError(f'"{exchange_rate}" is too large for a snapshot '
+                                                        f'({file}, row {row_count})')
+                    columns[quote_currency][epoch] = rate
+
+    pairs = []
+    arrays = []
+    offset = 0  # relative to the start of the arrays
+
+    for quote_currency, rates in columns.items():
+        epochs = sorted(rates)
+        arrays.append(array('q', epochs))
+        arrays.append(array('q', (rates[epoch] for epoch in epochs)))
+        pairs.append({'quote-currency': quote_currency, 'offset': offset, 'count': len(epochs)})
+        offset += len(epochs) * 16
+
+    metadata = {
+        'source': {'file': os.path.abspath(file), 'size': stat.st_size, 'mtime-ns': stat.st_mtime_ns,
+                   'sha256': sha256},
+        'options': {option: section[option] for option in SNAPSHOT_OPTIONS},
+        'pairs': pairs,
+    }
+
+    write_snapshot(snapshot_file, metadata, arrays)
+
+
+def write_snapshot(snapshot_file, metadata, arrays):
+    """
+    Writes a snapshot file with the metadata and the arrays (see ExchangeRateSnapshot for the layout).
+    The snapshot is written to a temporary file first and then moved into place, so that concurrent runs
+    never see an incomplete snapshot.
+    :param arrays: the arrays as bytes-like objects, in the order of the offsets in the metadata
+    """
+
+    os.replace(write_temporary_snapshot(snapshot_file, metadata, arrays), snapshot_file)
+
+
+def write_temporary_snapshot(snapshot_file, metadata, arrays):
+    """
+    Writes the snapshot to a temporary file next to the snapshot file (see write_snapshot).
+    :returns: the temporary file, to be moved into place by the caller
+    """
+
+    encoded_metadata = json.dumps(metadata).encode('utf-8')
+    data_offset = -(-(HEADER.size + len(encoded_metadata)) // 8) * 8  # int64 arrays are aligned to 8 bytes
+
+    os.makedirs(os.path.dirname(snapshot_file) or '.', exist_ok=True)
+    temporary_file = f'{snapshot_file}.{os.getpid()}.tmp'
+
+    with open(temporary_file, 'wb') as stream:
+        stream.write(HEADER.pack(MAGIC, len(encoded_metadata), data_offset))
+        stream.write(encoded_metadata)
+        stream.write(bytes(data_offset - HEADER.size - len(encoded_metadata)))
+        for values in arrays:
+            stream.write(values)
+
+    return temporary_file
+
+
+def compile_snapshots(snapshot_dir, sections):
+    """
+    Compiles the snapshots of the exchange rate file sections that are missing or out of date.
+    """
+
+    for section in sections:
+        ExchangeRateSnapshot.open_or_compile(snapshot_dir, section).close()
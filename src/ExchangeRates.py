@@ -1,17 +1,52 @@
 import csv
+import json
 import logging
-import time
-from datetime import timedelta
-from decimal import Decimal
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, datetime
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+from urllib.request import urlopen
 
 from cryptocompy import price
+from dateutil.tz import UTC
 from forex_python.converter import CurrencyRates, RatesNotAvailableError
 
+from src.ColumnarRateStore import ColumnarRateStore, is_numpy_available
+from src.CurrencyGraph import CurrencyGraph
 from src.DateUtils import parse_date, date_to_string, get_start_of_year, get_start_of_year_after
-from src.NumberUtils import value_to_decimal
-from src.bo.ExchangeRate import ExchangeRate
+from src.ExchangeRateCache import ExchangeRateCache, get_days, get_start_of_day
+from src.ExchangeRateSeries import ExchangeRateSeries
+from src.ExchangeRateSnapshot import ExchangeRateSnapshot, ExchangeRateSnapshotError
+from src.NumberUtils import value_to_decimal, value_to_scaled_integer
+from src.Error import Error
+from src.TokenBucket import TokenBucket
+from src.bo.ExchangeRate import ExchangeRate, RATE_PRECISION
 from src.bo.ExchangeRateSource import ExchangeRateSource
 
+DEFAULT_RATESAPI_URL = 'https://api.ratesapi.io/api'
+
+DEFAULT_QUERY_THREADS = 4
+
+# maximum number of requests per second for each API
+DEFAULT_RATE_LIMITS = {
+    'cryptocompare': 0.5,
+    'ratesapi': 1,
+}
+
+# fiat rates are not published on weekends and holidays: bulk queries are extended by this margin on both sides
+# so that the days at the edges of the needed date range have a neighbour
+FIAT_DATE_RANGE_MARGIN = timedelta(days=4)
+
+# storage of the in-memory exchange rates: 'objects' (series of exchange rate objects) or 'columnar'
+# (additionally copies the series into numpy arrays for batch lookups, see ColumnarRateStore)
+BACKENDS = ('objects', 'columnar')
+
+# closest exchange rates farther away than this are logged
+MAX_EXCHANGE_RATE_DISTANCE = timedelta(days=1)
+
 
 class ExchangeRateImportError(Exception):
     """
@@ -22,6 +57,10 @@ class ExchangeRateImportError(Exception):
         super().__init__(*args, **kwargs)
 
 
+# a query for the exchange rates of a currency pair from an API, dates are inclusive
+ExchangeRateQuery = namedtuple('ExchangeRateQuery', 'source_id base_currency quote_currency date_from date_to')
+
+
 def is_fiat(currency):
     """
     Returns true if the specified currency is a fiat currency.
@@ -36,15 +75,60 @@ def is_crypto(currency):
     return not is_fiat(currency)
 
 
+def get_projected_columns(header, currencies, first_column=1):
+    """
+    Maps the currency columns of a rate file header to their indexes, leaving out currencies that are not needed.
+    :param header: the header row
+    :param currencies: the currencies needed or None for all currencies
+    :param first_column: index of the first currency column (the columns before hold e.g. the date)
+    :return: list of (column index, currency)
+    """
+
+    return [(index, currency) for index, currency in enumerate(header)
+            if index >= first_column and currency and (currencies is None or currency in currencies)]
+
+
 class ExchangeRates:
 
-    def __init__(self, configuration):
+    def __init__(self, configuration, currencies=None):
+        """
+        :param configuration: the configuration
+        :param currencies: the currencies that rates will be looked up for (e.g. all currencies of the orders);
+                           rate files are only read for these currencies, None to read all currencies
+        """
+
+        self._currencies = None if currencies is None else set(currencies)
         self._query_apis = configuration.get_mandatory('query-exchange-rate-apis')
         self._tax_year = configuration.get_mandatory('tax-year')
         self._date_from = get_start_of_year(self._tax_year)
         self._date_to = get_start_of_year_after(self._tax_year)
         self._exchange_rates = {}
-        self._cryptocompare_already_queried = []
+        self._implicit_exchange_rates = {}  # rates from trades, only used for cross rates
+        self._currency_graph = CurrencyGraph()
+        self._triangulate = configuration.is_true('triangulate-exchange-rates')
+        self._cross_sources = {}
+        self._interned_exchange_rates = {}  # (pair, scaled rate, timestamp, source id) -> exchange rate
+        self._identity_exchange_rates = {}  # currency -> exchange rate
+        self._backend = configuration.get('exchange-rate-backend', default='objects')
+        if self._backend not in BACKENDS:
+            raise Error(f'invalid exchange rate backend: {self._backend} (must be one of {", ".join(BACKENDS)})')
+        if self._backend == 'columnar' and not is_numpy_available():
+            raise Error('exchange rate backend "columnar" requires numpy')
+        self._columnar_store = None  # built on demand, see _get_columnar_store
+        self._columnar_store_versions = None
+        self._cryptocompare_already_queried = set()
+        self._series_lock = threading.Lock()
+        self._cache = ExchangeRateCache.from_configuration(configuration)
+        self._snapshot_dir = configuration.get('exchange-rate-snapshot-dir')
+        self._snapshots = []  # kept open as long as the mapped series are used
+        self._query_fiat_in_bulk = configuration.is_true('query-fiat-exchange-rates-in-bulk')
+        self._ratesapi_url = configuration.get('ratesapi-url', default=DEFAULT_RATESAPI_URL)
+        self._query_threads = configuration.get('exchange-rate-query-threads', default=DEFAULT_QUERY_THREADS)
+        self._rate_limiters = {
+            source_id: TokenBucket(configuration.get('exchange-rate-api-rate-limits', source_id,
+                                                     default=DEFAULT_RATE_LIMITS[source_id]))
+            for source_id in DEFAULT_RATE_LIMITS
+        }
 
         self._sources = {
             'cryptocompare': ExchangeRateSource('cryptocompare', 'cryptocompare.com',
@@ -57,6 +141,22 @@ class ExchangeRates:
 
         self.load_exchange_rates_from_configured_files(configuration)
 
+    def close(self):
+        """
+        Closes the local cache (if configured). Rates in memory can still be looked up, but APIs must not be
+        queried any more.
+        """
+
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def get_exchange_rate(self, base_currency, quote_currency, timestamp):
         """
         Searches the available exchange rate data for an entry that matches the currency pair and is as close
@@ -67,7 +167,7 @@ class ExchangeRates:
         exchange_rate = None
 
         if base_currency == quote_currency:  # same currency: get implicit exchange rate of 1
-            return self.get_implicit_exchange_rate(base_currency, quote_currency, Decimal('1'), timestamp)
+            return self.get_identity_exchange_rate(base_currency)
 
         if self._exchange_rates is not None:
             exchange_rate = self._get_exchange_rate_from_memory(base_currency, quote_currency, timestamp)
@@ -75,6 +175,11 @@ class ExchangeRates:
         if exchange_rate is not None:
             return exchange_rate
 
+        if self._triangulate:
+            exchange_rate = self._get_cross_exchange_rate(base_currency, quote_currency, timestamp)
+            if exchange_rate is not None:
+                return exchange_rate
+
         if not self._query_apis:
             return None
 
@@ -88,44 +193,249 @@ class ExchangeRates:
 
         return None
 
+    def get_identity_exchange_rate(self, currency):
+        """
+        Returns the exchange rate of 1 from the currency to itself. There is one exchange rate object per currency;
+        it is valid at any time, so it has no timestamp.
+        """
+
+        if currency not in self._identity_exchange_rates:
+            self._identity_exchange_rates[currency] = ExchangeRate(currency, currency, Decimal('1'), None,
+                                                                   self._sources['implicit'])
+        return self._identity_exchange_rates[currency]
+
     def get_implicit_exchange_rate(self, base_currency, quote_currency, rate, timestamp):
-        return ExchangeRate(base_currency, quote_currency, rate, timestamp, self._sources['implicit'])
+        """
+        Returns an exchange rate as given by a trade. Trades with the same rate at the same time share the object.
+        If cross rates are enabled, the rate is remembered so that it can be used as part of a conversion path.
+        """
+
+        exchange_rate = self._intern(base_currency, quote_currency, rate, timestamp, self._sources['implicit'])
 
-    def _get_exchange_rate_from_memory(self, base_currency, quote_currency, timestamp):
+        if self._triangulate and base_currency != quote_currency:
+            self._get_series(base_currency, quote_currency, self._implicit_exchange_rates).put(timestamp,
+                                                                                              exchange_rate)
+
+        return exchange_rate
+
+    def _intern(self, base_currency, quote_currency, rate, timestamp, source):
         """
-        Searches in memory for a rate.
+        Returns an exchange rate object for the values, creating only one object for identical values
+        (currency pair, rate as stored, timestamp, source), so that they are stored only once.
         """
 
-        a = base_currency
-        b = quote_currency
+        key = (base_currency, quote_currency, value_to_scaled_integer(rate, RATE_PRECISION), timestamp,
+               source.source_id)
 
-        if a not in self._exchange_rates:
-            a, b = b, a
-            if a not in self._exchange_rates:
-                return None
+        exchange_rate = self._interned_exchange_rates.get(key)
+        if exchange_rate is None:
+            exchange_rate = ExchangeRate(base_currency, quote_currency, rate, timestamp, source)
+            exchange_rate = self._interned_exchange_rates.setdefault(key, exchange_rate)
+
+        return exchange_rate
 
-        if b not in self._exchange_rates[a]:
+    def _get_cross_exchange_rate(self, base_currency, quote_currency, timestamp):
+        """
+        Composes an exchange rate from the rates along the shortest conversion path between the two currencies,
+        using the exchange rates in memory and the implicit exchange rates of trades.
+        :returns: an exchange rate or None if there is no conversion path with recent rates for all hops
+        """
+
+        path, hops = self._get_cross_path(base_currency, quote_currency, timestamp)
+        if path is None:
             return None
 
-        closest_timestamp = min(self._exchange_rates[a][b].keys(),
-                                key=lambda found_timestamp: abs(found_timestamp - timestamp))
+        rate = Decimal('1')
+        farthest_timestamp = None
 
-        max_days = 1
+        for (a, b), exchange_rate in zip(zip(path, path[1:]), hops):
 
-        age = abs(closest_timestamp - timestamp)
-        if age > timedelta(days=max_days):
-            logging.info(f'warning: closest exchange rate found {base_currency}/{quote_currency} '
-                         f'for {date_to_string(timestamp)} '
-                         f'is from {date_to_string(closest_timestamp)} '
-                         f'({age.days} day(s))')
+            rate *= exchange_rate.get_rate(a, b)
 
-        return self._exchange_rates[a][b][closest_timestamp]
+            if farthest_timestamp is None or \
+                    abs(exchange_rate.timestamp - timestamp) > abs(farthest_timestamp - timestamp):
+                farthest_timestamp = exchange_rate.timestamp
+
+        return self._intern(base_currency, quote_currency, rate, farthest_timestamp, self._get_cross_source(path))
+
+    def _get_cross_path(self, base_currency, quote_currency, timestamp):
+        """
+        Finds the shortest conversion path between the two currencies and the exchange rates of its hops. A rate
+        farther than MAX_EXCHANGE_RATE_DISTANCE from the timestamp is not used, so that e.g. an old implicit rate
+        of a trade does not become the rate of a valuation; the path is rejected then.
+        :returns: tuple (path, list of exchange rates of the hops), (None, None) if there is no path with recent
+                  rates for all hops
+        """
+
+        path = self._currency_graph.find_path(base_currency, quote_currency)
+        if path is None:
+            return None, None
+
+        hops = []
+
+        for a, b in zip(path, path[1:]):
+
+            exchange_rate = None
+            for store in (self._exchange_rates, self._implicit_exchange_rates):
+                series = self._find_series(a, b, store)
+                candidate = None if series is None else series.get_closest(timestamp)
+                if candidate is not None and abs(candidate.timestamp - timestamp) <= MAX_EXCHANGE_RATE_DISTANCE:
+                    if exchange_rate is None or \
+                            abs(candidate.timestamp - timestamp) < abs(exchange_rate.timestamp - timestamp):
+                        exchange_rate = candidate
+
+            if exchange_rate is None:
+                return None, None
+
+            hops.append(exchange_rate)
+
+        return path, hops
+
+    def _get_cross_source(self, path):
+        """
+        Returns the source for cross rates along the specified path.
+        """
+
+        source_id = 'cross:' + '/'.join(path)
+
+        if source_id not in self._cross_sources:
+            self._cross_sources[source_id] = ExchangeRateSource(source_id, f'(cross {"/".join(path)})',
+                                                                f'cross rate composed along {" -> ".join(path)}')
+
+        return self._cross_sources[source_id]
+
+    def _get_exchange_rate_from_memory(self, base_currency, quote_currency, timestamp, store=None):
+        """
+        Searches in memory for a rate.
+        """
+
+        series = self._find_series(base_currency, quote_currency, store)
+        if series is None:
+            return None
+
+        exchange_rate = series.get_closest(timestamp)
+        if exchange_rate is None:
+            return None
+
+        age = abs(exchange_rate.timestamp - timestamp)
+        if age > MAX_EXCHANGE_RATE_DISTANCE:
+            self._log_distant_exchange_rate(base_currency, quote_currency, timestamp, exchange_rate)
+
+        return exchange_rate
+
+    @staticmethod
+    def _log_distant_exchange_rate(base_currency, quote_currency, timestamp, exchange_rate):
+        age = abs(exchange_rate.timestamp - timestamp)
+        logging.info(f'warning: closest exchange rate found {base_currency}/{quote_currency} '
+                     f'for {date_to_string(timestamp)} '
+                     f'is from {date_to_string(exchange_rate.timestamp)} '
+                     f'({age.days} day(s))')
+
+    def get_exchange_rates(self, requests):
+        """
+        Looks up the exchange rates for many requests at once (see get_exchange_rate).
+        With the columnar backend, all rates available in memory are resolved in one vectorized pass; only the
+        remaining requests (same currency, cross rates, API queries) are looked up one by one.
+        :param requests: list of (base currency, quote currency, timestamp)
+        :returns: list of (exchange rate, rate to convert from base to quote currency) in the order of the
+                  requests, (None, None) where no exchange rate was found
+        """
+
+        if self._backend != 'columnar':
+            return [self._get_exchange_rate_and_rate(*request) for request in requests]
+
+        store = self._get_columnar_store()
+        rows, inverted, distances = store.find_closest(requests)
+        max_distance = MAX_EXCHANGE_RATE_DISTANCE.total_seconds()
+
+        results = []
+
+        for i, (base_currency, quote_currency, timestamp) in enumerate(requests):
+
+            row = rows[i]
+
+            if row < 0:
+                results.append(self._get_exchange_rate_and_rate(base_currency, quote_currency, timestamp))
+                continue
+
+            exchange_rate = store.get_exchange_rate(row)
+            if distances[i] > max_distance:
+                self._log_distant_exchange_rate(base_currency, quote_currency, timestamp, exchange_rate)
+
+            results.append((exchange_rate, store.get_rate(row, inverted[i])))
+
+        return results
+
+    def _get_exchange_rate_and_rate(self, base_currency, quote_currency, timestamp):
+        exchange_rate = self.get_exchange_rate(base_currency, quote_currency, timestamp)
+        if exchange_rate is None:
+            return None, None
+        return exchange_rate, exchange_rate.get_rate(base_currency, quote_currency)
+
+    def _get_columnar_store(self):
+        """
+        Returns the columnar copy of the in-memory series. The copy is kept and only rebuilt when series have been
+        added or changed since (e.g. by API queries), so that batch lookups do not copy all rates each time.
+        """
+
+        series_list = self._get_all_series()
+        versions = [(id(series), series.version) for series in series_list]
+
+        if self._columnar_store is None or versions != self._columnar_store_versions:
+            self._columnar_store = ColumnarRateStore(series_list)
+            self._columnar_store_versions = versions
+
+        return self._columnar_store
+
+    def _get_all_series(self):
+        """
+        Returns all in-memory series of exchange rates from files and APIs.
+        """
+
+        with self._series_lock:
+            return [series for quote_series in self._exchange_rates.values() for series in quote_series.values()]
+
+    def _find_series(self, base_currency, quote_currency, store=None):
+        """
+        Returns the in-memory series for the currency pair or its inverse.
+        :param store: the exchange rates to search (default: exchange rates from files and APIs)
+        :returns: a series or None if there is no series for the currency pair
+        """
+
+        if store is None:
+            store = self._exchange_rates
+
+        for a, b in ((base_currency, quote_currency), (quote_currency, base_currency)):
+            if a in store and b in store[a]:
+                return store[a][b]
+
+        return None
+
+    def _get_series(self, base_currency, quote_currency, store=None):
+        """
+        Returns the in-memory series for the currency pair, creating it if necessary.
+        :param store: the exchange rates to search (default: exchange rates from files and APIs)
+        """
+
+        if store is None:
+            store = self._exchange_rates
+
+        with self._series_lock:  # series may be created by concurrent queries
+
+            if base_currency not in store:
+                store[base_currency] = {}
+
+            if quote_currency not in store[base_currency]:
+                store[base_currency][quote_currency] = ExchangeRateSeries(base_currency, quote_currency)
+                self._currency_graph.add_pair(base_currency, quote_currency)
+
+            return store[base_currency][quote_currency]
 
     def _query_exchange_rates_from_cryptocompare(self, base_currency, quote_currency):
         """
         Queries crypto exchange rates via "Historical Daily OHLCV" from cryptocompare.com using 'cryptocompy' library
         (see https://min-api.cryptocompare.com/ and https://github.com/ttsteiger/cryptocompy)
-        The results are cachend in the internal exchange rates data.
+        The results are cachend in the internal exchange rates data and, if configured, in the local cache.
         Every currency pair will only be queried once.
         """
 
@@ -134,51 +444,211 @@ class ExchangeRates:
         if marker in self._cryptocompare_already_queried:
             return
 
+        if self._load_exchange_rates_from_cache('cryptocompare', base_currency, quote_currency):
+            self._cryptocompare_already_queried.add(marker)
+            return
+
         day_count = (self._date_to - self._date_from).days
         to_ts = int(self._date_to.timestamp())
         logging.info(f'querying cryptocompare.com exchange rates {base_currency}/{quote_currency} '
                      f'for {self._tax_year}')
+        self._rate_limiters['cryptocompare'].acquire()
         result = price.get_historical_data(base_currency, quote_currency, 'day', to_ts=to_ts, limit=day_count)
         logging.info(f'got {len(result)} OHLCV values')
-        time.sleep(2)
 
         if len(result) > 0:
 
-            if base_currency not in self._exchange_rates:
-                self._exchange_rates[base_currency] = {}
-
-            if quote_currency not in self._exchange_rates[base_currency]:
-                self._exchange_rates[base_currency][quote_currency] = {}
+            series = self._get_series(base_currency, quote_currency)
 
             for data in result:
 
-                rate = value_to_decimal(data['close'])
-                timestamp = parse_date(data['time'])
-                exchange_rate = ExchangeRate(base_currency, quote_currency, rate, timestamp,
-                                             self._sources['cryptocompare'])
-                self._exchange_rates[base_currency][quote_currency][timestamp] = exchange_rate
+                series.put_raw(parse_date(data['time']), value_to_decimal(data['close']),
+                               self._sources['cryptocompare'])
+
+        if self._cache is not None:  # the queried range is recorded even if the history has gaps
+            self._cache.put_range('cryptocompare', base_currency, quote_currency, self._date_from.date(),
+                                  self._date_to.date() + timedelta(days=1),
+                                  {parse_date(data['time']).date(): value_to_decimal(data['close'])
+                                   for data in result})
+
+        self._cryptocompare_already_queried.add(marker)
+
+    def _load_exchange_rates_from_cache(self, source_id, base_currency, quote_currency):
+        """
+        Loads the daily rates of the tax year for the currency pair from the local cache into memory.
+        The query result for the tax year includes the first day of the following year.
+        :returns: True if the tax year was queried before (see ExchangeRateCache.put_range) or the cache has a rate
+                  for all days up to the present, False otherwise (nothing is loaded then)
+        """
+
+        if self._cache is None:
+            return False
+
+        date_from = self._date_from.date()
+        date_to = self._date_to.date() + timedelta(days=1)
+        rates = self._cache.get_range(source_id, base_currency, quote_currency, date_from, date_to)
+
+        if not self._cache.is_range_fetched(source_id, base_currency, quote_currency, date_from, date_to):
+            tomorrow = datetime.now(tz=UTC).date() + timedelta(days=1)
+            if any(day not in rates for day in get_days(date_from, min(date_to, tomorrow))):
+                return False
+
+        logging.info(f'using cached exchange rates {base_currency}/{quote_currency} for {self._tax_year}')
+
+        series = self._get_series(base_currency, quote_currency)
+        for day, rate in rates.items():
+            series.put_raw(get_start_of_day(day), rate, self._sources[source_id])
+
+        return True
+
+    def prefetch_exchange_rates(self, requests):
+        """
+        Queries in advance all the exchange rates that will be needed (if APIs are to be queried).
+        All queries are planned up front and then executed concurrently; each API is only called as often as its
+        configured rate limit allows. Subsequent lookups are then served from memory.
+        :param requests: iterable of (base currency, quote currency, timestamp) for all rates needed later on
+        """
+
+        if not self._query_apis:
+            return
+
+        queries = self.plan_queries(requests)
+        if not queries:
+            return
+
+        logging.info(f'querying {len(queries)} exchange rate series using {self._query_threads} thread(s)')
+
+        with ThreadPoolExecutor(max_workers=self._query_threads) as executor:
+            futures = [executor.submit(self._execute_query, query) for query in queries]
+            for future in futures:
+                future.result()  # re-raises errors from the query
+
+    def plan_queries(self, requests):
+        """
+        Determines the API queries needed to serve the specified requests from memory.
+        Crypto currency pairs are queried from cryptocompare for the whole tax year. If bulk queries are configured,
+        fiat currency pairs are queried from ratesapi for the date range spanned by the requests (otherwise they
+        are queried one by one when looked up). Pairs that are already available in memory are left out, and so are
+        requests that can be served by composing recent rates in memory and implicit rates of trades if cross rates
+        are enabled (see _get_cross_path), so the implicit rates should be recorded before planning.
+        :param requests: iterable of (base currency, quote currency, timestamp)
+        :return: list of queries
+        """
+
+        date_ranges = {}
+
+        for base_currency, quote_currency, timestamp in requests:
+
+            if base_currency == quote_currency:
+                continue
+
+            if self._find_series(base_currency, quote_currency) is not None:
+                continue  # already available in memory (e.g. from file)
+
+            if self._triangulate and self._get_cross_path(base_currency, quote_currency, timestamp)[0] is not None:
+                continue  # available as cross rate, with recent rates for all hops
+
+            if is_crypto(base_currency) or is_crypto(quote_currency):
+                source_id = 'cryptocompare'
+                day_from = self._date_from.date()
+                day_to = self._date_to.date()
+            elif self._query_fiat_in_bulk:
+                source_id = 'ratesapi'
+                day_from = day_to = timestamp.date()
+            else:
+                continue
+
+            key = (source_id, base_currency, quote_currency)
+            if key in date_ranges:
+                date_from, date_to = date_ranges[key]
+                date_ranges[key] = (min(date_from, day_from), max(date_to, day_to))
+            else:
+                date_ranges[key] = (day_from, day_to)
+
+        today = datetime.now(tz=UTC).date()
+        queries = []
+
+        for (source_id, base_currency, quote_currency), (date_from, date_to) in date_ranges.items():
+            if source_id == 'ratesapi':
+                date_from -= FIAT_DATE_RANGE_MARGIN
+                date_to = min(date_to + FIAT_DATE_RANGE_MARGIN, today)
+            queries.append(ExchangeRateQuery(source_id, base_currency, quote_currency, date_from, date_to))
 
-        self._cryptocompare_already_queried.append(marker)
+        return queries
+
+    def _execute_query(self, query):
+        if query.source_id == 'cryptocompare':
+            self._query_exchange_rates_from_cryptocompare(query.base_currency, query.quote_currency)
+        else:
+            self._query_exchange_rates_from_ratesapi(query.base_currency, query.quote_currency, query.date_from,
+                                                     query.date_to)
+
+    def _query_exchange_rates_from_ratesapi(self, base_currency, quote_currency, date_from, date_to):
+        """
+        Queries the fiat exchange rate time series from https://ratesapi.io/api/ for the specified date range
+        (both inclusive). The results are cached in the internal exchange rates data and, if configured,
+        in the local cache.
+        """
+
+        cache_date_to = date_to + timedelta(days=1)  # the cache expects the end of the range to be exclusive
+
+        if self._cache is not None and self._cache.is_range_fetched('ratesapi', base_currency, quote_currency,
+                                                                    date_from, cache_date_to):
+            logging.info(f'using cached exchange rates {base_currency}/{quote_currency} '
+                         f'from {date_to_string(date_from)} to {date_to_string(date_to)}')
+            rates = self._cache.get_range('ratesapi', base_currency, quote_currency, date_from, cache_date_to)
+        else:
+            logging.info(f'querying ratesapi.io for exchange rates {base_currency}/{quote_currency} '
+                         f'from {date_to_string(date_from)} to {date_to_string(date_to)}')
+            url = f'{self._ratesapi_url}/history?' + urlencode({'start_at': date_from.isoformat(),
+                                                                'end_at': date_to.isoformat(),
+                                                                'base': base_currency,
+                                                                'symbols': quote_currency})
+            self._rate_limiters['ratesapi'].acquire()
+            with urlopen(url) as response:
+                data = json.load(response, parse_float=Decimal)
+
+            rates = {}
+            for day_string, day_rates in data['rates'].items():
+                if quote_currency in day_rates:
+                    rates[parse_date(day_string).date()] = value_to_decimal(day_rates[quote_currency])
+            logging.info(f'got {len(rates)} values')
+
+            if self._cache is not None:
+                self._cache.put_range('ratesapi', base_currency, quote_currency, date_from, cache_date_to, rates)
+
+        series = self._get_series(base_currency, quote_currency)
+        for day, rate in rates.items():
+            series.put_raw(get_start_of_day(day), rate, self._sources['ratesapi'])
 
     def _get_exchange_rate_from_ratesapi(self, base_currency, quote_currency, timestamp):
         """
         Queries fiat exchange rate from https://ratesapi.io/api/ using 'forex-python' library.
         (see https://github.com/MicroPyramid/forex-python)
+        If configured, the local cache is consulted first.
         """
 
+        if self._cache is not None:
+            rate = self._cache.get('ratesapi', base_currency, quote_currency, timestamp.date())
+            if rate is not None:
+                return self._intern(base_currency, quote_currency, rate, timestamp, self._sources['ratesapi'])
+
         logging.info(f'querying ratesapi.io for exchange rate {base_currency}/{quote_currency} '
                      f'at {date_to_string(timestamp)}')
 
         try:
+            self._rate_limiters['ratesapi'].acquire()
             rate = CurrencyRates(force_decimal=True).get_rate(base_currency, quote_currency, date_obj=timestamp)
-            time.sleep(1)
             if rate is None:
                 return None
             logging.info(f'Got one result')
         except RatesNotAvailableError as e:
             raise e
 
-        return ExchangeRate(base_currency, quote_currency, rate, timestamp, self._sources['ratesapi'])
+        if self._cache is not None:
+            self._cache.put('ratesapi', base_currency, quote_currency, timestamp.date(), rate)
+
+        return self._intern(base_currency, quote_currency, rate, timestamp, self._sources['ratesapi'])
 
     def load_exchange_rates_from_configured_files(self, configuration):
         """
@@ -189,6 +659,37 @@ class ExchangeRates:
         for section in sections:
             self.load_exchange_rates_from_configured_file(section)
 
+    def _load_exchange_rates_from_snapshot(self, section, source):
+        """
+        Maps the rates of the tax year from the snapshot of the exchange rate file (compiling it if necessary).
+        :returns: True if the rates were loaded, False if the file cannot be stored in a snapshot
+        """
+
+        try:
+            snapshot = ExchangeRateSnapshot.open_or_compile(self._snapshot_dir, section)
+        except ExchangeRateSnapshotError as e:
+            logging.info(f'warning: not using exchange rate snapshot: {e}')
+            return False
+
+        logging.info(f'importing exchange rate source {source.source_id} from snapshot of {section["file"]}')
+
+        self._snapshots.append(snapshot)
+        epoch_from = int(self._date_from.timestamp())
+        epoch_to = int(self._date_to.timestamp())
+
+        for _, quote_currency in get_projected_columns(snapshot.get_quote_currencies(), self._currencies,
+                                                       first_column=0):
+
+            epochs, rates = snapshot.get_arrays(quote_currency)
+            index_from = bisect_left(epochs, epoch_from)  # only rates of the tax year
+            index_to = bisect_left(epochs, epoch_to)
+
+            if index_from < index_to:
+                self._get_series(snapshot.base_currency, quote_currency).put_mapped(
+                    epochs[index_from:index_to], rates[index_from:index_to], source)
+
+        return True
+
     def load_exchange_rates_from_configured_file(self, section):
         """
         Loads the exchange rate file specified by the configuration section.
@@ -210,39 +711,42 @@ class ExchangeRates:
         source = ExchangeRateSource(source_id, short_description, long_description)
         self._sources[source_id] = source
 
-        if base_currency not in self._exchange_rates:
-            self._exchange_rates[base_currency] = {}
+        if self._snapshot_dir is not None and self._load_exchange_rates_from_snapshot(section, source):
+            return
 
         logging.info(f'importing exchange rate source {source_id} from {file}')
 
-        rates = self._exchange_rates[base_currency]
-
         with open(file, 'rt', encoding=encoding) as csvfile:
             reader = csv.reader(csvfile, delimiter=delimiter, quotechar=quotechar)
 
             row_count = 0
-            header = None
+            columns = None  # (column index, quote currency) for all columns to be read
+            series = {}  # quote currency -> series
 
             for row in reader:
 
                 row_count += 1
 
-                if header is None:  # first row must always be header
-                    header = row
+                if columns is None:  # first row must always be header
+                    columns = get_projected_columns(row, self._currencies)
+                    if not columns:
+                        logging.info(f'skipping exchange rate source {source_id}: no currency needed')
+                        break
                     continue
 
                 timestamp = parse_date(row[0])
                 if (timestamp < self._date_from) or (timestamp >= self._date_to):
                     continue  # skip rows where date is outside tax year
 
-                col_count = 0
-                for quote_currency in header:
-                    if col_count != 0:
-                        exchange_rate = row[col_count].strip()
-                        if exchange_rate and exchange_rate != empty_marker:
-                            if quote_currency not in rates:
-                                rates[quote_currency] = {}
-                            exchange_rate_decimal = value_to_decimal(exchange_rate)
-                            rates[quote_currency][timestamp] = ExchangeRate(base_currency, quote_currency,
-                                                                            exchange_rate_decimal, timestamp, source)
-                    col_count += 1
+                # only the parsed number is kept, exchange rate objects are created when looked up
+                for col_count, quote_currency in columns:
+                    exchange_rate = row[col_count].strip()
+                    if exchange_rate and exchange_rate != empty_marker:
+                        try:
+                            exchange_rate_decimal = Decimal(exchange_rate)
+                        except InvalidOperation:
+                            raise ExchangeRateImportError(f'"{exchange_rate}" is not a valid number '
+                                                          f'({file}, row {row_count})') from None
+                        if quote_currency not in series:
+                            series[quote_currency] = self._get_series(base_currency, quote_currency)
+                        series[quote_currency].put_raw(timestamp, exchange_rate_decimal, source)
@@ -0,0 +1,222 @@
+import os
+from decimal import Decimal, Context
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed for the ledger export
+    pa = None
+
+from src.bo.Transaction import TransactionType
+
+FORMATS = ('parquet', 'arrow')
+
+# number of rows collected before a record batch is written
+BATCH_SIZE = 10000
+
+# amounts are stored with the precision of the transactions, rates with more decimals (inverse rates may be small)
+AMOUNT_SCALE = 10
+RATE_SCALE = 18
+
+AMOUNT_QUANTUM = Decimal(1).scaleb(-AMOUNT_SCALE)
+RATE_QUANTUM = Decimal(1).scaleb(-RATE_SCALE)
+
+# context for rounding to the scales above, with the precision of the decimal columns
+DECIMAL_CONTEXT = Context(prec=38)
+
+
+def is_pyarrow_available():
+    """
+    Returns True if pyarrow is installed and the ledger can be exported.
+    """
+    return pa is not None
+
+
+def get_buy_items_file(file):
+    """
+    Returns the file for the buy items table that belongs to the ledger file (e.g. ledger.buy_items.parquet for
+    ledger.parquet).
+    """
+
+    root, extension = os.path.splitext(file)
+    return f'{root}.buy_items{extension}'
+
+
+def _get_schemas(tax_currency):
+    amount = pa.decimal128(38, AMOUNT_SCALE)
+    rate = pa.decimal128(38, RATE_SCALE)
+    timestamp = pa.timestamp('us', tz='UTC')
+
+    trade_fields = [
+        ('row', pa.int64()),
+        ('timestamp', timestamp),
+        ('exchange', pa.string()),
+        ('order_id', pa.int64()),
+        ('trade_id', pa.int64()),
+    ]
+    for prefix in ('sell', 'buy', 'fee'):
+        trade_fields += [
+            (f'{prefix}_currency', pa.string()),
+            (f'{prefix}_amount', amount),
+            (f'{prefix}_exchange_rate', rate),
+            (f'{prefix}_exchange_rate_timestamp', timestamp),
+            (f'{prefix}_exchange_rate_source', pa.string()),
+            (f'{prefix}_value', amount),
+        ]
+    trade_fields += [
+        ('cost', amount),
+        ('buying_fees', amount),
+        ('proceeds', amount),
+        ('selling_fees', amount),
+        ('pl', amount),
+        ('taxable_pl', amount),
+        ('tax_free_pl', amount),
+    ]
+
+    buy_item_fields = [
+        ('row', pa.int64()),  # row of the sale in the trades table
+        ('position', pa.int32()),  # position of the item in the sale
+        ('buy_trade_id', pa.int64()),  # null if the amount is unaccounted
+        ('buy_timestamp', timestamp),
+        ('amount', amount),
+        ('cost', amount),
+        ('fee', amount),
+        ('tax_free', pa.bool_()),
+    ]
+
+    metadata = {'tax-currency': tax_currency}
+    return pa.schema(trade_fields, metadata=metadata), pa.schema(buy_item_fields, metadata=metadata)
+
+
+def _amount(value):
+    return None if value is None else value.quantize(AMOUNT_QUANTUM, context=DECIMAL_CONTEXT)
+
+
+def _rate(value):
+    return None if value is None else value.quantize(RATE_QUANTUM, context=DECIMAL_CONTEXT)
+
+
+class LedgerWriter:
+    """
+    Writes the per-trade profit / loss ledger to columnar files (Parquet or Arrow IPC), with typed columns:
+    timestamps, currencies, amounts and values as decimals, rates and their sources.
+    The buy items of each sale (the amounts it was matched with) go into a second table that refers to the row
+    of the sale (see get_buy_items_file).
+    Rows are collected in columns and written in record batches of BATCH_SIZE rows, so that memory use does not
+    depend on the size of the ledger. Requires pyarrow.
+    Can be used as context manager, the files are closed on exit.
+    """
+
+    def __init__(self, file, tax_currency, file_format='parquet'):
+        """
+        :param file: the file for the trades table, the buy items are written next to it
+        :param file_format: 'parquet' or 'arrow' (IPC file format)
+        """
+
+        if pa is None:
+            raise ImportError('pyarrow is required for the ledger export')
+        if file_format not in FORMATS:
+            raise ValueError(f'invalid ledger format: {file_format} (must be one of {", ".join(FORMATS)})')
+
+        self._tax_currency = tax_currency
+        self._trade_schema, self._buy_item_schema = _get_schemas(tax_currency)
+        self._trade_writer = self._open(file, self._trade_schema, file_format)
+        self._buy_item_writer = self._open(get_buy_items_file(file), self._buy_item_schema, file_format)
+        self._trades = self._create_columns(self._trade_schema)
+        self._buy_items = self._create_columns(self._buy_item_schema)
+        self._row = 0
+
+    @staticmethod
+    def _open(file, schema, file_format):
+        if file_format == 'parquet':
+            return pq.ParquetWriter(file, schema)
+        return ipc.new_file(file, schema)
+
+    @staticmethod
+    def _create_columns(schema):
+        return {name: [] for name in schema.names}
+
+    def write_trade(self, order, trade, sell_info):
+        """
+        Adds a trade and the buy items of its sale to the ledger.
+        """
+
+        trades = self._trades
+        trades['row'].append(self._row)
+        trades['timestamp'].append(trade.timestamp)
+        trades['exchange'].append(order.exchange)
+        trades['order_id'].append(order.id)
+        trades['trade_id'].append(trade.id)
+
+        for prefix, transaction_type in (('sell', TransactionType.SELL), ('buy', TransactionType.BUY),
+                                         ('fee', TransactionType.FEE)):
+            transaction = trade.get_transaction(transaction_type)
+            exchange_rate = transaction.exchange_rate
+            trades[f'{prefix}_currency'].append(transaction.currency)
+            trades[f'{prefix}_amount'].append(_amount(transaction.amount))
+            if exchange_rate is None:
+                trades[f'{prefix}_exchange_rate'].append(None)
+                trades[f'{prefix}_exchange_rate_timestamp'].append(None)
+                trades[f'{prefix}_exchange_rate_source'].append(None)
+            else:
+                trades[f'{prefix}_exchange_rate'].append(
+                    _rate(exchange_rate.get_rate(transaction.currency, self._tax_currency)))
+                trades[f'{prefix}_exchange_rate_timestamp'].append(exchange_rate.timestamp)
+                trades[f'{prefix}_exchange_rate_source'].append(
+                    None if exchange_rate.source is None else exchange_rate.source.short_description)
+            trades[f'{prefix}_value'].append(_amount(transaction.converted_amount))
+
+        trades['cost'].append(_amount(sell_info.cost))
+        trades['buying_fees'].append(_amount(sell_info.buying_fees))
+        trades['proceeds'].append(_amount(sell_info.proceeds))
+        trades['selling_fees'].append(_amount(sell_info.selling_fees))
+        trades['pl'].append(_amount(sell_info.pl))
+        trades['taxable_pl'].append(_amount(sell_info.taxable_pl))
+        trades['tax_free_pl'].append(_amount(sell_info.tax_free_pl))
+
+        buy_items = self._buy_items
+        tax_free_items = set(map(id, sell_info.tax_free_items))
+        for position, item in enumerate(sell_info.buy_items):
+            buy_items['row'].append(self._row)
+            buy_items['position'].append(position)
+            buy_items['buy_trade_id'].append(None if item.trade is None else item.trade.id)
+            buy_items['buy_timestamp'].append(item.timestamp)
+            buy_items['amount'].append(_amount(item.amount))
+            buy_items['cost'].append(_amount(item.cost))
+            buy_items['fee'].append(_amount(item.fee))
+            buy_items['tax_free'].append(id(item) in tax_free_items)
+
+        self._row += 1
+
+        if len(trades['row']) >= BATCH_SIZE:
+            self._flush_trades()
+        if len(buy_items['row']) >= BATCH_SIZE:
+            self._flush_buy_items()
+
+    def _flush_trades(self):
+        if self._trades['row']:
+            self._trade_writer.write_batch(pa.RecordBatch.from_pydict(self._trades, schema=self._trade_schema))
+            self._trades = self._create_columns(self._trade_schema)
+
+    def _flush_buy_items(self):
+        if self._buy_items['row']:
+            self._buy_item_writer.write_batch(pa.RecordBatch.from_pydict(self._buy_items,
+                                                                         schema=self._buy_item_schema))
+            self._buy_items = self._create_columns(self._buy_item_schema)
+
+    def close(self):
+        """
+        Writes the remaining rows and closes the files.
+        """
+
+        self._flush_trades()
+        self._flush_buy_items()
+        self._trade_writer.close()
+        self._buy_item_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,4 +1,4 @@
-from decimal import Decimal, getcontext, InvalidOperation
+from decimal import Decimal, getcontext, InvalidOperation, Context, MAX_PREC, MAX_EMAX, MIN_EMIN
 
 DEFAULT_PRECISION = 28  # 28 is python 3 default
 
@@ -13,6 +13,33 @@ PRECISIONS = {
 }
 
 
+# context for rounding to decimal places regardless of the number of significant digits
+_UNLIMITED_CONTEXT = Context(prec=MAX_PREC, Emax=MAX_EMAX, Emin=MIN_EMIN)
+
+# integers with absolute values below this have at most 28 digits and are converted to Decimal unchanged
+_MAX_INTEGER = pow(10, DEFAULT_PRECISION)
+
+# cache of powers of ten: precision -> Decimal(10 ^ precision)
+_DIVISORS = {}
+
+# cache of exponents for rounding: number of places -> Decimal('1E-<places>')
+_EXPONENTS = {}
+
+
+def _get_divisor(precision):
+    divisor = _DIVISORS.get(precision)
+    if divisor is None:
+        divisor = _DIVISORS[precision] = Decimal(pow(10, precision))
+    return divisor
+
+
+def _get_exponent(places):
+    exponent = _EXPONENTS.get(places)
+    if exponent is None:
+        exponent = _EXPONENTS[places] = Decimal(1).scaleb(-places, context=_UNLIMITED_CONTEXT)
+    return exponent
+
+
 def remove_exponent(value, precision=DEFAULT_PRECISION):
     """
     Removes exponent or trailing zeroes for better readability.
@@ -22,7 +49,7 @@ def remove_exponent(value, precision=DEFAULT_PRECISION):
 
     # only remove exponent if integral value is actually representable without exponent
     # (has to be lower than 10 ^ precision)
-    if value == integral_value and integral_value < Decimal(pow(10, precision)):
+    if value == integral_value and integral_value < _get_divisor(precision):
         return value.quantize(Decimal(1))
     else:
         return value.normalize()
@@ -39,15 +66,32 @@ def value_to_decimal(value, precision=DEFAULT_PRECISION):
     if value is None:
         return None
 
+    if isinstance(value, int) and precision >= 0:
+        return remove_exponent(Decimal(value))  # integers have no decimal places to round
+
     if isinstance(value, str) or isinstance(value, int):
         try:
             numeric_value = Decimal(value)
         except InvalidOperation:
             raise ValueError(f'"{value}" is not a valid number.')
+    elif isinstance(value, float):
+        numeric_value = Decimal(value)  # exact
     else:
         numeric_value = value
 
-    return remove_exponent(Decimal('{:0.{precision}f}'.format(numeric_value, precision=precision)))
+    return remove_exponent(_round_to_places(numeric_value, precision))
+
+
+def _round_to_places(value, places):
+    """
+    Rounds a Decimal to the specified number of decimal places, with the rounding of the current context but
+    without its precision limit - the same as formatting it with '{:0.<places>f}' and parsing the result.
+    """
+
+    if not value.is_finite():
+        return value
+
+    return value.quantize(_get_exponent(places), rounding=getcontext().rounding, context=_UNLIMITED_CONTEXT)
 
 
 def value_to_string(value, precision=DEFAULT_PRECISION):
@@ -75,7 +119,8 @@ def value_to_scaled_integer(value, precision=DEFAULT_PRECISION):
     if value is None:
         return None
 
-    return int(value_to_string(value, precision).replace('.', ''))
+    decimal = value_to_decimal(value)  # at most 28 significant digits, so shifting the point is exact
+    return int(decimal.scaleb(precision).to_integral_value(rounding=getcontext().rounding))
 
 
 def scaled_integer_to_decimal(value, precision=DEFAULT_PRECISION):
@@ -89,8 +134,50 @@ def scaled_integer_to_decimal(value, precision=DEFAULT_PRECISION):
     if value is None:
         return None
 
-    decimal = value_to_decimal(value)
-    return decimal / Decimal(pow(10, precision))
+    if isinstance(value, int) and -_MAX_INTEGER < value < _MAX_INTEGER:
+        return Decimal(value) / _get_divisor(precision)  # same as value_to_decimal for these integers
+
+    return value_to_decimal(value) / _get_divisor(precision)
+
+
+def values_to_scaled_integers(values, precision=DEFAULT_PRECISION):
+    """
+    Converts a sequence of numeric values to scaled integers (see value_to_scaled_integer).
+    :return: list of scaled integers (None for None values)
+    """
+
+    return [value_to_scaled_integer(value, precision) for value in values]
+
+
+def scaled_integers_to_decimals(values, precision=DEFAULT_PRECISION):
+    """
+    Converts a sequence of scaled integers to decimal values (see scaled_integer_to_decimal).
+    :return: list of decimal values (None for None values)
+    """
+
+    return [scaled_integer_to_decimal(value, precision) for value in values]
+
+
+def divide_scaled_integers(value, numerator, denominator):
+    """
+    Calculates value * numerator / denominator for scaled integers with exact integer arithmetic and rounds the
+    result once, half to even (the default rounding of Decimal), to the scale of the value.
+    :param value: scaled integer
+    :param numerator: integer
+    :param denominator: integer, not zero
+    :return: the rounded result as scaled integer
+    """
+
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+
+    quotient, remainder = divmod(value * numerator, denominator)  # floor division, remainder >= 0
+
+    twice_remainder = 2 * remainder
+    if twice_remainder > denominator or (twice_remainder == denominator and quotient % 2 == 1):
+        quotient += 1
+
+    return quotient
 
 
 def currency_to_string(value, currency=None, add_symbol=False):
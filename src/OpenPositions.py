@@ -0,0 +1,141 @@
+import logging
+
+from src.DateUtils import date_and_time_to_string
+from src.NumberUtils import currency_to_string
+from src.bo.SellInfo import to_decimal
+
+
+class OpenPosition:
+    """
+    The open lots of a currency, i.e. the amount that was bought and not sold yet, with its cost basis and
+    (after valuation) its market value.
+    """
+
+    def __init__(self, currency):
+        self.currency = currency
+        self.lots = 0
+        self._amount = 0  # scaled integers, like the items of the balance queue
+        self._cost = 0
+        self._buying_fees = 0
+        self.exchange_rate = None  # set by value_open_positions
+        self.value = None
+
+    @property
+    def amount(self):
+        return to_decimal(self._amount)
+
+    @property
+    def cost(self):
+        return to_decimal(self._cost)
+
+    @property
+    def buying_fees(self):
+        return to_decimal(self._buying_fees)
+
+    @property
+    def unrealised_pl(self):
+        """
+        Profit / loss if the position was sold at its market value (buying fees are deducted like on a sale),
+        None if the position has not been valued.
+        """
+
+        if self.value is None:
+            return None
+        return self.value - self.cost - self.buying_fees
+
+
+def get_open_positions(queue, tax_currency):
+    """
+    Sums up the open lots of the queue per currency, in a single pass over the lots.
+    The tax currency is not included, and neither are currencies without balance.
+    :return: dictionary currency -> OpenPosition, sorted by currency
+    """
+
+    positions = {}
+
+    for currency in sorted(queue.queues):
+        if currency == tax_currency:
+            continue
+
+        position = OpenPosition(currency)
+        for item in queue.queues[currency]:
+            position.lots += 1
+            position._amount += item._amount
+            position._cost += item.scaled_cost
+            position._buying_fees += item.scaled_fee
+
+        if position._amount > 0:
+            positions[currency] = position
+
+    return positions
+
+
+def value_open_positions(positions, exchange_rates, tax_currency, timestamp):
+    """
+    Sets the market value of the positions, with the exchange rates closest to the timestamp (looked up in one
+    batch, see ExchangeRates.get_exchange_rates). Positions without exchange rate are logged and keep no value.
+    :param positions: dictionary currency -> OpenPosition (see get_open_positions)
+    """
+
+    results = exchange_rates.get_exchange_rates([(currency, tax_currency, timestamp) for currency in positions])
+
+    for position, (exchange_rate, rate) in zip(positions.values(), results):
+
+        if exchange_rate is None:
+            logging.warning(f'no exchange rate found to value the open position of {position.currency} '
+                            f'at {date_and_time_to_string(timestamp)}')
+            continue
+
+        position.exchange_rate = exchange_rate
+        position.value = position.amount * rate
+
+
+def get_open_positions_header(tax_currency):
+    """
+    Returns the column names of the open positions report (see get_open_position_row).
+    """
+
+    return ['currency',
+            'open lots',
+            'amount',
+            f'cost {tax_currency}',
+            f'buying fees {tax_currency}',
+            f'exchange rate vs {tax_currency}',
+            'exchange rate date / time',
+            'exchange rate source',
+            f'market value {tax_currency}',
+            f'unrealised profit / loss {tax_currency}']
+
+
+def get_open_position_row(position, tax_currency):
+    """
+    Returns the open position as row of the open positions report, with '-' for the values if it has not been
+    valued.
+    """
+
+    exchange_rate = position.exchange_rate
+    row = [position.currency,
+           str(position.lots),
+           currency_to_string(position.amount, position.currency),
+           currency_to_string(position.cost, tax_currency),
+           currency_to_string(position.buying_fees, tax_currency)]
+
+    if exchange_rate is None:
+        return row + ['-'] * 5
+
+    return row + [currency_to_string(exchange_rate.get_rate(position.currency, tax_currency), tax_currency),
+                  date_and_time_to_string(exchange_rate.timestamp),
+                  '-' if exchange_rate.source is None else exchange_rate.source.short_description,
+                  currency_to_string(position.value, tax_currency),
+                  currency_to_string(position.unrealised_pl, tax_currency)]
+
+
+def log_open_positions(positions, tax_currency, timestamp):
+    """
+    Outputs the open positions report to the log.
+    """
+
+    logging.info(f'open positions at {date_and_time_to_string(timestamp)}')
+    logging.info(', '.join(get_open_positions_header(tax_currency)))
+    for position in positions.values():
+        logging.info(', '.join(get_open_position_row(position, tax_currency)))
@@ -0,0 +1,140 @@
+import logging
+from decimal import Decimal
+
+from src.DateUtils import get_start_of_year, get_start_of_year_after
+from src.NumberUtils import currency_to_string
+from src.bo.Transaction import TransactionType
+
+# the values summed up for each group, in tax currency except for the number of sales
+VALUES = ('sales', 'proceeds', 'selling fees', 'cost', 'buying fees', 'profit / loss', 'taxable profit / loss',
+          'tax free profit / loss', 'unaccounted proceeds')
+
+# additional values for summaries by sold currency, in that currency
+AMOUNT_VALUES = ('amount sold', 'unaccounted amount')
+
+
+class ProfitLossSummary:
+    """
+    Running totals of the sales of the tax year, grouped by a key (e.g. sold currency, month or exchange).
+    The summary is fed with every simulated trade and is complete when the last trade was added, without another
+    pass over the trades. Sales of the tax currency (i.e. purchases with it) are ignored.
+    "Unaccounted proceeds" is the part of the proceeds of amounts that were not bought before (see SellInfo.pl).
+    """
+
+    def __init__(self, title, get_key, tax_currency, tax_year, amounts=False):
+        """
+        :param title: the title of the summary, e.g. 'currency'
+        :param get_key: function (order, trade, sell info) -> key of the group, None is grouped as '-'
+        :param amounts: if True, also sums up the amounts sold (only sensible if grouped by sold currency)
+        """
+
+        self.title = title
+        self._get_key = get_key
+        self._tax_currency = tax_currency
+        self._date_from = get_start_of_year(tax_year)
+        self._date_to = get_start_of_year_after(tax_year)
+        self._values = VALUES + AMOUNT_VALUES if amounts else VALUES
+        self._groups = {}  # key -> dictionary value name -> total
+
+    def add_trade(self, order, trade, sell_info):
+        """
+        Adds the sale of a trade to the totals of its group, if it is a sale of the tax year.
+        """
+
+        if not self._date_from <= trade.timestamp < self._date_to:
+            return
+
+        sell = trade.get_transaction(TransactionType.SELL)
+        if sell.currency == self._tax_currency:
+            return
+
+        key = self._get_key(order, trade, sell_info)
+        if key is None:  # e.g. order without exchange, keys have to be comparable for sorting
+            key = '-'
+        totals = self._groups.get(key)
+        if totals is None:
+            totals = self._groups[key] = {name: 0 if name == 'sales' else Decimal(0) for name in self._values}
+
+        unaccounted_amount = sum((item.amount for item in sell_info.buy_items if item.trade is None), Decimal(0))
+
+        totals['sales'] += 1
+        totals['proceeds'] += sell_info.proceeds
+        totals['selling fees'] += sell_info.selling_fees
+        totals['cost'] += sell_info.cost
+        totals['buying fees'] += sell_info.buying_fees
+        totals['profit / loss'] += sell_info.pl
+        totals['taxable profit / loss'] += sell_info.taxable_pl
+        totals['tax free profit / loss'] += sell_info.tax_free_pl
+        if unaccounted_amount and sell_info.amount:
+            totals['unaccounted proceeds'] += sell_info.proceeds * unaccounted_amount / sell_info.amount
+
+        if 'amount sold' in totals:
+            totals['amount sold'] += sell_info.amount
+            totals['unaccounted amount'] += unaccounted_amount
+
+    def get_totals(self):
+        """
+        Returns the totals of all groups.
+        :return: dictionary key -> (dictionary value name -> total), sorted by key
+        """
+
+        return {key: dict(self._groups[key]) for key in sorted(self._groups)}
+
+    def get_header(self):
+        """
+        Returns the column names of the summary table (see get_row).
+        """
+
+        return [self.title] + [name if name in ('sales',) + AMOUNT_VALUES else f'{name} {self._tax_currency}'
+                               for name in self._values]
+
+    def get_row(self, key, totals=None):
+        """
+        Returns the row of a group for the summary table.
+        :param totals: the totals of the group, None for the totals of the summary (zero if the group is unknown)
+        """
+
+        if totals is None:
+            totals = self._groups.get(key, {})
+
+        row = [str(key)]
+        for name in self._values:
+            value = totals.get(name, 0)
+            if name == 'sales':
+                row.append(str(value))
+            elif name in AMOUNT_VALUES:
+                row.append(currency_to_string(value, key))
+            else:
+                row.append(currency_to_string(value, self._tax_currency))
+        return row
+
+    def get_rows(self):
+        """
+        Returns the summary as table, with the column names in the first row.
+        :return: list of rows (lists of strings)
+        """
+
+        return [self.get_header()] + [self.get_row(key, totals) for key, totals in self.get_totals().items()]
+
+    def log(self):
+        """
+        Outputs the summary table to the log.
+        """
+
+        logging.info(f'profit / loss by {self.title}')
+        for row in self.get_rows():
+            logging.info(', '.join(row))
+
+
+def create_summaries(tax_currency, tax_year):
+    """
+    Creates the summaries by sold currency, by month and by exchange.
+    """
+
+    return [
+        ProfitLossSummary('currency', lambda order, trade, sell_info: sell_info.sell_trade.get_transaction(
+            TransactionType.SELL).currency, tax_currency, tax_year, amounts=True),
+        ProfitLossSummary('month', lambda order, trade, sell_info: f'{trade.timestamp:%Y-%m}', tax_currency,
+                          tax_year),
+        ProfitLossSummary('exchange', lambda order, trade, sell_info: order.exchange, tax_currency, tax_year),
+    ]
@@ -0,0 +1,47 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter that can be shared between threads.
+    Tokens are added at a fixed rate up to the capacity of the bucket; every request takes one token
+    and waits if none is available. The bucket starts full, so up to 'capacity' requests may be made at once.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        """
+        :param rate: tokens added per second
+        :param capacity: maximum number of tokens in the bucket (burst size)
+        :param clock: function returning a monotonic time in seconds
+        :param sleep: function to wait for the specified number of seconds
+        """
+
+        if rate <= 0:
+            raise ValueError(f'rate must be positive: {rate}')
+        if capacity < 1:
+            raise ValueError(f'capacity must be at least 1: {capacity}')
+
+        self._rate = rate
+        self._capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes one token from the bucket, waiting until one is available.
+        """
+
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0
+
+        # the token is reserved already (the balance may go negative), so waiting can happen outside the lock
+        if wait > 0:
+            self._sleep(wait)
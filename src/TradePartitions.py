@@ -0,0 +1,162 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from src.bo.Trade import Trade
+from src.bo.Transaction import Transaction, TransactionType
+
+
+class UnionFind:
+    """
+    Disjoint sets of arbitrary (hashable) elements, with path halving and union by size.
+    """
+
+    def __init__(self):
+        self._parents = {}
+        self._sizes = {}
+
+    def find(self, element):
+        """
+        Returns the representative of the element's set, adding the element as a new set if it is unknown.
+        """
+
+        parents = self._parents
+        if element not in parents:
+            parents[element] = element
+            self._sizes[element] = 1
+            return element
+
+        while parents[element] != element:
+            parents[element] = parents[parents[element]]
+            element = parents[element]
+        return element
+
+    def union(self, element_a, element_b):
+        """
+        Merges the sets of the two elements.
+        """
+
+        root_a = self.find(element_a)
+        root_b = self.find(element_b)
+        if root_a == root_b:
+            return
+
+        if self._sizes[root_a] < self._sizes[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parents[root_b] = root_a
+        self._sizes[root_a] += self._sizes[root_b]
+
+
+def get_pool_key(exchange, currency, pool_per_exchange):
+    """
+    Returns the key of the balance pool that a currency belongs to.
+    """
+    return (exchange, currency) if pool_per_exchange else currency
+
+
+def partition_trades(trades, pool_per_exchange=False):
+    """
+    Divides trades into groups that do not share any balance pool (connected components of the graph of pools,
+    where every trade connects the pool it sells from with the pool it buys into). The groups can be simulated
+    independently of each other. Fees do not connect pools, because they do not change the balance queues.
+    :param trades: list of (order, trade), sorted by time
+    :param pool_per_exchange: if True, every exchange has its own pool for each currency
+    :return: list of groups, each a list of indices into trades in ascending order, largest group first
+    """
+
+    components = UnionFind()
+
+    for order, trade in trades:
+        components.union(get_pool_key(order.exchange, trade.get_transaction(TransactionType.SELL).currency,
+                                      pool_per_exchange),
+                         get_pool_key(order.exchange, trade.get_transaction(TransactionType.BUY).currency,
+                                      pool_per_exchange))
+
+    groups = {}
+    for index, (order, trade) in enumerate(trades):
+        root = components.find(get_pool_key(order.exchange, trade.get_transaction(TransactionType.SELL).currency,
+                                            pool_per_exchange))
+        groups.setdefault(root, []).append(index)
+
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def calculate_sell_infos(trades, create_queue, pool_per_exchange=False, workers=None):
+    """
+    Simulates the trades, with one balance queue per group of trades (see partition_trades).
+    With more than one worker, the groups are simulated in a process pool, on copies of the trades; the buy
+    items of the results refer to the original trades again when they are returned.
+    :param trades: list of (order, trade), sorted by time
+    :param create_queue: function creating an empty balance queue, must be picklable if workers are used
+    :param pool_per_exchange: if True, every exchange has its own pool for each currency
+    :param workers: number of worker processes, None or 1 to simulate all groups in this process
+    :return: list of SellInfo objects in the order of the trades
+    """
+
+    groups = partition_trades(trades, pool_per_exchange)
+    sell_infos = [None] * len(trades)
+
+    if workers is None or workers <= 1 or len(groups) <= 1:
+        for group in groups:
+            queue = create_queue()
+            for index in group:
+                sell_infos[index] = queue.trade(trades[index][1])
+        return sell_infos
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_simulate_group, create_queue, group,
+                                   [_copy_trade(trades[index][1]) for index in group])
+                   for group in groups]
+        for future in futures:
+            for index, sell_info in future.result():
+                _attach(sell_info, trades[index][1], trades)
+                sell_infos[index] = sell_info
+
+    return sell_infos
+
+
+def _copy_trade(trade):
+    """
+    Returns a copy of the trade that is not associated with any DB session, with the transaction values that the
+    balance queue needs.
+    """
+
+    transactions = []
+    for transaction in trade.transactions:
+        copy = Transaction()
+        copy.type = transaction.type
+        copy.currency = transaction.currency
+        copy._amount = transaction._amount
+        copy._converted_amount = transaction._converted_amount
+        transactions.append(copy)
+
+    return Trade(trade.source_id, trade.timestamp, transactions)
+
+
+def _simulate_group(create_queue, group, trades):
+    """
+    Simulates a group of trades (in a worker process).
+    :return: list of (index, SellInfo), with trades replaced by their indices (see _attach)
+    """
+
+    indices = {id(trade): index for index, trade in zip(group, trades)}
+    queue = create_queue()
+    results = []
+
+    for index, trade in zip(group, trades):
+        sell_info = queue.trade(trade)
+        sell_info.sell_trade = None
+        for item in sell_info.buy_items:
+            item.trade = None if item.trade is None else indices[id(item.trade)]
+        results.append((index, sell_info))
+
+    return results
+
+
+def _attach(sell_info, sell_trade, trades):
+    """
+    Replaces the trade indices of a SellInfo returned by a worker process with the original trades.
+    """
+
+    sell_info.sell_trade = sell_trade
+    for item in sell_info.buy_items:
+        if item.trade is not None:
+            item.trade = trades[item.trade][1]
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.orm import relationship
+from sqlalchemy_utc import UtcDateTime
+
+from src.bo.Base import Base
+from src.bo.BalanceSnapshotLot import BalanceSnapshotLot
+
+
+class BalanceSnapshot(Base):
+    """
+    Represents the state of a balance queue at a cut-off time, i.e. all lots bought before that time that had not
+    been sold yet. A later calculation can start from the snapshot and replay only the trades after the cut-off.
+    """
+
+    __tablename__ = 'balance_snapshot'
+
+    # unique id given by persistence layer
+    id = Column(Integer, primary_key=True)
+
+    # the cut-off time: the snapshot contains the effects of all trades before this time
+    timestamp = Column(UtcDateTime)
+
+    # the name of the queue type the lots were matched with (e.g. FIFO)
+    queue_type = Column(String)
+
+    # the open lots, in queue order per currency
+    # if a snapshot is deleted, all the lots associated with it are deleted too
+    lots = relationship(BalanceSnapshotLot, order_by=BalanceSnapshotLot.position, cascade='all, delete-orphan')
+
+    def __init__(self, timestamp, queue_type, lots):
+        self.timestamp = timestamp
+        self.queue_type = queue_type
+        if lots is not None:
+            self.lots.extend(lots)
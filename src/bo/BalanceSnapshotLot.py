@@ -0,0 +1,73 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy.orm import reconstructor
+from sqlalchemy_utc import UtcDateTime
+
+from src.NumberUtils import scaled_integer_to_decimal, value_to_scaled_integer
+from src.bo.Base import Base
+from src.bo.SellInfo import AMOUNT_PRECISION
+
+
+def get_trade_key(order, trade):
+    """
+    Returns the identity of a trade that does not depend on the persistence layer, so that it is the same after the
+    trades have been imported again: exchange, order id and trade id as given by the source, and the time of trade
+    (the trade id is not given by all sources).
+    """
+
+    return order.exchange, order.source_id, trade.source_id, trade.timestamp
+
+
+class BalanceSnapshotLot(Base):
+    """
+    Represents an open lot in a balance snapshot: the amount of a buy trade that had not been sold at the cut-off.
+    The buy trade is identified by its source ids (see get_trade_key) instead of a reference, since the trades are
+    deleted and get new persistence ids when they are imported again; the lot is linked to the imported trade when
+    the snapshot is loaded.
+    """
+
+    __tablename__ = 'balance_snapshot_lot'
+
+    # unique id given by persistence layer
+    id = Column(Integer, primary_key=True)
+
+    # snapshot id (foreign key) given by persistence layer
+    # if a snapshot is deleted, all the lots associated with it are deleted too (by DB)
+    snapshot_id = Column(Integer, ForeignKey('balance_snapshot.id', ondelete="CASCADE"))
+
+    # position of the lot in the snapshot (preserves queue order)
+    position = Column(Integer)
+
+    # the currency symbol (e.g. BTC)
+    currency = Column(String)
+
+    # the remaining amount as integer
+    _amount = Column('amount', Integer)
+
+    # identity of the buy trade the lot originates from (see get_trade_key)
+    exchange = Column(String)
+    order_source_id = Column(String)
+    trade_source_id = Column(String)
+    trade_timestamp = Column(UtcDateTime)
+
+    @property
+    def amount(self):
+        return None if self._amount is None else scaled_integer_to_decimal(self._amount, AMOUNT_PRECISION)
+
+    @amount.setter
+    def amount(self, value):
+        self._amount = None if value is None else value_to_scaled_integer(value, AMOUNT_PRECISION)
+
+    @property
+    def trade_key(self):
+        return self.exchange, self.order_source_id, self.trade_source_id, self.trade_timestamp
+
+    def __init__(self, position, currency, amount, order, trade):
+        self.position = position
+        self.currency = currency
+        self.amount = amount
+        self.exchange, self.order_source_id, self.trade_source_id, self.trade_timestamp = get_trade_key(order, trade)
+        self.trade = trade
+
+    @reconstructor
+    def _init_on_load(self):
+        self.trade = None  # the buy trade, set when the snapshot is linked to the imported trades
@@ -9,6 +9,9 @@ from src.NumberUtils import scaled_integer_to_decimal, value_to_scaled_integer,
 from src.bo.Base import Base
 from src.bo.ExchangeRateSource import ExchangeRateSource
 
+# precision of the rate stored as integer
+RATE_PRECISION = 10
+
 
 class ExchangeRate(Base):
     """
@@ -62,11 +65,11 @@ class ExchangeRate(Base):
 
     @property
     def rate(self):
-        return None if self._rate is None else scaled_integer_to_decimal(self._rate, 10)
+        return None if self._rate is None else scaled_integer_to_decimal(self._rate, RATE_PRECISION)
 
     @rate.setter
     def rate(self, value):
-        self._rate = None if value is None else value_to_scaled_integer(value, 10)
+        self._rate = None if value is None else value_to_scaled_integer(value, RATE_PRECISION)
 
     def __init__(self, base_currency, quote_currency, rate, time, source):
         self.base_currency = base_currency
@@ -13,6 +13,13 @@ def sort_orders_by_time(orders):
     return sorted(orders, key=lambda order: get_earliest_trade(order.trades).timestamp)
 
 
+def get_currencies(orders):
+    """
+    Returns the currencies of all transactions of the orders.
+    """
+    return {transaction.currency for order in orders for trade in order.trades for transaction in trade.transactions}
+
+
 class Order(Base):
     """
     Represents an order on an exchange.
@@ -1,18 +1,49 @@
-from decimal import Decimal
+from decimal import Decimal, Context, ROUND_HALF_EVEN
 from functools import reduce
 
-from src.NumberUtils import currency_to_string
+from src.NumberUtils import currency_to_string, divide_scaled_integers
 from src.bo.Transaction import TransactionType
 
+# precision of the scaled integer amounts (same as Transaction)
+AMOUNT_PRECISION = 10
+
+# context for Decimal products and quotients that are rounded to AMOUNT_PRECISION afterwards (see round_amount):
+# products of amounts and values per unit are exact, quotients are precise enough not to change the rounding
+DECIMAL_CONTEXT = Context(prec=60, rounding=ROUND_HALF_EVEN)
+
+AMOUNT_QUANTUM = Decimal(1).scaleb(-AMOUNT_PRECISION)
+
 
 class SellInfo:
     """
     Information about a sell action, such as cost / proceeds, profit / loss, etc.
+
+    With fixed point arithmetic, all values are calculated from the scaled integers (10 decimals) of the
+    transactions and buy items, otherwise with Decimals. Both round the same way, so the results are identical:
+    the cost and fee of each buy item (amount * value per unit) and the proceeds of the taxable part of a sale are
+    calculated exactly and rounded once, half to even, to 10 decimals (see Item.scaled_cost and round_amount);
+    all sums and differences are exact.
+
+    With a holding period, the buy items are divided into taxable items (held for the holding period or less)
+    and tax free items (held longer). Only the items matched with the sale are looked at, the classification
+    does not depend on the other amounts in the balance queue.
     """
 
-    def __init__(self, sell_trade, buy_items):
+    def __init__(self, sell_trade, buy_items, fixed_point=False, holding_period=None):
         self.sell_trade = sell_trade  # the trade representing the sale
         self.buy_items = buy_items  # list of buys from the past associated with the sale
+        self.fixed_point = fixed_point  # if True, values are calculated with scaled integers
+        self.holding_period = holding_period  # relativedelta or None
+
+        self.taxable_items = []  # buy items held for the holding period or less, and unaccounted items
+        self.tax_free_items = []  # buy items held longer than the holding period
+
+        for item in buy_items:
+            if holding_period is not None and item.timestamp is not None and \
+                    item.timestamp + holding_period < sell_trade.timestamp:
+                self.tax_free_items.append(item)
+            else:
+                self.taxable_items.append(item)
 
     @property
     def amount(self):
@@ -27,6 +58,9 @@ class SellInfo:
         Cost when buying (in tax currency).
         """
 
+        if self.fixed_point:
+            return to_decimal(self.scaled_cost)
+
         return reduce(lambda a, b: a + b.cost, self.buy_items, Decimal(0))  # summarize cost of all buy items
 
     @property
@@ -35,6 +69,9 @@ class SellInfo:
         Buying fees (in tax currency).
         """
 
+        if self.fixed_point:
+            return to_decimal(self.scaled_buying_fees)
+
         return reduce(lambda a, b: a + b.fee, self.buy_items, Decimal(0))  # summarize fees of all buy items
 
     @property
@@ -42,6 +79,10 @@ class SellInfo:
         """
         Proceeds when selling (in tax currency).
         """
+
+        if self.fixed_point:
+            return to_decimal(self.scaled_proceeds)
+
         return self.sell_trade.get_transaction(TransactionType.SELL).converted_amount
 
     @property
@@ -49,6 +90,10 @@ class SellInfo:
         """
         Selling fees (in tax currency).
         """
+
+        if self.fixed_point:
+            return to_decimal(self.scaled_selling_fees)
+
         return self.sell_trade.get_transaction(TransactionType.FEE).converted_amount
 
     @property
@@ -59,8 +104,100 @@ class SellInfo:
         If any part of the amount that was sold could not be accounted for with a corresponding buy action,
         that means the cost of purchase for that part was zero, and the profit for that part was 100 percent.
         """
+
+        if self.fixed_point:
+            return to_decimal(self.scaled_pl)
+
         return (self.proceeds - self.selling_fees) - (self.cost + self.buying_fees)
 
+    @property
+    def taxable_amount(self):
+        """
+        The amount sold that was held for the holding period or less (in original currency).
+        """
+        return to_decimal(sum(item._amount for item in self.taxable_items))
+
+    @property
+    def tax_free_amount(self):
+        """
+        The amount sold that was held longer than the holding period (in original currency).
+        """
+        return to_decimal(sum(item._amount for item in self.tax_free_items))
+
+    @property
+    def taxable_pl(self):
+        """
+        Profit / loss of the taxable part of the sale (in tax currency).
+        Proceeds and selling fees are attributed to the taxable part in proportion to its amount.
+        """
+
+        if not self.tax_free_items:
+            return self.pl
+
+        if self.fixed_point:
+            return to_decimal(self.scaled_taxable_pl)
+
+        taxable_proceeds = DECIMAL_CONTEXT.divide(
+            DECIMAL_CONTEXT.multiply(self.proceeds - self.selling_fees, self.taxable_amount), self.amount)
+        return round_amount(taxable_proceeds) - \
+            reduce(lambda a, b: a + b.cost + b.fee, self.taxable_items, Decimal(0))
+
+    @property
+    def tax_free_pl(self):
+        """
+        Profit / loss of the tax free part of the sale (in tax currency).
+        """
+        return self.pl - self.taxable_pl
+
+    @property
+    def scaled_taxable_pl(self):
+        """
+        Profit / loss of the taxable part of the sale (in tax currency, scaled integer), see taxable_pl.
+        """
+
+        if not self.tax_free_items:
+            return self.scaled_pl
+
+        taxable_amount = sum(item._amount for item in self.taxable_items)
+        sell_amount = self.sell_trade.get_transaction(TransactionType.SELL)._amount
+        return divide_scaled_integers(self.scaled_proceeds - self.scaled_selling_fees, taxable_amount, sell_amount) - \
+            sum(item.scaled_cost + item.scaled_fee for item in self.taxable_items)
+
+    @property
+    def scaled_cost(self):
+        """
+        Cost when buying (in tax currency, scaled integer).
+        """
+        return sum(item.scaled_cost for item in self.buy_items)
+
+    @property
+    def scaled_buying_fees(self):
+        """
+        Buying fees (in tax currency, scaled integer).
+        """
+        return sum(item.scaled_fee for item in self.buy_items)
+
+    @property
+    def scaled_proceeds(self):
+        """
+        Proceeds when selling (in tax currency, scaled integer).
+        """
+        return self.sell_trade.get_transaction(TransactionType.SELL)._converted_amount
+
+    @property
+    def scaled_selling_fees(self):
+        """
+        Selling fees (in tax currency, scaled integer).
+        """
+        return self.sell_trade.get_transaction(TransactionType.FEE)._converted_amount
+
+    @property
+    def scaled_pl(self):
+        """
+        Profit / loss of the sale (in tax currency, scaled integer), see pl.
+        """
+        return (self.scaled_proceeds - self.scaled_selling_fees) - (self.scaled_cost + self.scaled_buying_fees)
+
     def render(self, currency, tax_currency):
         out = f'total: ' \
               f'sold {currency_to_string(self.amount, currency)} ' \
@@ -68,3 +205,18 @@ class SellInfo:
               f'proceeds {currency_to_string(self.proceeds, tax_currency)} ' \
               f'P/L: {currency_to_string(self.pl, tax_currency)}'
         return out
+
+
+def to_decimal(scaled_integer):
+    """
+    Converts a scaled integer amount to Decimal (exact, without rounding).
+    """
+    return Decimal(scaled_integer).scaleb(-AMOUNT_PRECISION)
+
+
+def round_amount(value):
+    """
+    Rounds a Decimal value half to even to AMOUNT_PRECISION decimals, like divide_scaled_integers does for scaled
+    integers.
+    """
+    return value.quantize(AMOUNT_QUANTUM, context=DECIMAL_CONTEXT)
@@ -1,6 +1,7 @@
+from collections import defaultdict
 from functools import reduce
 
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, event
 from sqlalchemy.orm import relationship
 from sqlalchemy_utc import UtcDateTime
 
@@ -75,10 +76,44 @@ class Trade(Base):
         return results[0]
 
     def _get_transactions(self, transaction_type):
-        return list(filter(lambda transaction: transaction.type == transaction_type, self.transactions))
+        return self._get_transaction_index().get(transaction_type, ())
+
+    def _get_transaction_index(self):
+        """
+        Returns the transactions grouped by type (type -> list of transactions).
+        The index is built on first use and dropped whenever the transactions collection changes or the trade is
+        refreshed or expired (see the event listeners below). The type of a transaction must not be changed after
+        it was added to the trade.
+        """
+
+        index = self.__dict__.get('_transaction_index')  # not set on instances loaded by the ORM
+        if index is None:
+            index = defaultdict(list)
+            for transaction in self.transactions:
+                index[transaction.type].append(transaction)
+            index = dict(index)
+            self._transaction_index = index
+        return index
+
+    def _invalidate_transaction_index(self):
+        self.__dict__.pop('_transaction_index', None)
 
     def __eq__(self, other):
         return equals(self, other, relaxed_order=True)  # order of transactions may vary because of DB
 
     def __hash__(self):
         return calculate_hash(self)
+
+
+@event.listens_for(Trade.transactions, 'append')
+@event.listens_for(Trade.transactions, 'remove')
+@event.listens_for(Trade.transactions, 'bulk_replace')
+def _on_transactions_changed(trade, *args):
+    trade._invalidate_transaction_index()
+
+
+@event.listens_for(Trade, 'refresh')
+@event.listens_for(Trade, 'expire')
+def _on_trade_reloaded(trade, *args):
+    if trade is not None:  # expire is also signalled for instances that were already garbage collected
+        trade._invalidate_transaction_index()
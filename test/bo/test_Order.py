@@ -3,8 +3,9 @@ from unittest import TestCase
 
 from dateutil.tz import UTC
 
-from src.bo.Order import Order, sort_orders_by_time
+from src.bo.Order import Order, sort_orders_by_time, get_currencies
 from src.bo.Trade import Trade
+from test.utilities.TradeCreator import TradeCreator
 
 
 class TestOrder(TestCase):
@@ -30,3 +31,17 @@ class TestOrder(TestCase):
 
         self.assertListEqual(sort_orders_by_time([order_c, order_b, order_a]), [order_a, order_b, order_c])
         self.assertListEqual(sort_orders_by_time([order_b, order_a, order_c]), [order_a, order_b, order_c])
+
+    def test_get_currencies(self):
+        trade_creator = TradeCreator('EUR', {'BTC': '0.0001', 'ETH': '0.001', 'BNB': '0.1'})
+
+        order_a = Order(None, None)
+        # noinspection PyUnresolvedReferences
+        order_a.trades.append(trade_creator.create_trade({'sell': ('EUR', 10), 'buy': ('BTC', 1), 'fee': ('BNB', 1)}))
+
+        order_b = Order(None, None)
+        # noinspection PyUnresolvedReferences
+        order_b.trades.append(trade_creator.create_trade({'sell': ('BTC', 1), 'buy': ('ETH', 10), 'fee': ('ETH', 1)}))
+
+        self.assertSetEqual({'EUR', 'BTC', 'ETH', 'BNB'}, get_currencies([order_a, order_b]))
+        self.assertSetEqual(set(), get_currencies([]))
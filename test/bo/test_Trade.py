@@ -68,3 +68,24 @@ class TestTrade(TestCase):
         earliest_trade = get_earliest_trade([trade_a, trade_b])
         self.assertEqual(earliest_trade, trade_a)
         self.assertEqual(get_earliest_trade([trade_b, trade_a]), trade_a)
+
+    def test_get_transaction_after_change(self):
+        buy = Transaction()
+        buy.type = TransactionType.BUY
+
+        sell = Transaction()
+        sell.type = TransactionType.SELL
+
+        trade = Trade('foo', datetime.now(), (sell,))
+        self.assertEqual(trade.get_transaction(TransactionType.SELL), sell)
+        self.assertRaises(Error, trade.get_transaction, TransactionType.BUY)
+
+        trade.transactions.append(buy)
+        self.assertIs(trade.get_transaction(TransactionType.BUY), buy)
+
+        trade.transactions.remove(sell)
+        self.assertRaises(Error, trade.get_transaction, TransactionType.SELL)
+
+        trade.transactions = [sell]
+        self.assertIs(trade.get_transaction(TransactionType.SELL), sell)
+        self.assertRaises(Error, trade.get_transaction, TransactionType.BUY)
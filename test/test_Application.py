@@ -0,0 +1,262 @@
+import csv
+import os
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase, mock
+
+from dateutil.relativedelta import relativedelta
+from dateutil.tz import UTC
+
+from src.Application import init_db, save_balance_snapshot, load_balance_snapshot, create_balance_queue, \
+    delete_transaction_data, get_holding_period, compare_profit_loss, find_exchange_rates, calculate_profit_loss, \
+    calculate_daily_balances
+from src.BalanceQueue import BalanceQueue, QueueType
+from src.Configuration import Configuration
+from src.Error import Error
+from src.bo.BalanceSnapshot import BalanceSnapshot
+from src.bo.ExchangeRate import ExchangeRate
+from src.bo.ExchangeRateSource import ExchangeRateSource
+from src.bo.Order import Order
+from src.bo.Transaction import TransactionType
+from test.utilities.TradeCreator import TradeCreator
+
+CUT_OFF = datetime(2019, 1, 1, tzinfo=UTC)
+
+
+class TestBalanceSnapshot(TestCase):
+
+    def setUp(self):
+        self.session = init_db(Configuration.from_string("database:\n  url: 'sqlite://'"))
+        self.trade_creator = TradeCreator('EUR', {'BTC': '0.001', 'ETH': '0.01'})
+
+        self.order = self.import_order()
+
+        self.queue = BalanceQueue(QueueType.FIFO, True)
+        for trade in self.order.trades:
+            self.queue.trade(trade)
+
+    def tearDown(self):
+        self.session.close()
+
+    def import_order(self, count=4):
+        """
+        Stores an order with the first trades of the test data, like an import of the order.
+        """
+
+        order = Order('1', 'test')
+        for index, (sell, buy) in enumerate(((['EUR', '1000'], ['BTC', '1']),
+                                             (['EUR', '2000'], ['BTC', '1']),
+                                             (['BTC', '0.5'], ['ETH', '5']),
+                                             (['EUR', '400'], ['ETH', '4']))[:count]):
+            trade = self.trade_creator.create_trade({'sell': sell, 'buy': buy, 'fee': ['EUR', '1']})
+            trade.source_id = f'trade {index}'
+            trade.timestamp = datetime(2018, 1 + index, 1, tzinfo=UTC)
+            # noinspection PyUnresolvedReferences
+            order.trades.append(trade)
+        self.session.add(order)
+        self.session.commit()
+        return order
+
+    def test_save_and_resume(self):
+        save_balance_snapshot(self.session, self.queue, CUT_OFF)
+        self.session.expire_all()  # load the snapshot from DB
+
+        snapshot = load_balance_snapshot(self.session, datetime(2019, 6, 1, tzinfo=UTC))
+        self.assertEqual(CUT_OFF, snapshot.timestamp)
+
+        queue = create_balance_queue(QueueType.FIFO, snapshot)
+
+        self.assertDictEqual(self.queue.get_balances(), queue.get_balances())
+        self.assertListEqual([(currency, trade.id, amount) for currency, trade, amount in self.queue.get_open_lots()],
+                             [(currency, trade.id, amount) for currency, trade, amount in queue.get_open_lots()])
+
+        # the restored queue matches later sells just like the original one
+        sell = self.trade_creator.create_trade({'sell': ['BTC', '1'], 'buy': ['EUR', '3000'], 'fee': ['EUR', '1']})
+        self.assertEqual(Decimal('1500'), self.queue.trade(sell).cost)
+        self.assertEqual(Decimal('1500'), queue.trade(sell).cost)
+
+    def test_load_latest_before(self):
+        save_balance_snapshot(self.session, self.queue, datetime(2018, 1, 1, tzinfo=UTC))
+        save_balance_snapshot(self.session, self.queue, CUT_OFF)
+        save_balance_snapshot(self.session, self.queue, CUT_OFF)  # replaces the previous one
+
+        self.assertEqual(2, self.session.query(BalanceSnapshot).count())
+        self.assertEqual(None, load_balance_snapshot(self.session, datetime(2017, 12, 31, tzinfo=UTC)))
+        self.assertEqual(datetime(2018, 1, 1, tzinfo=UTC),
+                         load_balance_snapshot(self.session, datetime(2018, 12, 31, tzinfo=UTC)).timestamp)
+        self.assertEqual(CUT_OFF, load_balance_snapshot(self.session, CUT_OFF).timestamp)
+
+    def test_queue_type_mismatch(self):
+        save_balance_snapshot(self.session, self.queue, CUT_OFF)
+
+        with self.assertRaises(Error):
+            create_balance_queue(QueueType.LIFO, load_balance_snapshot(self.session, CUT_OFF))
+
+    def test_resume_after_import(self):
+        save_balance_snapshot(self.session, self.queue, CUT_OFF)
+        balances = self.queue.get_balances()
+        lots = [(currency, trade.source_id, amount) for currency, trade, amount in self.queue.get_open_lots()]
+
+        # the trades get new persistence ids when they are imported again
+        delete_transaction_data(self.session)
+        self.session.expunge_all()
+        order = self.import_order()
+        self.assertEqual(1, self.session.query(BalanceSnapshot).count())
+
+        snapshot = load_balance_snapshot(self.session, CUT_OFF)
+        queue = create_balance_queue(QueueType.FIFO, snapshot)
+
+        self.assertDictEqual(balances, queue.get_balances())
+        self.assertListEqual(lots, [(currency, trade.source_id, amount)
+                                    for currency, trade, amount in queue.get_open_lots()])
+        self.assertTrue(all(trade in order.trades for currency, trade, amount in queue.get_open_lots()))
+
+    def test_resume_after_import_with_missing_trade(self):
+        save_balance_snapshot(self.session, self.queue, CUT_OFF)
+
+        delete_transaction_data(self.session)
+        self.session.expunge_all()
+        self.import_order(3)  # the last buy trade is missing
+
+        with self.assertRaises(Error):
+            load_balance_snapshot(self.session, CUT_OFF)
+
+
+class TestHoldingPeriod(TestCase):
+
+    def test_get_holding_period(self):
+        self.assertEqual(None, get_holding_period(Configuration.from_string('tax-year: 2017')))
+        self.assertEqual(relativedelta(months=12),
+                         get_holding_period(Configuration.from_string('holding-period-months: 12')))
+
+    def test_get_holding_period_invalid(self):
+        with self.assertRaises(Error):
+            get_holding_period(Configuration.from_string("holding-period-months: 'one year'"))
+
+
+class TestCompareProfitLoss(TestCase):
+
+    def test_compare(self):
+        trade_creator = TradeCreator('EUR', {'BTC': '0.001'})
+        order = Order('1', 'test')
+        for month, price, sell, buy in ((1, '1000', ['EUR', '1000'], ['BTC', '1']),
+                                        (2, '3000', ['EUR', '3000'], ['BTC', '1']),
+                                        (3, '2000', ['EUR', '2000'], ['BTC', '1']),
+                                        (4, '2500', ['BTC', '1.5'], ['EUR', '3750'])):
+            trade_creator.set_tax_exchange_rate('BTC', price)
+            trade = trade_creator.create_trade({'sell': sell, 'buy': buy, 'fee': ['EUR', '0']})
+            trade.timestamp = datetime(2017, month, 1, tzinfo=UTC)
+            # noinspection PyUnresolvedReferences
+            order.trades.append(trade)
+
+        configuration = Configuration.from_string("tax-currency: 'EUR'\ntax-year: 2017")
+        totals = compare_profit_loss([order], configuration)
+
+        self.assertSetEqual(set(QueueType), set(totals))
+        for queue_type, expected_cost in ((QueueType.FIFO, Decimal('2500')), (QueueType.LIFO, Decimal('3500')),
+                                          (QueueType.HIFO, Decimal('4000')), (QueueType.LOFO, Decimal('2000'))):
+            self.assertEqual(Decimal('3750'), totals[queue_type]['proceeds'])
+            self.assertEqual(expected_cost, totals[queue_type]['cost'], queue_type.name)
+            self.assertEqual(Decimal('3750') - expected_cost, totals[queue_type]['profit / loss'], queue_type.name)
+
+
+class TestFindExchangeRates(TestCase):
+
+    def test_cross_rates_without_queries(self):
+        configuration = Configuration.from_string("""
+          database:
+            url: 'sqlite://'
+          tax-currency: 'EUR'
+          tax-year: 2018
+          query-exchange-rate-apis: True
+          triangulate-exchange-rates: True
+        """)
+        session = init_db(configuration)
+        trade_creator = TradeCreator('EUR', {'ETH': '0.002', 'OMG': '0.2'})
+        order = Order('1', 'test')
+        for day, sell, buy, fee in ((10, ['EUR', '500'], ['ETH', '1'], ['EUR', '1']),
+                                    (11, ['ETH', '1'], ['OMG', '100'], ['OMG', '1'])):
+            trade = trade_creator.create_trade({'sell': sell, 'buy': buy, 'fee': fee})
+            trade.timestamp = datetime(2018, 5, day, tzinfo=UTC)
+            for transaction in trade.transactions:
+                transaction.timestamp = trade.timestamp
+            # noinspection PyUnresolvedReferences
+            order.trades.append(trade)
+
+        with mock.patch('src.ExchangeRates.price.get_historical_data') as query:
+            find_exchange_rates(session, [order], configuration)
+            self.assertEqual(0, query.call_count)
+
+        trade = order.trades[1]
+        sell = trade.get_transaction(TransactionType.SELL)
+        fee = trade.get_transaction(TransactionType.FEE)
+        self.assertEqual('cross:ETH/EUR', sell.exchange_rate.source.source_id)
+        self.assertEqual(Decimal('500'), sell.converted_amount)
+        self.assertEqual('cross:OMG/ETH/EUR', fee.exchange_rate.source.source_id)
+        self.assertEqual(Decimal('5'), fee.converted_amount)
+        session.close()
+
+
+class TestValuationCrossRates(TestCase):
+    """
+    XYZ is valued in USD through BTC, which is neither a position nor the tax currency.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        sections = []
+        for base_currency, quote_currency, rate in (('BTC', 'USD', '4000'), ('XYZ', 'BTC', '0.001')):
+            file = os.path.join(self.directory.name, f'{base_currency}.csv')
+            with open(file, 'w') as stream:
+                stream.write(f'Date,{quote_currency}\n2018-12-31,{rate}\n')
+            sections.append(f"""
+            - id: '{base_currency}'
+              file: '{file}'
+              short-description: '{base_currency}'
+              long-description: '{base_currency}'
+              base-currency: '{base_currency}'
+              delimiter: ','
+              quotechar: '"'
+              encoding: 'utf8'
+              empty-marker: 'N/A'""")
+
+        self.configuration = Configuration.from_string(f"""
+          tax-currency: 'USD'
+          tax-year: 2018
+          query-exchange-rate-apis: False
+          triangulate-exchange-rates: True
+          exchange-rate-files:{''.join(sections)}
+        """)
+
+        trade_creator = TradeCreator('USD', {'XYZ': '0.5'})
+        trade = trade_creator.create_trade({'sell': ['USD', '20'], 'buy': ['XYZ', '10'], 'fee': ['USD', '0']})
+        trade.timestamp = datetime(2018, 6, 1, tzinfo=UTC)
+        source = ExchangeRateSource('test', 'test source', 'test source')
+        for transaction in trade.transactions:
+            rate = Decimal('2') if transaction.currency == 'XYZ' else Decimal(1)
+            transaction.exchange_rate = ExchangeRate(transaction.currency, 'USD', rate, trade.timestamp, source)
+        self.order = Order('1', 'test')
+        # noinspection PyUnresolvedReferences
+        self.order.trades.append(trade)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_open_positions(self):
+        with mock.patch('src.Application.log_open_positions') as log_open_positions:
+            calculate_profit_loss([self.order], self.configuration, None, open_positions=True)
+
+        positions = log_open_positions.call_args[0][0]
+        self.assertEqual(Decimal('40'), positions['XYZ'].value)
+        self.assertEqual('cross:XYZ/BTC/USD', positions['XYZ'].exchange_rate.source.source_id)
+
+    def test_daily_balances(self):
+        output_file = os.path.join(self.directory.name, 'balances.csv')
+        calculate_daily_balances([self.order], self.configuration, output_file)
+
+        with open(output_file, newline='') as stream:
+            rows = list(csv.reader(stream))
+
+        self.assertListEqual(['XYZ', 'USD'], rows[2][:2])
+        self.assertEqual('40.00', rows[2][-1])  # valued on the last day of the year
@@ -1,6 +1,11 @@
+import random
+from datetime import datetime
 from decimal import Decimal
 from unittest import TestCase
 
+from dateutil.relativedelta import relativedelta
+from dateutil.tz import UTC
+
 from src.BalanceQueue import BalanceQueue, QueueType
 from test.utilities.TradeCreator import TradeCreator
 
@@ -232,3 +237,245 @@ class TestBalanceQueue(TestCase):
 
         self.assertEqual(Decimal('700'), self.queue.get_balance('EUR'))
         self.assertEqual(Decimal('0.3'), self.queue.get_balance('BTC'))
+
+    def test_get_balances(self):
+        """
+        Asserts that the running balances match the queues after full, partial and unaccounted sells (FIFO and LIFO).
+        """
+
+        for queue_type in (QueueType.FIFO, QueueType.LIFO):
+
+            queue = BalanceQueue(queue_type, True)
+
+            for sell, buy in ((['EUR', '250'], ['BTC', '0.5']),
+                              (['EUR', '500'], ['BTC', '0.5']),
+                              (['BTC', '0.7'], ['ETH', '7']),
+                              (['ETH', '2'], ['EUR', '200']),
+                              (['BTC', '0.4'], ['EUR', '400'])):
+                queue.trade(self.trade_creator.create_trade({'sell': sell, 'buy': buy, 'fee': ['EUR', '1']}))
+
+                for currency, balance in queue.get_balances().items():
+                    self.assertEqual(sum((item.amount for item in queue.queues[currency]), Decimal('0')), balance)
+
+            self.assertDictEqual({'EUR': Decimal('600'), 'BTC': Decimal('0'), 'ETH': Decimal('5')},
+                                 queue.get_balances())
+
+    def test_str(self):
+        self.queue.trade(self.trade_creator.create_trade({
+            'sell': ['EUR', '1000'],
+            'buy': ['BTC', '1'],
+            'fee': ['BTC', '0.001']
+        }))
+
+        self.assertEqual("['0.00', '1.00000']", str(self.queue))
+
+    def test_open_lots(self):
+        """
+        Asserts that a queue restored from the open lots of another queue has the same state.
+        """
+
+        buy_a = self.trade_creator.create_trade({'sell': ['EUR', '250'], 'buy': ['BTC', '0.5'], 'fee': ['EUR', '1']})
+        buy_b = self.trade_creator.create_trade({'sell': ['EUR', '500'], 'buy': ['BTC', '0.5'], 'fee': ['EUR', '1']})
+        self.queue.trade(buy_a)
+        self.queue.trade(buy_b)
+        self.queue.trade(self.trade_creator.create_trade({'sell': ['BTC', '0.7'], 'buy': ['EUR', '700'],
+                                                          'fee': ['EUR', '1']}))
+
+        lots = self.queue.get_open_lots()
+        self.assertIn(('BTC', buy_b, Decimal('0.3')), lots)
+        self.assertEqual(2, len(lots))
+
+        queue = BalanceQueue(QueueType.FIFO, True)
+        for currency, trade, amount in lots:
+            queue.add_open_lot(currency, trade, amount)
+
+        self.assertListEqual(lots, queue.get_open_lots())
+        self.assertDictEqual({'BTC': Decimal('0.3'), 'EUR': Decimal('700')}, queue.get_balances())
+
+    def buy_btc(self, queue, price, amount='1'):
+        self.trade_creator.set_tax_exchange_rate('BTC', price)
+        queue.trade(self.trade_creator.create_trade({
+            'sell': ['EUR', str(Decimal(price) * Decimal(amount))],
+            'buy': ['BTC', amount],
+            'fee': ['EUR', '0']
+        }))
+
+    def sell_btc(self, queue, amount):
+        return queue.trade(self.trade_creator.create_trade({
+            'sell': ['BTC', amount],
+            'buy': ['EUR', '1000'],
+            'fee': ['EUR', '0']
+        }))
+
+    def test_hifo(self):
+        """
+        Asserts that the lots with the highest cost per unit are sold first, including partially sold lots.
+        """
+
+        queue = BalanceQueue(QueueType.HIFO, True)
+        for price in ('500', '2000', '1000', '2000'):
+            self.buy_btc(queue, price)
+
+        info = self.sell_btc(queue, '2.5')
+        self.assertEqual(Decimal('4500'), info.cost, '2000 + 2000 + 0.5 * 1000')
+
+        info = self.sell_btc(queue, '1')
+        self.assertEqual(Decimal('750'), info.cost, '0.5 * 1000 (rest of partially sold lot) + 0.5 * 500')
+
+        self.assertEqual(Decimal('0.5'), queue.get_balance('BTC'))
+
+    def test_hifo_same_cost(self):
+        """
+        Asserts that lots with the same cost per unit are sold in the order they were bought.
+        """
+
+        queue = BalanceQueue(QueueType.HIFO, True)
+        self.buy_btc(queue, '1000', '1')
+        first = queue.queues['BTC'].pop()
+        queue.queues['BTC'].put_back(first)
+        self.buy_btc(queue, '1000', '2')
+
+        info = self.sell_btc(queue, '1.5')
+        self.assertListEqual([first.trade, queue.queues['BTC'].pop().trade], [item.trade for item in info.buy_items])
+
+    def test_lofo(self):
+        """
+        Asserts that the lots with the lowest cost per unit are sold first.
+        """
+
+        queue = BalanceQueue(QueueType.LOFO, True)
+        for price in ('1000', '500', '2000'):
+            self.buy_btc(queue, price)
+
+        info = self.sell_btc(queue, '1.5')
+        self.assertEqual(Decimal('1000'), info.cost, '500 + 0.5 * 1000')
+
+        self.assertListEqual([Decimal('0.5'), Decimal('1')], [item.amount for item in queue.queues['BTC']])
+
+    def test_lot_heap_put_back(self):
+        queue = BalanceQueue(QueueType.LOFO, True)
+        self.buy_btc(queue, '1000')
+        self.buy_btc(queue, '500')
+
+        heap = queue.queues['BTC']
+        item = heap.pop()
+        heap.pop()
+        with self.assertRaises(ValueError):
+            heap.put_back(item)
+
+    def test_item_split(self):
+        queue = BalanceQueue(QueueType.FIFO, True)
+        self.buy_btc(queue, '1000', '2')
+        item = queue.queues['BTC'][0]
+
+        part = item.split(5000000000)  # 0.5 BTC
+
+        self.assertIs(item.trade, part.trade)
+        self.assertEqual(Decimal('0.5'), part.amount)
+        self.assertEqual(Decimal('1.5'), item.amount)
+        self.assertEqual(Decimal('500'), part.cost)
+        self.assertEqual(Decimal('1500'), item.cost)
+        self.assertEqual(Decimal('1000'), part.unit_cost)
+        self.assertFalse(hasattr(item, '__dict__'))
+
+    def test_item_unit_values(self):
+        """
+        Asserts that the cost and fee per unit are rounded, but the cost and fee of the whole lot are not affected.
+        """
+
+        for fixed_point in (False, True):
+            queue = BalanceQueue(QueueType.FIFO, True, fixed_point)
+            self.trade_creator.set_tax_exchange_rate('BTC', '1')
+            queue.trade(self.trade_creator.create_trade({'sell': ['EUR', '1000'], 'buy': ['BTC', '3'],
+                                                         'fee': ['EUR', '1']}))
+
+            item = queue.queues['BTC'][0]
+            self.assertEqual(Decimal('333.33333333333333333333'), item.unit_cost)
+
+            info = self.sell_btc(queue, '3')
+            self.assertEqual(Decimal('1000'), info.cost.quantize(Decimal('1E-10')))
+            self.assertEqual(Decimal('1'), info.buying_fees.quantize(Decimal('1E-10')))
+
+    def test_fixed_point(self):
+        """
+        Asserts that fixed point arithmetic gives exactly the same results as Decimal arithmetic, on randomized
+        trades with every queue type and a holding period.
+        """
+
+        def create_trades():
+            rng = random.Random(42)
+            trades = []
+            for i in range(300):
+                self.trade_creator.set_tax_exchange_rate('BTC', str(rng.randint(100000, 9999999) / 1000))
+                amount = Decimal(rng.randint(1, 10 ** 8)).scaleb(-8)
+                if rng.random() < 0.6:
+                    trade = {'sell': ['EUR', str(amount * 1000)], 'buy': ['BTC', str(amount)],
+                             'fee': ['EUR', str(rng.randint(0, 10 ** 6) / 10 ** 4)]}
+                else:
+                    trade = {'sell': ['BTC', str(amount)], 'buy': ['EUR', str(amount * 1000)],
+                             'fee': ['BTC', '0.00001']}
+                trade = self.trade_creator.create_trade(trade)
+                trade.timestamp = datetime(2017, 1, 1, tzinfo=UTC) + relativedelta(days=i * 3)
+                trades.append(trade)
+            return trades
+
+        for queue_type in QueueType:
+
+            decimal_queue = BalanceQueue(queue_type, True, False, relativedelta(months=12))
+            fixed_point_queue = BalanceQueue(queue_type, True, True, relativedelta(months=12))
+
+            for decimal_trade, fixed_point_trade in zip(create_trades(), create_trades()):
+
+                expected = decimal_queue.trade(decimal_trade)
+                actual = fixed_point_queue.trade(fixed_point_trade)
+
+                for name in ('cost', 'buying_fees', 'proceeds', 'selling_fees', 'pl', 'taxable_pl', 'tax_free_pl'):
+                    self.assertEqual(getattr(expected, name), getattr(actual, name), f'{queue_type.name} {name}')
+
+    def test_holding_period(self):
+        """
+        Asserts that amounts held longer than the holding period are tax free and the profit / loss is divided
+        accordingly.
+        """
+
+        for fixed_point in (False, True):
+
+            queue = BalanceQueue(QueueType.FIFO, True, fixed_point, relativedelta(months=12))
+
+            for timestamp, price in ((datetime(2017, 1, 1, tzinfo=UTC), '1000'),
+                                     (datetime(2017, 9, 1, tzinfo=UTC), '2000')):
+                self.trade_creator.set_tax_exchange_rate('BTC', price)
+                trade = self.trade_creator.create_trade({'sell': ['EUR', price], 'buy': ['BTC', '1'],
+                                                         'fee': ['EUR', '0']})
+                trade.timestamp = timestamp
+                queue.trade(trade)
+
+            self.trade_creator.set_tax_exchange_rate('BTC', '3000')
+            trade = self.trade_creator.create_trade({'sell': ['BTC', '1.5'], 'buy': ['EUR', '4500'],
+                                                     'fee': ['EUR', '0']})
+            trade.timestamp = datetime(2018, 3, 1, tzinfo=UTC)
+            info = queue.trade(trade)
+
+            self.assertEqual(1, len(info.tax_free_items))
+            self.assertEqual(1, len(info.taxable_items))
+            self.assertEqual(Decimal('1'), info.tax_free_amount)
+            self.assertEqual(Decimal('0.5'), info.taxable_amount)
+            self.assertEqual(Decimal('2500'), info.pl)
+            self.assertEqual(Decimal('500'), info.taxable_pl, '1500 proceeds - 1000 cost')
+            self.assertEqual(Decimal('2000'), info.tax_free_pl, '3000 proceeds - 1000 cost')
+
+    def test_holding_period_not_reached(self):
+        queue = BalanceQueue(QueueType.FIFO, True, holding_period=relativedelta(months=12))
+
+        trade = self.trade_creator.create_trade({'sell': ['EUR', '1000'], 'buy': ['BTC', '1'], 'fee': ['EUR', '0']})
+        trade.timestamp = datetime(2017, 3, 1, tzinfo=UTC)
+        queue.trade(trade)
+
+        trade = self.trade_creator.create_trade({'sell': ['BTC', '2'], 'buy': ['EUR', '2000'], 'fee': ['EUR', '0']})
+        trade.timestamp = datetime(2018, 3, 1, tzinfo=UTC)  # exactly 12 months later
+        info = queue.trade(trade)
+
+        self.assertListEqual([], info.tax_free_items)
+        self.assertEqual(2, len(info.taxable_items), 'one bought item and one unaccounted item')
+        self.assertEqual(info.pl, info.taxable_pl)
+        self.assertEqual(Decimal('0'), info.tax_free_pl)
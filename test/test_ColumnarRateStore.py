@@ -0,0 +1,79 @@
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase, skipUnless
+
+from dateutil.tz import UTC
+
+from src.ColumnarRateStore import ColumnarRateStore, is_numpy_available
+from src.ExchangeRateSeries import ExchangeRateSeries
+from src.bo.ExchangeRate import ExchangeRate
+from src.bo.ExchangeRateSource import ExchangeRateSource
+
+
+def day(day_of_month, hour=0):
+    return datetime(2018, 5, day_of_month, hour, tzinfo=UTC)
+
+
+def create_series(base_currency, quote_currency, rates):
+    source = ExchangeRateSource('test', 'test', 'test')
+    series = ExchangeRateSeries(base_currency, quote_currency)
+    for timestamp, rate in rates.items():
+        series.put(timestamp, ExchangeRate(base_currency, quote_currency, rate, timestamp, source))
+    return series
+
+
+@skipUnless(is_numpy_available(), 'numpy is not installed')
+class TestColumnarRateStore(TestCase):
+
+    def setUp(self):
+        self.eur_usd = create_series('EUR', 'USD', {day(12): Decimal('1.2'), day(10): Decimal('1.1'),
+                                                    day(14): Decimal('1.4')})
+        self.btc_eur = create_series('BTC', 'EUR', {day(10): Decimal('8000'), day(11): Decimal('8100')})
+        self.store = ColumnarRateStore([self.eur_usd, create_series('ETH', 'EUR', {}), self.btc_eur])
+
+    def find_closest(self, base_currency, quote_currency, timestamp):
+        rows, inverted, distances = self.store.find_closest([(base_currency, quote_currency, timestamp)])
+        if rows[0] < 0:
+            return None
+        return self.store.get_exchange_rate(rows[0]), self.store.get_rate(rows[0], inverted[0]), distances[0]
+
+    def test_len(self):
+        self.assertEqual(5, len(self.store))
+
+    def test_find_closest_same_as_series(self):
+        for series in (self.eur_usd, self.btc_eur):
+            for day_of_month in range(1, 20):
+                for hour in (0, 11, 12, 13):
+                    timestamp = day(day_of_month, hour)
+                    exchange_rate, rate, distance = self.find_closest(series.base_currency,
+                                                                      series.quote_currency, timestamp)
+                    self.assertIs(series.get_closest(timestamp), exchange_rate)
+                    self.assertEqual(exchange_rate.rate, rate)
+                    self.assertEqual(abs(exchange_rate.timestamp - timestamp).total_seconds(), distance)
+
+    def test_find_closest_inverse(self):
+        exchange_rate, rate, distance = self.find_closest('EUR', 'BTC', day(11, 1))
+
+        self.assertIs(self.btc_eur.get(day(11)), exchange_rate)
+        self.assertEqual(Decimal('1') / Decimal('8100'), rate)
+        self.assertEqual(3600, distance)
+
+    def test_find_closest_unknown_pair(self):
+        self.assertEqual(None, self.find_closest('ETH', 'EUR', day(10)))
+        self.assertEqual(None, self.find_closest('BTC', 'USD', day(10)))
+
+    def test_find_closest_batch(self):
+        rows, inverted, distances = self.store.find_closest([
+            ('EUR', 'USD', day(11, 13)),
+            ('OMG', 'EUR', day(10)),
+            ('EUR', 'BTC', day(1)),
+            ('USD', 'EUR', day(30)),
+        ])
+
+        self.assertListEqual([1, -1, 3, 2], list(rows))
+        self.assertListEqual([False, False, True, True], list(inverted))
+
+    def test_empty(self):
+        store = ColumnarRateStore([])
+        rows, inverted, distances = store.find_closest([('EUR', 'USD', day(10))])
+        self.assertListEqual([-1], list(rows))
@@ -0,0 +1,33 @@
+import csv
+import os
+import tempfile
+from unittest import TestCase
+
+from src.Application import get_report_header
+from src.BalanceQueue import QueueType
+from src.CsvReportWriter import CsvReportWriter
+
+
+class TestCsvReportWriter(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.directory.name, 'report.csv')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write(self):
+        header = get_report_header('EUR', QueueType.FIFO)
+        rows = [['2017-01-01 00:00:00', '1', '[#1|100%|1.00000 BTC], [#2|0%|0.00001 BTC]', '"quoted"'],
+                ['2017-01-02 00:00:00', '2', '', '-1.50']]
+
+        with CsvReportWriter(self.file) as writer:
+            writer.write_row(header)
+            for row in rows:
+                writer.write_row(row)
+
+        with open(self.file, 'rt', newline='', encoding='utf8') as stream:
+            self.assertListEqual([header] + rows, list(csv.reader(stream)))
+
+        self.assertIn('FIFO entries', header)
@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+from src.CurrencyGraph import CurrencyGraph
+
+
+class TestCurrencyGraph(TestCase):
+
+    def setUp(self):
+        self.graph = CurrencyGraph()
+
+    def test_find_path_unknown(self):
+        self.assertEqual(None, self.graph.find_path('OMG', 'EUR'))
+
+    def test_find_path_direct(self):
+        self.graph.add_pair('ETH', 'EUR')
+
+        self.assertListEqual(['ETH', 'EUR'], self.graph.find_path('ETH', 'EUR'))
+        self.assertListEqual(['EUR', 'ETH'], self.graph.find_path('EUR', 'ETH'))
+
+    def test_find_path_shortest(self):
+        self.graph.add_pair('OMG', 'ETH')
+        self.graph.add_pair('ETH', 'BTC')
+        self.graph.add_pair('BTC', 'EUR')
+        self.graph.add_pair('ETH', 'USD')
+        self.graph.add_pair('USD', 'EUR')
+
+        self.assertListEqual(['OMG', 'ETH', 'BTC', 'EUR'], self.graph.find_path('OMG', 'EUR'))
+
+        self.graph.add_pair('ETH', 'EUR')
+        self.assertListEqual(['OMG', 'ETH', 'EUR'], self.graph.find_path('OMG', 'EUR'))
+
+    def test_find_path_not_connected(self):
+        self.graph.add_pair('OMG', 'ETH')
+        self.graph.add_pair('BTC', 'EUR')
+
+        self.assertEqual(None, self.graph.find_path('OMG', 'EUR'))
+
+        self.graph.add_pair('ETH', 'BTC')
+        self.assertListEqual(['OMG', 'ETH', 'BTC', 'EUR'], self.graph.find_path('OMG', 'EUR'))
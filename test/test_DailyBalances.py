@@ -0,0 +1,64 @@
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase
+
+from dateutil.tz import UTC
+
+from src.BalanceQueue import BalanceQueue, QueueType
+from src.DailyBalances import sweep_daily_balances
+from src.bo.Order import Order
+from test.utilities.ExchangeRatesStandIn import ExchangeRatesStandIn
+from test.utilities.TradeCreator import TradeCreator
+
+
+class TestDailyBalances(TestCase):
+
+    def setUp(self):
+        trade_creator = TradeCreator('EUR', {'BTC': '0.001', 'ETH': '0.01'})
+        order = Order('1', 'kraken')
+
+        self.trades = []
+        for timestamp, sell, buy in ((datetime(2016, 12, 31, 12, tzinfo=UTC), ['EUR', '1000'], ['BTC', '1']),
+                                     (datetime(2017, 1, 2, 0, tzinfo=UTC), ['BTC', '0.5'], ['ETH', '5']),
+                                     (datetime(2017, 1, 2, 23, tzinfo=UTC), ['ETH', '1'], ['EUR', '100']),
+                                     (datetime(2017, 12, 31, 23, tzinfo=UTC), ['BTC', '0.5'], ['EUR', '600']),
+                                     (datetime(2018, 1, 1, 0, tzinfo=UTC), ['ETH', '4'], ['EUR', '400'])):
+            trade = trade_creator.create_trade({'sell': sell, 'buy': buy, 'fee': ['EUR', '0']})
+            trade.timestamp = timestamp
+            self.trades.append((order, trade))
+
+    def test_sweep(self):
+        daily_balances = sweep_daily_balances(self.trades, BalanceQueue(QueueType.FIFO, True), 2017)
+
+        self.assertEqual(365, len(daily_balances.days))
+        self.assertEqual(datetime(2017, 1, 2, tzinfo=UTC), daily_balances.days[0])
+        self.assertListEqual(['BTC', 'ETH', 'EUR'], list(daily_balances.balances))
+
+        btc = daily_balances.balances['BTC']
+        self.assertListEqual([Decimal('1'), Decimal('0.5'), Decimal('0.5')], btc[:3])
+        self.assertEqual(Decimal('0.5'), btc[-2])
+        self.assertEqual(Decimal('0'), btc[-1])
+
+        eth = daily_balances.balances['ETH']
+        self.assertListEqual([Decimal('0'), Decimal('4')], eth[:2])
+        self.assertEqual(Decimal('4'), eth[-1])  # the sale on January 1st is not in the tax year
+
+        self.assertEqual(Decimal('700'), daily_balances.balances['EUR'][-1])
+
+    def test_value(self):
+        daily_balances = sweep_daily_balances(self.trades, BalanceQueue(QueueType.FIFO, True), 2017)
+        exchange_rates = ExchangeRatesStandIn({'BTC': '1200'})
+
+        daily_balances.value(exchange_rates, 'EUR')
+
+        self.assertEqual(364 + 364, len(exchange_rates.requests))  # no rates for zero balances and tax currency
+        self.assertEqual(Decimal('600'), daily_balances.values['BTC'][1])
+        self.assertEqual(Decimal('0'), daily_balances.values['ETH'][0])
+        self.assertIsNone(daily_balances.values['ETH'][1])  # no exchange rate
+
+        rows = daily_balances.get_rows()
+        self.assertEqual(1 + 3 * 2 + 1, len(rows))
+        self.assertListEqual(['currency', 'unit', '01.01.2017', '02.01.2017'], rows[0][:4])
+        self.assertListEqual(['ETH', 'EUR', '0.00', '-'], rows[4][:4])  # no exchange rate for ETH
+        self.assertListEqual(['total', 'EUR'], rows[-1][:2])
+        self.assertTrue(all(len(row) == 2 + 365 for row in rows))
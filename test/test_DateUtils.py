@@ -20,3 +20,4 @@ class TestDateUtils(TestCase):
     def test_date_and_time_to_string(self):
         self.assertEqual("01.01.2018 00:00:00 UTC",
                          date_and_time_to_string(datetime(2018, 1, 1, 0, 0, 0, 0, tzinfo=UTC)))
+        self.assertEqual("-", date_and_time_to_string(None))
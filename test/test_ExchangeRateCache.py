@@ -0,0 +1,85 @@
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import TestCase
+
+from dateutil.tz import UTC
+
+from src.ExchangeRateCache import ExchangeRateCache, get_days, parse_day
+
+TTL = 3600
+
+
+class Clock:
+
+    def __init__(self, time):
+        self.time = time.timestamp()
+
+    def __call__(self):
+        return self.time
+
+
+class TestExchangeRateCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.directory.name, 'cache.sqlite')
+        self.clock = Clock(datetime(2018, 5, 20, 12, tzinfo=UTC))
+        self.cache = ExchangeRateCache(self.file, TTL, self.clock)
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_get_not_cached(self):
+        self.assertEqual(None, self.cache.get('ratesapi', 'EUR', 'USD', date(2018, 5, 10)))
+
+    def test_put_get(self):
+        self.cache.put('ratesapi', 'EUR', 'USD', date(2018, 5, 10), Decimal('1.1878'))
+
+        self.assertEqual(Decimal('1.1878'), self.cache.get('ratesapi', 'EUR', 'USD', date(2018, 5, 10)))
+        self.assertEqual(None, self.cache.get('ratesapi', 'USD', 'EUR', date(2018, 5, 10)))
+        self.assertEqual(None, self.cache.get('cryptocompare', 'EUR', 'USD', date(2018, 5, 10)))
+        self.assertEqual(None, self.cache.get('ratesapi', 'EUR', 'USD', date(2018, 5, 11)))
+
+    def test_persistent(self):
+        self.cache.put('ratesapi', 'EUR', 'USD', date(2018, 5, 10), Decimal('1.1878'))
+        self.cache.close()
+
+        with ExchangeRateCache(self.file, TTL, self.clock) as cache:
+            self.assertEqual(Decimal('1.1878'), cache.get('ratesapi', 'EUR', 'USD', date(2018, 5, 10)))
+
+        self.cache = ExchangeRateCache(self.file, TTL, self.clock)
+
+    def test_closed_day_does_not_expire(self):
+        self.cache.put('ratesapi', 'EUR', 'USD', date(2018, 5, 10), Decimal('1.1878'))
+        self.clock.time += 1000 * TTL
+
+        self.assertEqual(Decimal('1.1878'), self.cache.get('ratesapi', 'EUR', 'USD', date(2018, 5, 10)))
+
+    def test_open_day_expires(self):
+        self.cache.put('ratesapi', 'EUR', 'USD', date(2018, 5, 20), Decimal('1.1878'))
+
+        self.clock.time += TTL - 1
+        self.assertEqual(Decimal('1.1878'), self.cache.get('ratesapi', 'EUR', 'USD', date(2018, 5, 20)))
+
+        self.clock.time += 1
+        self.assertEqual(None, self.cache.get('ratesapi', 'EUR', 'USD', date(2018, 5, 20)))
+
+    def test_get_range(self):
+        self.cache.put_all('cryptocompare', 'BTC', 'EUR', {
+            date(2018, 5, 9): Decimal('7500'),
+            date(2018, 5, 10): Decimal('7600'),
+            date(2018, 5, 11): Decimal('7700'),
+        })
+
+        rates = self.cache.get_range('cryptocompare', 'BTC', 'EUR', date(2018, 5, 10), date(2018, 5, 12))
+        self.assertDictEqual({date(2018, 5, 10): Decimal('7600'), date(2018, 5, 11): Decimal('7700')}, rates)
+
+    def test_get_days(self):
+        self.assertListEqual([date(2018, 12, 31), date(2019, 1, 1)], get_days(date(2018, 12, 31), date(2019, 1, 2)))
+        self.assertListEqual([], get_days(date(2018, 12, 31), date(2018, 12, 31)))
+
+    def test_parse_day(self):
+        self.assertEqual(date(2018, 5, 10), parse_day(date(2018, 5, 10).isoformat()))
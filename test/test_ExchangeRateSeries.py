@@ -0,0 +1,93 @@
+from array import array
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase
+
+from dateutil.tz import UTC
+
+from src.ExchangeRateSeries import ExchangeRateSeries
+from src.bo.ExchangeRateSource import ExchangeRateSource
+
+
+def day(day_of_month, hour=0):
+    return datetime(2018, 5, day_of_month, hour, tzinfo=UTC)
+
+
+class TestExchangeRateSeries(TestCase):
+
+    def setUp(self):
+        self.series = ExchangeRateSeries('EUR', 'USD')
+
+    def test_get_closest_empty(self):
+        self.assertEqual(None, self.series.get_closest(day(10)))
+        self.assertEqual(None, self.series.get_closest_timestamp(day(10)))
+
+    def test_get_closest(self):
+        self.series.put(day(10), 'a')
+        self.series.put(day(12), 'b')
+        self.series.put(day(14), 'c')
+
+        self.assertEqual('a', self.series.get_closest(day(1)))
+        self.assertEqual('a', self.series.get_closest(day(10)))
+        self.assertEqual('a', self.series.get_closest(day(10, 23)))
+        self.assertEqual('b', self.series.get_closest(day(11, 1)))
+        self.assertEqual('b', self.series.get_closest(day(12)))
+        self.assertEqual('c', self.series.get_closest(day(14)))
+        self.assertEqual('c', self.series.get_closest(day(30)))
+
+    def test_get_closest_tie(self):
+        """
+        Asserts that the earlier rate wins if two rates are equally close.
+        """
+
+        self.series.put(day(12), 'b')
+        self.series.put(day(10), 'a')
+
+        self.assertEqual('a', self.series.get_closest(day(11)))
+
+    def test_put_unsorted(self):
+        self.series.put(day(14), 'c')
+        self.series.put(day(10), 'a')
+        self.series.put(day(12), 'b')
+
+        self.assertListEqual([day(10), day(12), day(14)], self.series.get_timestamps())
+        self.assertEqual('b', self.series.get_closest(day(12, 5)))
+
+        self.series.put(day(11), 'x')
+        self.assertEqual('x', self.series.get_closest(day(11, 5)))
+
+    def test_put_replace(self):
+        self.series.put(day(10), 'a')
+        self.series.put(day(10), 'b')
+
+        self.assertEqual(1, len(self.series))
+        self.assertListEqual([day(10)], self.series.get_timestamps())
+        self.assertEqual('b', self.series.get(day(10)))
+
+    def test_put_raw(self):
+        source = ExchangeRateSource('test', 'test', 'test')
+        self.series.put_raw(day(10), Decimal('1.1878'), source)
+
+        self.assertEqual(11878000000, self.series.get_scaled_rate(day(10)))
+
+        exchange_rate = self.series.get_closest(day(11))
+        self.assertEqual('EUR', exchange_rate.base_currency)
+        self.assertEqual('USD', exchange_rate.quote_currency)
+        self.assertEqual(Decimal('1.1878'), exchange_rate.rate)
+        self.assertEqual(day(10), exchange_rate.timestamp)
+        self.assertIs(source, exchange_rate.source)
+
+        # the exchange rate object is created once and then kept
+        self.assertIs(exchange_rate, self.series.get(day(10)))
+        self.assertEqual(11878000000, self.series.get_scaled_rate(day(10)))
+
+    def test_put_mapped(self):
+        source = ExchangeRateSource('test', 'test', 'test')
+        self.series.put_mapped(array('q', [int(day(10).timestamp()), int(day(12).timestamp())]),
+                               array('q', [11878000000, 11934000000]), source)
+        self.series.put_raw(day(12), Decimal('1.2'), source)  # replaces the mapped rate
+
+        self.assertEqual(2, len(self.series))
+        self.assertEqual(Decimal('1.1878'), self.series.get_closest(day(9)).rate)
+        self.assertEqual(Decimal('1.2'), self.series.get_closest(day(12)).rate)
+        self.assertIs(source, self.series.get(day(10)).source)
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from src.ExchangeRateSnapshot import ExchangeRateSnapshot, get_snapshot_file
+
+TESTDATA_DATA_FILE_1 = os.path.join(os.path.dirname(__file__), 'testdata', 'test-exchange-rates-1.csv')
+TESTDATA_DATA_FILE_2 = os.path.join(os.path.dirname(__file__), 'testdata', 'test-exchange-rates-2.csv')
+
+# 2018-05-10 00:00:00 UTC
+EPOCH = 1525910400
+
+
+class TestExchangeRateSnapshot(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.snapshot_dir = os.path.join(self.directory.name, 'snapshots')
+        self.file = os.path.join(self.directory.name, 'rates.csv')
+        shutil.copyfile(TESTDATA_DATA_FILE_1, self.file)
+        self.section = {
+            'id': 'test',
+            'file': self.file,
+            'base-currency': 'EUR',
+            'delimiter': ',',
+            'quotechar': '"',
+            'encoding': 'utf8',
+            'empty-marker': 'N/A',
+        }
+        self.snapshots = []
+
+    def tearDown(self):
+        for snapshot in self.snapshots:
+            snapshot.close()
+        self.directory.cleanup()
+
+    def open_or_compile(self):
+        snapshot = ExchangeRateSnapshot.open_or_compile(self.snapshot_dir, self.section)
+        self.snapshots.append(snapshot)
+        return snapshot
+
+    def get_snapshot_mtime(self):
+        return os.stat(get_snapshot_file(self.snapshot_dir, self.section)).st_mtime_ns
+
+    def append_row(self, date):
+        """
+        Appends the row of the second test file (2018-05-11, USD 1.1934) with the specified date.
+        """
+
+        with open(TESTDATA_DATA_FILE_2) as stream:
+            row = stream.readlines()[1]
+
+        with open(self.file, 'a') as stream:
+            stream.write(row.replace('2018-05-11', date))
+
+    def test_compile(self):
+        snapshot = self.open_or_compile()
+
+        self.assertEqual('EUR', snapshot.base_currency)
+        self.assertEqual(['USD', 'JPY', 'BGN'], snapshot.get_quote_currencies()[:3])
+        self.assertNotIn('CYP', snapshot.get_quote_currencies()[:3])
+
+        epochs, rates = snapshot.get_arrays('USD')
+        self.assertListEqual([EPOCH], list(epochs))
+        self.assertListEqual([11878000000], list(rates))
+
+        epochs, rates = snapshot.get_arrays('CYP')  # only 'N/A'
+        self.assertEqual(0, len(epochs))
+
+        self.assertEqual(None, snapshot.get_arrays('XXX'))
+
+    def test_sorted(self):
+        self.append_row('2018-05-01')
+        snapshot = self.open_or_compile()
+
+        epochs, rates = snapshot.get_arrays('USD')
+        self.assertListEqual([EPOCH - 9 * 86400, EPOCH], list(epochs))
+        self.assertListEqual([11934000000, 11878000000], list(rates))
+
+    def test_reuse(self):
+        self.open_or_compile()
+        mtime = self.get_snapshot_mtime()
+
+        self.open_or_compile()
+        self.assertEqual(mtime, self.get_snapshot_mtime())
+
+        # same content, new modification time: hash matches, the new modification time is recorded
+        os.utime(self.file, ns=(0, 0))
+        snapshot = self.open_or_compile()
+        self.assertListEqual([EPOCH], list(snapshot.get_arrays('USD')[0]))
+
+        with mock.patch('src.ExchangeRateSnapshot.get_file_hash') as get_file_hash:
+            snapshot = self.open_or_compile()
+            get_file_hash.assert_not_called()
+
+        self.assertListEqual([11878000000], list(snapshot.get_arrays('USD')[1]))
+
+    def test_update_modification_time_unmapped(self):
+        self.open_or_compile()
+        snapshot = ExchangeRateSnapshot(get_snapshot_file(self.snapshot_dir, self.section))
+        self.snapshots.append(snapshot)
+        os.utime(self.file, ns=(0, 0))
+
+        def replace(source, destination):
+            self.assertTrue(snapshot._mmap.closed)  # the file must not be replaced while it is mapped
+            os.rename(source, destination)
+
+        with mock.patch('src.ExchangeRateSnapshot.os.replace', side_effect=replace) as replace_mock:
+            snapshot.update_modification_time(self.section)
+            replace_mock.assert_called_once()
+
+        self.assertFalse(snapshot._mmap.closed)
+        self.assertListEqual([EPOCH], list(snapshot.get_arrays('USD')[0]))
+
+        reopened = ExchangeRateSnapshot(snapshot._file)
+        self.snapshots.append(reopened)
+        self.assertEqual(0, reopened._metadata['source']['mtime-ns'])
+
+    def test_invalidate_on_change(self):
+        self.open_or_compile()
+
+        self.append_row('2018-05-11')
+        snapshot = self.open_or_compile()
+
+        epochs, rates = snapshot.get_arrays('USD')
+        self.assertListEqual([EPOCH, EPOCH + 86400], list(epochs))
+        self.assertListEqual([11878000000, 11934000000], list(rates))
+
+    def test_invalidate_on_options(self):
+        snapshot = self.open_or_compile()
+        self.assertFalse(snapshot.is_valid(dict(self.section, **{'base-currency': 'USD'})))
+        self.assertTrue(snapshot.is_valid(dict(self.section, id='other')))
+
+    def test_damaged(self):
+        self.open_or_compile()
+        snapshot_file = get_snapshot_file(self.snapshot_dir, self.section)
+        with open(snapshot_file, 'rb') as stream:
+            content = stream.read()
+
+        for damaged_content in (content[:-8], content[:20], b'', b'X' * len(content)):
+            with open(snapshot_file, 'wb') as stream:
+                stream.write(damaged_content)
+
+            snapshot = self.open_or_compile()
+
+            self.assertListEqual([EPOCH], list(snapshot.get_arrays('USD')[0]))
+            with open(snapshot_file, 'rb') as stream:
+                self.assertEqual(content, stream.read())
@@ -1,12 +1,20 @@
+import json
 import os
-from datetime import datetime
+import tempfile
+import threading
+from datetime import datetime, date
 from decimal import Decimal
-from unittest import TestCase
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from unittest import TestCase, mock, skipUnless
+from urllib.parse import urlparse, parse_qs
 
 from dateutil.tz import UTC
 
+from src.ColumnarRateStore import ColumnarRateStore, is_numpy_available
 from src.Configuration import Configuration
-from src.ExchangeRates import ExchangeRates
+from src.Error import Error
+from src.ExchangeRateCache import ExchangeRateCache, get_days
+from src.ExchangeRates import ExchangeRates, get_projected_columns
 
 TESTDATA_DATA_FILE_1 = os.path.join(os.path.dirname(__file__), 'testdata', 'test-exchange-rates-1.csv')
 TESTDATA_DATA_FILE_2 = os.path.join(os.path.dirname(__file__), 'testdata', 'test-exchange-rates-2.csv')
@@ -87,3 +95,443 @@ class TestExchangeRates(TestCase):
         self.assertEqual('test-file-1', source.source_id)
         self.assertEqual('short description', source.short_description)
         self.assertEqual('long description', source.long_description)
+
+    def test_identity_exchange_rate(self):
+        rate = self.exchange_rates.get_exchange_rate('EUR', 'EUR', datetime(2018, 5, 10, tzinfo=UTC))
+
+        self.assertEqual(Decimal('1'), rate.rate)
+        self.assertEqual(None, rate.timestamp)
+        self.assertEqual('implicit', rate.source.source_id)
+        self.assertIs(rate, self.exchange_rates.get_exchange_rate('EUR', 'EUR', datetime(2018, 6, 1, tzinfo=UTC)))
+        self.assertIsNot(rate, self.exchange_rates.get_exchange_rate('USD', 'USD', datetime(2018, 6, 1, tzinfo=UTC)))
+
+    def test_implicit_exchange_rate_interned(self):
+        timestamp = datetime(2018, 5, 10, tzinfo=UTC)
+        rate = self.exchange_rates.get_implicit_exchange_rate('BTC', 'EUR', Decimal('8000'), timestamp)
+
+        self.assertIs(rate, self.exchange_rates.get_implicit_exchange_rate('BTC', 'EUR', Decimal('8000.00'), timestamp))
+        self.assertIsNot(rate, self.exchange_rates.get_implicit_exchange_rate('BTC', 'EUR', Decimal('8001'), timestamp))
+        self.assertIsNot(rate, self.exchange_rates.get_implicit_exchange_rate('EUR', 'BTC', Decimal('8000'), timestamp))
+        self.assertIsNot(rate, self.exchange_rates.get_implicit_exchange_rate('BTC', 'EUR', Decimal('8000'),
+                                                                             datetime(2018, 5, 11, tzinfo=UTC)))
+
+    def test_currencies(self):
+        exchange_rates = ExchangeRates(self.configuration, {'EUR', 'USD', 'BTC'})
+
+        rate = exchange_rates.get_exchange_rate('EUR', 'USD', datetime(2018, 5, 10, tzinfo=UTC))
+        self.assertEqual(Decimal('1.1878'), rate.rate)
+        self.assertEqual(None, exchange_rates.get_exchange_rate('EUR', 'JPY', datetime(2018, 5, 10, tzinfo=UTC)))
+        self.assertIsNotNone(self.exchange_rates.get_exchange_rate('EUR', 'JPY', datetime(2018, 5, 10, tzinfo=UTC)))
+
+    def test_get_projected_columns(self):
+        header = ['Date', 'USD', 'JPY', 'BGN', '']
+
+        self.assertListEqual([(1, 'USD'), (2, 'JPY'), (3, 'BGN')], get_projected_columns(header, None))
+        self.assertListEqual([(1, 'USD'), (3, 'BGN')], get_projected_columns(header, {'BGN', 'EUR', 'USD'}))
+        self.assertListEqual([], get_projected_columns(header, {'EUR'}))
+
+
+class TestExchangeRatesCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.directory.name, 'cache.sqlite')
+        self.configuration = Configuration.from_string(f"""
+
+          tax-year: 2018
+          query-exchange-rate-apis: True
+          exchange-rate-cache:
+            file: '{self.cache_file}'
+
+        """)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_cryptocompare_from_cache(self):
+        """
+        Asserts that no query is made if the cache covers the whole tax year.
+        """
+
+        cache = ExchangeRateCache(self.cache_file, 0)
+        cache.put_all('cryptocompare', 'BTC', 'EUR',
+                      {day: Decimal(day.month) for day in get_days(date(2018, 1, 1), date(2019, 1, 2))})
+        cache.close()
+
+        exchange_rates = ExchangeRates(self.configuration)
+
+        with mock.patch('src.ExchangeRates.price.get_historical_data') as get_historical_data:
+            rate = exchange_rates.get_exchange_rate('BTC', 'EUR', datetime(2018, 5, 10, 12, tzinfo=UTC))
+            get_historical_data.assert_not_called()
+
+        self.assertEqual(Decimal('5'), rate.rate)
+        self.assertEqual(datetime(2018, 5, 10, tzinfo=UTC), rate.timestamp)
+        self.assertEqual('cryptocompare', rate.source.source_id)
+
+    def test_cryptocompare_cache_incomplete(self):
+        """
+        Asserts that the API is queried (and the result cached) if the cache does not cover the tax year.
+        """
+
+        result = [{'time': '2018-05-10 00:00:00', 'close': 7600.5}]
+
+        exchange_rates = ExchangeRates(self.configuration)
+
+        with mock.patch('src.ExchangeRates.price.get_historical_data', return_value=result):
+            rate = exchange_rates.get_exchange_rate('BTC', 'EUR', datetime(2018, 5, 10, 12, tzinfo=UTC))
+
+        self.assertEqual(Decimal('7600.5'), rate.rate)
+
+        cache = ExchangeRateCache(self.cache_file, 0)
+        self.assertEqual(Decimal('7600.5'), cache.get('cryptocompare', 'BTC', 'EUR', date(2018, 5, 10)))
+        cache.close()
+
+    def test_cryptocompare_gaps_from_cache(self):
+        """
+        Asserts that a pair is not queried again if its history has gaps, because the queried range is cached.
+        """
+
+        result = [{'time': '2018-05-10 00:00:00', 'close': 7600.5}]
+
+        with ExchangeRates(self.configuration) as exchange_rates, \
+                mock.patch('src.ExchangeRates.price.get_historical_data', return_value=result):
+            exchange_rates.get_exchange_rate('BTC', 'EUR', datetime(2018, 5, 10, 12, tzinfo=UTC))
+
+        with ExchangeRates(self.configuration) as exchange_rates, \
+                mock.patch('src.ExchangeRates.price.get_historical_data') as get_historical_data:
+            rate = exchange_rates.get_exchange_rate('BTC', 'EUR', datetime(2018, 5, 11, 12, tzinfo=UTC))
+            get_historical_data.assert_not_called()
+
+        self.assertEqual(Decimal('7600.5'), rate.rate)
+
+
+class RatesApiStandIn(BaseHTTPRequestHandler):
+    """
+    Serves the ratesapi.io history endpoint with two fixed rates and records the requests.
+    """
+
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        RatesApiStandIn.requests.append((url.path, parse_qs(url.query)))
+        body = json.dumps({
+            'base': 'USD',
+            'rates': {
+                '2018-05-10': {'EUR': 0.84},
+                '2018-05-11': {'EUR': 0.83},
+            }
+        }).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestExchangeRatesFiatBulk(TestCase):
+
+    def setUp(self):
+        RatesApiStandIn.requests = []
+        self.server = HTTPServer(('127.0.0.1', 0), RatesApiStandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.configuration = Configuration.from_string(f"""
+
+          tax-year: 2018
+          query-exchange-rate-apis: True
+          query-fiat-exchange-rates-in-bulk: True
+          ratesapi-url: 'http://127.0.0.1:{self.server.server_address[1]}/api'
+          exchange-rate-cache:
+            file: '{os.path.join(self.directory.name, 'cache.sqlite')}'
+
+        """)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_prefetch(self):
+        """
+        Asserts that the date range of all requests for a pair is queried once and lookups are served from memory.
+        """
+
+        exchange_rates = ExchangeRates(self.configuration)
+        exchange_rates.prefetch_exchange_rates([
+            ('USD', 'EUR', datetime(2018, 5, 11, 9, tzinfo=UTC)),
+            ('USD', 'EUR', datetime(2018, 5, 10, 18, tzinfo=UTC)),
+            ('EUR', 'EUR', datetime(2018, 5, 10, 18, tzinfo=UTC)),
+        ])
+
+        self.assertEqual(1, len(RatesApiStandIn.requests))
+        path, query = RatesApiStandIn.requests[0]
+        self.assertEqual('/api/history', path)
+        self.assertEqual(['2018-05-06'], query['start_at'])
+        self.assertEqual(['2018-05-15'], query['end_at'])
+        self.assertEqual(['USD'], query['base'])
+        self.assertEqual(['EUR'], query['symbols'])
+
+        with mock.patch('src.ExchangeRates.CurrencyRates') as currency_rates:
+            rate = exchange_rates.get_exchange_rate('USD', 'EUR', datetime(2018, 5, 10, 9, tzinfo=UTC))
+            currency_rates.assert_not_called()
+
+        self.assertEqual(Decimal('0.84'), rate.rate)
+        self.assertEqual(datetime(2018, 5, 10, tzinfo=UTC), rate.timestamp)
+        self.assertEqual('ratesapi', rate.source.source_id)
+
+    def test_prefetch_from_cache(self):
+        """
+        Asserts that a second run is served from the local cache.
+        """
+
+        requests = [('USD', 'EUR', datetime(2018, 5, 10, 18, tzinfo=UTC))]
+
+        ExchangeRates(self.configuration).prefetch_exchange_rates(requests)
+        exchange_rates = ExchangeRates(self.configuration)
+        exchange_rates.prefetch_exchange_rates(requests)
+
+        self.assertEqual(1, len(RatesApiStandIn.requests))
+        rate = exchange_rates.get_exchange_rate('USD', 'EUR', datetime(2018, 5, 11, 9, tzinfo=UTC))
+        self.assertEqual(Decimal('0.83'), rate.rate)
+
+
+class TestExchangeRatesPrefetch(TestCase):
+
+    def setUp(self):
+        self.exchange_rates = ExchangeRates(Configuration.from_string("""
+
+          tax-year: 2018
+          query-exchange-rate-apis: True
+          query-fiat-exchange-rates-in-bulk: True
+          exchange-rate-api-rate-limits:
+            cryptocompare: 1000
+          exchange-rate-files:
+
+            - id: 'test-file-1'
+              file: '${FILENAME1}'
+              short-description: 'short description'
+              long-description: 'long description'
+              base-currency: 'USD'
+              delimiter: ','
+              quotechar: '"'
+              encoding: 'utf8'
+              empty-marker: 'N/A'
+
+        """.replace('${FILENAME1}', TESTDATA_DATA_FILE_1)))
+
+    def test_plan_queries(self):
+        queries = self.exchange_rates.plan_queries([
+            ('BTC', 'EUR', datetime(2018, 3, 1, tzinfo=UTC)),
+            ('BTC', 'EUR', datetime(2018, 9, 1, tzinfo=UTC)),
+            ('ETH', 'EUR', datetime(2018, 3, 1, tzinfo=UTC)),
+            ('EUR', 'USD', datetime(2018, 3, 10, tzinfo=UTC)),
+            ('EUR', 'USD', datetime(2018, 3, 1, tzinfo=UTC)),
+            ('EUR', 'EUR', datetime(2018, 3, 1, tzinfo=UTC)),
+            ('USD', 'JPY', datetime(2018, 3, 1, tzinfo=UTC)),  # in file
+        ])
+
+        self.assertListEqual([
+            ('cryptocompare', 'BTC', 'EUR', date(2018, 1, 1), date(2019, 1, 1)),
+            ('cryptocompare', 'ETH', 'EUR', date(2018, 1, 1), date(2019, 1, 1)),
+            ('ratesapi', 'EUR', 'USD', date(2018, 2, 25), date(2018, 3, 14)),
+        ], queries)
+
+    def test_prefetch_concurrent(self):
+        """
+        Asserts that all planned queries are executed and their results are available from memory.
+        """
+
+        def get_historical_data(base_currency, quote_currency, *args, **kwargs):
+            return [{'time': '2018-05-10 00:00:00', 'close': 100 if base_currency == 'ETH' else 1000}]
+
+        with mock.patch('src.ExchangeRates.price.get_historical_data', side_effect=get_historical_data) as query:
+            self.exchange_rates.prefetch_exchange_rates([
+                ('BTC', 'EUR', datetime(2018, 5, 10, tzinfo=UTC)),
+                ('ETH', 'EUR', datetime(2018, 5, 10, tzinfo=UTC)),
+            ])
+            self.assertEqual(2, query.call_count)
+
+            btc = self.exchange_rates.get_exchange_rate('BTC', 'EUR', datetime(2018, 5, 10, tzinfo=UTC))
+            eth = self.exchange_rates.get_exchange_rate('ETH', 'EUR', datetime(2018, 5, 10, tzinfo=UTC))
+            self.assertEqual(2, query.call_count)
+
+        self.assertEqual(Decimal('1000'), btc.rate)
+        self.assertEqual(Decimal('100'), eth.rate)
+
+
+class TestExchangeRatesTriangulation(TestCase):
+
+    def setUp(self):
+        document = TESTDATA_CONFIGURATION.replace('query-exchange-rate-apis: False',
+                                                  'query-exchange-rate-apis: False\n  triangulate-exchange-rates: True')
+        document = document.replace('${FILENAME1}', TESTDATA_DATA_FILE_1)
+        document = document.replace('${FILENAME2}', TESTDATA_DATA_FILE_2)
+        self.exchange_rates = ExchangeRates(Configuration.from_string(document))
+
+    def test_cross_rate(self):
+        trade_time = datetime(2018, 5, 10, 6, tzinfo=UTC)
+        self.exchange_rates.get_implicit_exchange_rate('OMG', 'EUR', Decimal('8'), trade_time)
+
+        rate = self.exchange_rates.get_exchange_rate('OMG', 'USD', datetime(2018, 5, 10, 12, tzinfo=UTC))
+
+        self.assertEqual('OMG', rate.base_currency)
+        self.assertEqual('USD', rate.quote_currency)
+        self.assertEqual(Decimal('8') * Decimal('1.1878'), rate.rate)
+        self.assertEqual(datetime(2018, 5, 10, tzinfo=UTC), rate.timestamp)  # farthest hop
+        self.assertEqual('cross:OMG/EUR/USD', rate.source.source_id)
+
+        rate = self.exchange_rates.get_exchange_rate('USD', 'OMG', datetime(2018, 5, 10, 12, tzinfo=UTC))
+        self.assertEqual('USD', rate.base_currency)
+        self.assertAlmostEqual(Decimal('8') * Decimal('1.1878'), rate.get_rate('OMG', 'USD'), places=6)
+
+    def test_implicit_rates_not_used_directly(self):
+        self.exchange_rates.get_implicit_exchange_rate('OMG', 'EUR', Decimal('8'), datetime(2018, 5, 10, tzinfo=UTC))
+
+        # a direct pair is resolved from the implicit rates only as a (one hop) conversion path
+        rate = self.exchange_rates.get_exchange_rate('OMG', 'EUR', datetime(2018, 5, 10, tzinfo=UTC))
+        self.assertEqual(Decimal('8'), rate.rate)
+        self.assertEqual('cross:OMG/EUR', rate.source.source_id)
+
+    def test_no_path(self):
+        self.assertEqual(None, self.exchange_rates.get_exchange_rate('OMG', 'USD', datetime(2018, 5, 10, tzinfo=UTC)))
+
+    def test_no_query_for_cross_rate(self):
+        document = TESTDATA_CONFIGURATION.replace('query-exchange-rate-apis: False',
+                                                  'query-exchange-rate-apis: True\n  triangulate-exchange-rates: True')
+        document = document.replace('${FILENAME1}', TESTDATA_DATA_FILE_1)
+        document = document.replace('${FILENAME2}', TESTDATA_DATA_FILE_2)
+        exchange_rates = ExchangeRates(Configuration.from_string(document))
+        trade_time = datetime(2018, 5, 10, tzinfo=UTC)
+        exchange_rates.get_implicit_exchange_rate('OMG', 'ETH', Decimal('0.01'), trade_time)
+        exchange_rates.get_implicit_exchange_rate('ETH', 'EUR', Decimal('600'), trade_time)
+
+        requests = [('OMG', 'EUR', trade_time), ('ETH', 'USD', trade_time)]
+        self.assertListEqual([], exchange_rates.plan_queries(requests))
+
+        with mock.patch('src.ExchangeRates.price.get_historical_data') as query:
+            exchange_rates.prefetch_exchange_rates(requests)
+            rate = exchange_rates.get_exchange_rate('OMG', 'EUR', trade_time)
+            self.assertEqual(0, query.call_count)
+
+        self.assertEqual(Decimal('6'), rate.rate)
+        self.assertEqual('cross:OMG/ETH/EUR', rate.source.source_id)
+
+    def test_stale_hop(self):
+        document = TESTDATA_CONFIGURATION.replace('query-exchange-rate-apis: False',
+                                                  'query-exchange-rate-apis: True\n  triangulate-exchange-rates: True')
+        document = document.replace('${FILENAME1}', TESTDATA_DATA_FILE_1)
+        document = document.replace('${FILENAME2}', TESTDATA_DATA_FILE_2)
+        exchange_rates = ExchangeRates(Configuration.from_string(document))
+        trade_time = datetime(2018, 5, 10, tzinfo=UTC)
+        exchange_rates.get_implicit_exchange_rate('OMG', 'ETH', Decimal('0.01'), datetime(2018, 1, 10, tzinfo=UTC))
+        exchange_rates.get_implicit_exchange_rate('ETH', 'EUR', Decimal('600'), trade_time)
+
+        # the OMG/ETH rate is months old: the pair is queried instead of composed
+        self.assertListEqual([('cryptocompare', 'OMG', 'EUR', date(2018, 1, 1), date(2019, 1, 1))],
+                             exchange_rates.plan_queries([('OMG', 'EUR', trade_time)]))
+
+        with mock.patch('src.ExchangeRates.price.get_historical_data',
+                        return_value=[{'time': '2018-05-10 00:00:00', 'close': 5}]) as query:
+            rate = exchange_rates.get_exchange_rate('OMG', 'EUR', trade_time)
+            self.assertEqual(1, query.call_count)
+
+        self.assertEqual(Decimal('5'), rate.rate)
+        self.assertEqual('cryptocompare', rate.source.source_id)
+
+
+@skipUnless(is_numpy_available(), 'numpy is not installed')
+class TestExchangeRatesColumnar(TestCase):
+
+    def create_exchange_rates(self, backend):
+        document = TESTDATA_CONFIGURATION.replace('query-exchange-rate-apis: False',
+                                                  'query-exchange-rate-apis: False\n'
+                                                  f'  exchange-rate-backend: {backend}')
+        document = document.replace('${FILENAME1}', TESTDATA_DATA_FILE_1)
+        document = document.replace('${FILENAME2}', TESTDATA_DATA_FILE_2)
+        return ExchangeRates(Configuration.from_string(document))
+
+    def test_get_exchange_rates_same_as_objects(self):
+        requests = [
+            ('EUR', 'USD', datetime(2000, 1, 1, tzinfo=UTC)),
+            ('EUR', 'USD', datetime(2018, 5, 10, 12, tzinfo=UTC)),
+            ('EUR', 'USD', datetime(2018, 5, 10, 12, 0, 1, tzinfo=UTC)),
+            ('USD', 'EUR', datetime(2018, 5, 11, tzinfo=UTC)),
+            ('GBP', 'EUR', datetime(2018, 5, 11, tzinfo=UTC)),
+            ('EUR', 'EUR', datetime(2018, 5, 11, tzinfo=UTC)),
+            ('OMG', 'EUR', datetime(2018, 5, 11, tzinfo=UTC)),
+        ]
+
+        expected = self.create_exchange_rates('objects').get_exchange_rates(requests)
+        actual = self.create_exchange_rates('columnar').get_exchange_rates(requests)
+
+        self.assertEqual(len(expected), len(actual))
+        for (expected_exchange_rate, expected_rate), (exchange_rate, rate) in zip(expected, actual):
+            self.assertEqual(expected_rate, rate)
+            if expected_exchange_rate is None:
+                self.assertIsNone(exchange_rate)
+            else:
+                self.assertEqual(expected_exchange_rate.timestamp, exchange_rate.timestamp)
+                self.assertEqual(expected_exchange_rate.rate, exchange_rate.rate)
+
+        self.assertEqual((None, None), actual[-1])
+
+    def test_store_reused(self):
+        exchange_rates = self.create_exchange_rates('columnar')
+        requests = [('EUR', 'USD', datetime(2018, 5, 10, 12, tzinfo=UTC))]
+
+        with mock.patch('src.ExchangeRates.ColumnarRateStore', wraps=ColumnarRateStore) as store:
+            exchange_rates.get_exchange_rates(requests)
+            exchange_rates.get_exchange_rates(requests)
+            self.assertEqual(1, store.call_count)
+
+            exchange_rates.get_implicit_exchange_rate('BTC', 'EUR', Decimal('5000'), requests[0][2])  # not in store
+            exchange_rates.get_exchange_rates(requests)
+            self.assertEqual(1, store.call_count)
+
+            exchange_rates._get_series('EUR', 'USD').put_raw(datetime(2018, 5, 10, 11, tzinfo=UTC), Decimal('2'),
+                                                             None)
+            exchange_rates.get_exchange_rates(requests)
+            self.assertEqual(2, store.call_count)
+
+    def test_invalid_backend(self):
+        with self.assertRaises(Error):
+            self.create_exchange_rates('unknown')
+
+
+class TestExchangeRatesSnapshot(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        document = TESTDATA_CONFIGURATION.replace('query-exchange-rate-apis: False',
+                                                  f'query-exchange-rate-apis: False\n'
+                                                  f'  exchange-rate-snapshot-dir: \'{self.directory.name}\'')
+        document = document.replace('${FILENAME1}', TESTDATA_DATA_FILE_1)
+        document = document.replace('${FILENAME2}', TESTDATA_DATA_FILE_2)
+        self.configuration = Configuration.from_string(document)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_same_as_files(self):
+        expected = ExchangeRates(Configuration.from_string(
+            TESTDATA_CONFIGURATION.replace('${FILENAME1}', TESTDATA_DATA_FILE_1).replace('${FILENAME2}',
+                                                                                         TESTDATA_DATA_FILE_2)))
+
+        for _ in range(2):  # compile, then map the existing snapshots
+
+            exchange_rates = ExchangeRates(self.configuration, {'EUR', 'USD', 'JPY'})
+            self.assertEqual(2, len(os.listdir(self.directory.name)))
+
+            for quote_currency in ('USD', 'JPY'):
+                for timestamp in (datetime(2018, 5, 10, 12, tzinfo=UTC), datetime(2018, 5, 10, 12, 0, 1, tzinfo=UTC)):
+                    expected_rate = expected.get_exchange_rate('EUR', quote_currency, timestamp)
+                    rate = exchange_rates.get_exchange_rate('EUR', quote_currency, timestamp)
+                    self.assertEqual(expected_rate.rate, rate.rate)
+                    self.assertEqual(expected_rate.timestamp, rate.timestamp)
+                    self.assertEqual(expected_rate.source.source_id, rate.source.source_id)
+
+            self.assertEqual(None, exchange_rates.get_exchange_rate('EUR', 'BGN', datetime(2018, 5, 10, tzinfo=UTC)))
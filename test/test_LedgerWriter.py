@@ -0,0 +1,107 @@
+import os
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase, skipUnless
+
+from dateutil.tz import UTC
+
+from src.BalanceQueue import BalanceQueue, QueueType
+from src.LedgerWriter import LedgerWriter, is_pyarrow_available, get_buy_items_file
+from src.bo.ExchangeRate import ExchangeRate
+from src.bo.ExchangeRateSource import ExchangeRateSource
+from src.bo.Order import Order
+from src.bo.Transaction import TransactionType
+from test.utilities.TradeCreator import TradeCreator
+
+if is_pyarrow_available():
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+
+@skipUnless(is_pyarrow_available(), 'pyarrow is not installed')
+class TestLedgerWriter(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.directory.name, 'ledger.parquet')
+
+        trade_creator = TradeCreator('EUR', {'BTC': '1000'})
+        source = ExchangeRateSource('test', 'test source', 'test source')
+        self.order = Order('1', 'kraken')
+        self.order.id = 7
+
+        self.trades = []
+        for day, price, sell, buy in ((1, '1000', ['EUR', '1000'], ['BTC', '1']),
+                                      (2, '2000', ['EUR', '2000'], ['BTC', '1']),
+                                      (3, '3000', ['BTC', '1.5'], ['EUR', '4500'])):
+            trade_creator.set_tax_exchange_rate('BTC', price)
+            trade = trade_creator.create_trade({'sell': sell, 'buy': buy, 'fee': ['EUR', '0.5']})
+            trade.id = day
+            trade.timestamp = datetime(2017, 1, day, tzinfo=UTC)
+            for transaction in trade.transactions:
+                rate = Decimal(price) if transaction.currency == 'BTC' else Decimal(1)
+                transaction.exchange_rate = ExchangeRate(transaction.currency, 'EUR', rate, trade.timestamp, source)
+            self.trades.append(trade)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, file_format):
+        queue = BalanceQueue(QueueType.FIFO, True)
+        with LedgerWriter(self.file, 'EUR', file_format) as writer:
+            for trade in self.trades:
+                writer.write_trade(self.order, trade, queue.trade(trade))
+
+    def test_parquet(self):
+        self.write('parquet')
+
+        trades = pq.read_table(self.file)
+        self.assertEqual(3, trades.num_rows)
+        self.assertListEqual([1, 2, 3], trades.column('trade_id').to_pylist())
+        self.assertListEqual(['EUR', 'EUR', 'BTC'], trades.column('sell_currency').to_pylist())
+        self.assertEqual(Decimal('1.5'), trades.column('sell_amount')[2].as_py())
+        self.assertEqual(Decimal('3000'), trades.column('sell_exchange_rate')[2].as_py())
+        self.assertEqual('test source', trades.column('sell_exchange_rate_source')[2].as_py())
+        self.assertEqual(datetime(2017, 1, 3, tzinfo=UTC), trades.column('timestamp')[2].as_py())
+        self.assertEqual(Decimal('2000'), trades.column('cost')[2].as_py())
+        self.assertEqual(Decimal('4500'), trades.column('proceeds')[2].as_py())
+        self.assertEqual(Decimal('2498.75'), trades.column('pl')[2].as_py())  # fees: 0.5 + 0.5 + 0.25
+
+        buy_items = pq.read_table(get_buy_items_file(self.file)).to_pylist()
+        sale = [item for item in buy_items if item['row'] == 2]
+        self.assertListEqual([1, 2], [item['buy_trade_id'] for item in sale])
+        self.assertListEqual([Decimal('1'), Decimal('0.5')], [item['amount'] for item in sale])
+        self.assertListEqual([Decimal('1000'), Decimal('1000')], [item['cost'] for item in sale])
+
+    def test_arrow(self):
+        self.write('arrow')
+
+        with ipc.open_file(self.file) as reader:
+            trades = reader.read_all()
+        self.assertEqual(3, trades.num_rows)
+        self.assertEqual('EUR', trades.schema.metadata[b'tax-currency'].decode())
+
+        with ipc.open_file(get_buy_items_file(self.file)) as reader:
+            buy_items = reader.read_all()
+        self.assertListEqual([None, None, 1, 2], buy_items.column('buy_trade_id').to_pylist())
+
+    def test_batches(self):
+        queue = BalanceQueue(QueueType.FIFO, True)
+        with LedgerWriter(self.file, 'EUR') as writer:
+            writer._flush_trades()  # nothing to flush
+            for trade in self.trades:
+                writer.write_trade(self.order, trade, queue.trade(trade))
+                writer._flush_trades()
+
+        self.assertEqual(3, pq.ParquetFile(self.file).metadata.num_row_groups)
+        self.assertListEqual([0, 1, 2], pq.read_table(self.file).column('row').to_pylist())
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            LedgerWriter(self.file, 'EUR', 'xlsx')
+
+    def test_transaction_without_exchange_rate(self):
+        self.trades[0].get_transaction(TransactionType.FEE).exchange_rate = None
+        self.write('parquet')
+        self.assertIsNone(pq.read_table(self.file).column('fee_exchange_rate')[0].as_py())
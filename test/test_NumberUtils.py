@@ -1,7 +1,69 @@
-from decimal import Decimal
+import random
+from decimal import Decimal, InvalidOperation
 from unittest import TestCase
 
-from src.NumberUtils import value_to_string, value_to_decimal, value_to_scaled_integer, scaled_integer_to_decimal
+from src.NumberUtils import value_to_string, value_to_decimal, value_to_scaled_integer, scaled_integer_to_decimal, \
+    divide_scaled_integers, remove_exponent, values_to_scaled_integers, scaled_integers_to_decimals
+
+
+def reference_value_to_decimal(value, precision=28):
+    """
+    The original implementation of value_to_decimal (string based), as reference.
+    """
+
+    if isinstance(value, str) or isinstance(value, int):
+        try:
+            numeric_value = Decimal(value)
+        except InvalidOperation:
+            raise ValueError(f'"{value}" is not a valid number.')
+    else:
+        numeric_value = value
+
+    return remove_exponent(Decimal('{:0.{precision}f}'.format(numeric_value, precision=precision)))
+
+
+def reference_value_to_scaled_integer(value, precision=28):
+    """
+    The original implementation of value_to_scaled_integer (string based), as reference.
+    """
+    return int('{:0.{precision}f}'.format(reference_value_to_decimal(value), precision=precision).replace('.', ''))
+
+
+def reference_scaled_integer_to_decimal(value, precision=28):
+    """
+    The original implementation of scaled_integer_to_decimal (string based), as reference.
+    """
+    return reference_value_to_decimal(value) / Decimal(pow(10, precision))
+
+
+def call(function, *args):
+    """
+    Returns the result of the function as string or the type of the exception raised, for comparisons.
+    """
+
+    try:
+        return str(function(*args))
+    except (ValueError, InvalidOperation) as e:
+        return type(e)
+
+
+def get_test_values():
+    """
+    Returns values of all supported types, with and without rounding, small and large, positive and negative.
+    """
+
+    rng = random.Random(7)
+    values = ['0', '-0', '0.5', '2.5', '-2.5', '3.251', '0.00000000005', '0.00000000015', '1E+5', '1E-30',
+              '123456789012345678.123456789012345678', '99999999999999999999999999.99', '-0.000000000049999',
+              0, 1, -1, 12345678901234567890123456, 3.251, 0.1, -2.675, 1e-12, 1e20, 123456.789]
+    for _ in range(500):
+        digits = rng.randint(1, 40)
+        places = rng.randint(0, digits)
+        coefficient = rng.randint(0, 10 ** digits - 1) * rng.choice((1, -1))
+        values.append(str(Decimal(coefficient).scaleb(-places)))
+        values.append(Decimal(coefficient).scaleb(-places))
+        values.append(coefficient / 10 ** places)
+    return values
 
 
 class TestNumberUtils(TestCase):
@@ -73,3 +135,40 @@ class TestNumberUtils(TestCase):
     def test_scaled_integer_to_decimal_round(self):
         # self.assertEqual(33, to_integer(3.25, 1))  # fail
         self.assertEqual(33, value_to_scaled_integer(3.251, 1))
+
+    def test_divide_scaled_integers(self):
+        self.assertEqual(6, divide_scaled_integers(4, 3, 2))
+        self.assertEqual(3, divide_scaled_integers(10, 1, 3))  # 3.33
+        self.assertEqual(7, divide_scaled_integers(20, 1, 3))  # 6.67
+        self.assertEqual(2, divide_scaled_integers(5, 1, 2))  # 2.5, half to even
+        self.assertEqual(4, divide_scaled_integers(7, 1, 2))  # 3.5, half to even
+        self.assertEqual(-2, divide_scaled_integers(-5, 1, 2))  # -2.5, half to even
+        self.assertEqual(-3, divide_scaled_integers(10, 1, -3))  # -3.33
+        self.assertEqual(-7, divide_scaled_integers(-20, 1, 3))  # -6.67
+
+    def test_divide_scaled_integers_same_as_decimal(self):
+        for value, numerator, denominator in ((123456789, 987654321, 1000000007), (5, 3, 7), (-1000, 17, 6)):
+            expected = (Decimal(value) * Decimal(numerator) / Decimal(denominator)).to_integral_value()
+            self.assertEqual(int(expected), divide_scaled_integers(value, numerator, denominator))
+
+    def test_same_as_reference(self):
+        for value in get_test_values():
+            for precision in (0, 1, 2, 5, 10, 28):
+                self.assertEqual(call(reference_value_to_decimal, value, precision),
+                                 call(value_to_decimal, value, precision), value)
+                self.assertEqual(call(reference_value_to_scaled_integer, value, precision),
+                                 call(value_to_scaled_integer, value, precision), value)
+
+    def test_scaled_integer_to_decimal_same_as_reference(self):
+        rng = random.Random(11)
+        values = [0, 1, -1, 10 ** 10, 3251, 10 ** 27, 10 ** 28 - 1, 10 ** 28, 32510000000000000000000000000]
+        values += [rng.randint(-10 ** 20, 10 ** 20) for _ in range(500)]
+        for value in values:
+            for precision in (0, 3, 10, 28):
+                self.assertEqual(call(reference_scaled_integer_to_decimal, value, precision),
+                                 call(scaled_integer_to_decimal, value, precision), value)
+
+    def test_batch(self):
+        self.assertListEqual([3251, None, 3251], values_to_scaled_integers(['3.251', None, 3.251], 3))
+        self.assertListEqual([33, None], values_to_scaled_integers([Decimal('3.251'), None], 1))
+        self.assertListEqual([Decimal('3.251'), None, Decimal('0')], scaled_integers_to_decimals([3251, None, 0], 3))
@@ -0,0 +1,67 @@
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase
+
+from dateutil.tz import UTC
+
+from src.BalanceQueue import BalanceQueue, QueueType
+from src.OpenPositions import get_open_positions, value_open_positions, get_open_position_row, \
+    get_open_positions_header
+from test.utilities.ExchangeRatesStandIn import ExchangeRatesStandIn
+from test.utilities.TradeCreator import TradeCreator
+
+YEAR_END = datetime(2018, 1, 1, tzinfo=UTC)
+
+
+class TestOpenPositions(TestCase):
+
+    def setUp(self):
+        trade_creator = TradeCreator('EUR', {'BTC': '0.001', 'ETH': '0.01'})
+        self.queue = BalanceQueue(QueueType.FIFO, True)
+
+        for currency, price, sell, buy, fee in (('BTC', '1000', ['EUR', '1000'], ['BTC', '1'], ['EUR', '2']),
+                                                ('BTC', '2000', ['EUR', '2000'], ['BTC', '1'], ['EUR', '4']),
+                                                ('ETH', '100', ['EUR', '300'], ['ETH', '3'], ['EUR', '0']),
+                                                ('BTC', '3000', ['BTC', '1.5'], ['EUR', '4500'], ['EUR', '0'])):
+            trade_creator.set_tax_exchange_rate(currency, price)
+            self.queue.trade(trade_creator.create_trade({'sell': sell, 'buy': buy, 'fee': fee}))
+
+    def test_get_open_positions(self):
+        positions = get_open_positions(self.queue, 'EUR')
+
+        self.assertListEqual(['BTC', 'ETH'], list(positions))  # no tax currency
+
+        btc = positions['BTC']
+        self.assertEqual(1, btc.lots)
+        self.assertEqual(Decimal('0.5'), btc.amount)
+        self.assertEqual(Decimal('1000'), btc.cost)  # half of the second lot
+        self.assertEqual(Decimal('2'), btc.buying_fees)
+        self.assertIsNone(btc.unrealised_pl)
+
+        self.assertEqual(Decimal('3'), positions['ETH'].amount)
+        self.assertEqual(Decimal('300'), positions['ETH'].cost)
+
+    def test_value_open_positions(self):
+        positions = get_open_positions(self.queue, 'EUR')
+        exchange_rates = ExchangeRatesStandIn({'BTC': '4000'})
+
+        value_open_positions(positions, exchange_rates, 'EUR', YEAR_END)
+
+        self.assertListEqual([('BTC', 'EUR', YEAR_END), ('ETH', 'EUR', YEAR_END)], exchange_rates.requests)
+        self.assertEqual(Decimal('2000'), positions['BTC'].value)
+        self.assertEqual(Decimal('998'), positions['BTC'].unrealised_pl)
+
+        self.assertIsNone(positions['ETH'].value)  # no exchange rate
+        self.assertIsNone(positions['ETH'].unrealised_pl)
+
+        header = get_open_positions_header('EUR')
+        self.assertEqual(len(header), len(get_open_position_row(positions['BTC'], 'EUR')))
+        self.assertListEqual(['-'] * 5, get_open_position_row(positions['ETH'], 'EUR')[5:])
+
+    def test_closed_position(self):
+        trade_creator = TradeCreator('EUR', {'BTC': '0.001'})
+        queue = BalanceQueue(QueueType.FIFO, True)
+        queue.trade(trade_creator.create_trade({'sell': ['EUR', '1000'], 'buy': ['BTC', '1'], 'fee': ['EUR', '0']}))
+        queue.trade(trade_creator.create_trade({'sell': ['BTC', '1'], 'buy': ['EUR', '1000'], 'fee': ['EUR', '0']}))
+
+        self.assertDictEqual({}, get_open_positions(queue, 'EUR'))
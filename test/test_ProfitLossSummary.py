@@ -0,0 +1,88 @@
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase
+
+from dateutil.tz import UTC
+
+from src.BalanceQueue import BalanceQueue, QueueType
+from src.ProfitLossSummary import create_summaries
+from src.bo.Order import Order
+from test.utilities.TradeCreator import TradeCreator
+
+
+class TestProfitLossSummary(TestCase):
+
+    def setUp(self):
+        trade_creator = TradeCreator('EUR', {'BTC': '0.001', 'ETH': '0.01'})
+        kraken = Order('1', 'kraken')
+        binance = Order('2', 'binance')
+
+        self.trades = []
+        for order, year, month, currency, price, sell, buy in (
+                (kraken, 2017, 1, 'BTC', '1000', ['EUR', '1000'], ['BTC', '1']),
+                (kraken, 2017, 2, 'ETH', '100', ['EUR', '200'], ['ETH', '2']),
+                (kraken, 2017, 3, 'BTC', '2000', ['BTC', '0.5'], ['EUR', '1000']),
+                (binance, 2017, 3, 'ETH', '150', ['ETH', '3'], ['EUR', '450']),  # 1 ETH unaccounted
+                (binance, 2018, 1, 'BTC', '3000', ['BTC', '0.5'], ['EUR', '1500'])):  # not in tax year
+            trade_creator.set_tax_exchange_rate(currency, price)
+            trade = trade_creator.create_trade({'sell': sell, 'buy': buy, 'fee': ['EUR', '0']})
+            trade.timestamp = datetime(year, month, 1, tzinfo=UTC)
+            self.trades.append((order, trade))
+
+        self.by_currency, self.by_month, self.by_exchange = create_summaries('EUR', 2017)
+        queue = BalanceQueue(QueueType.FIFO, True)
+        for order, trade in self.trades:
+            sell_info = queue.trade(trade)
+            for summary in (self.by_currency, self.by_month, self.by_exchange):
+                summary.add_trade(order, trade, sell_info)
+
+    def test_by_currency(self):
+        totals = self.by_currency.get_totals()
+
+        self.assertListEqual(['BTC', 'ETH'], list(totals))
+        self.assertEqual(1, totals['BTC']['sales'])
+        self.assertEqual(Decimal('1000'), totals['BTC']['proceeds'])
+        self.assertEqual(Decimal('500'), totals['BTC']['cost'])
+        self.assertEqual(Decimal('500'), totals['BTC']['profit / loss'])
+        self.assertEqual(Decimal('0.5'), totals['BTC']['amount sold'])
+        self.assertEqual(Decimal('0'), totals['BTC']['unaccounted amount'])
+
+        self.assertEqual(Decimal('450'), totals['ETH']['proceeds'])
+        self.assertEqual(Decimal('200'), totals['ETH']['cost'])
+        self.assertEqual(Decimal('1'), totals['ETH']['unaccounted amount'])
+        self.assertEqual(Decimal('150'), totals['ETH']['unaccounted proceeds'])
+
+    def test_by_month_and_exchange(self):
+        self.assertListEqual(['2017-03'], list(self.by_month.get_totals()))
+        self.assertEqual(2, self.by_month.get_totals()['2017-03']['sales'])
+        self.assertEqual(Decimal('1450'), self.by_month.get_totals()['2017-03']['proceeds'])
+
+        totals = self.by_exchange.get_totals()
+        self.assertListEqual(['binance', 'kraken'], list(totals))
+        self.assertEqual(Decimal('450'), totals['binance']['proceeds'])
+        self.assertEqual(Decimal('1000'), totals['kraken']['proceeds'])
+        self.assertNotIn('amount sold', totals['kraken'])
+
+    def test_get_rows(self):
+        rows = self.by_exchange.get_rows()
+
+        self.assertEqual(3, len(rows))
+        self.assertEqual(['exchange', 'sales', 'proceeds EUR'], rows[0][:3])
+        self.assertEqual(['binance', '1'], rows[1][:2])
+        self.assertEqual(len(rows[0]), len(rows[1]))
+
+    def test_edge_cases(self):
+        trade_creator = TradeCreator('EUR', {'BTC': '1000'})
+        summary = create_summaries('EUR', 2017)[2]  # by exchange
+        queue = BalanceQueue(QueueType.FIFO, True)
+
+        for exchange, sell in (('kraken', ['BTC', '1']), (None, ['BTC', '0'])):  # unaccounted, zero amount
+            trade = trade_creator.create_trade({'sell': sell, 'buy': ['EUR', '1000'], 'fee': ['EUR', '0']})
+            trade.timestamp = datetime(2017, 6, 1, tzinfo=UTC)
+            summary.add_trade(Order('1', exchange), trade, queue.trade(trade))
+
+        totals = summary.get_totals()
+        self.assertListEqual(['-', 'kraken'], list(totals))
+        self.assertEqual(Decimal('0'), totals['-']['unaccounted proceeds'])
+        self.assertEqual(Decimal('1000'), totals['kraken']['unaccounted proceeds'])
+        self.assertEqual(3, len(summary.get_rows()))
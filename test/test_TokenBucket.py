@@ -0,0 +1,68 @@
+from unittest import TestCase
+
+from src.TokenBucket import TokenBucket
+
+
+class FakeTime:
+    """
+    Clock that only advances when sleeping.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket(TestCase):
+
+    def setUp(self):
+        self.time = FakeTime()
+
+    def create_bucket(self, rate, capacity=1):
+        return TokenBucket(rate, capacity, clock=self.time.clock, sleep=self.time.sleep)
+
+    def test_first_request_immediate(self):
+        self.create_bucket(0.5).acquire()
+        self.assertListEqual([], self.time.sleeps)
+
+    def test_rate(self):
+        bucket = self.create_bucket(0.5)
+        for _ in range(4):
+            bucket.acquire()
+        self.assertListEqual([2.0, 2.0, 2.0], self.time.sleeps)
+        self.assertEqual(6.0, self.time.now)
+
+    def test_refill(self):
+        bucket = self.create_bucket(1)
+        bucket.acquire()
+        self.time.now += 5  # bucket is full again, but holds one token at most
+        bucket.acquire()
+        bucket.acquire()
+        self.assertListEqual([1.0], self.time.sleeps)
+
+    def test_burst(self):
+        bucket = self.create_bucket(1, capacity=3)
+        for _ in range(4):
+            bucket.acquire()
+        self.assertListEqual([1.0], self.time.sleeps)
+
+    def test_reservations_queue_up(self):
+        """
+        Asserts that concurrent callers (which sleep outside the lock) are spaced out by the rate.
+        """
+
+        bucket = TokenBucket(2, clock=self.time.clock, sleep=self.time.sleeps.append)
+        for _ in range(3):
+            bucket.acquire()
+        self.assertListEqual([0.5, 1.0], self.time.sleeps)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, TokenBucket, 0)
+        self.assertRaises(ValueError, TokenBucket, 1, 0)
@@ -0,0 +1,65 @@
+from decimal import Decimal
+from functools import partial
+from unittest import TestCase
+
+from src.BalanceQueue import BalanceQueue, QueueType
+from src.TradePartitions import UnionFind, partition_trades, calculate_sell_infos
+from src.bo.Order import Order
+from test.utilities.TradeCreator import TradeCreator
+
+
+class TestTradePartitions(TestCase):
+
+    def setUp(self):
+        trade_creator = TradeCreator('EUR', {'BTC': '1000', 'ETH': '100', 'USD': '0.8', 'XRP': '0.5'})
+        kraken = Order('1', 'kraken')
+        bitstamp = Order('2', 'bitstamp')
+
+        self.trades = []
+        for order, sell, buy in ((kraken, ['EUR', '1000'], ['BTC', '1']),
+                                 (bitstamp, ['USD', '100'], ['XRP', '160']),
+                                 (kraken, ['BTC', '0.5'], ['ETH', '5']),
+                                 (bitstamp, ['XRP', '100'], ['USD', '62.5']),
+                                 (bitstamp, ['BTC', '0.1'], ['EUR', '100']),
+                                 (kraken, ['ETH', '2'], ['EUR', '200'])):
+            trade = trade_creator.create_trade({'sell': sell, 'buy': buy, 'fee': ['EUR', '0.5']})
+            self.trades.append((order, trade))
+
+    def test_union_find(self):
+        components = UnionFind()
+        components.union('a', 'b')
+        components.union('c', 'd')
+        components.union('b', 'd')
+        components.find('e')
+
+        self.assertEqual(components.find('a'), components.find('c'))
+        self.assertNotEqual(components.find('a'), components.find('e'))
+
+    def test_partition(self):
+        self.assertListEqual([[0, 2, 4, 5], [1, 3]], partition_trades(self.trades))
+
+    def test_partition_per_exchange(self):
+        self.assertListEqual([[0, 2, 5], [1, 3], [4]], partition_trades(self.trades, pool_per_exchange=True))
+
+    def test_calculate_sell_infos(self):
+        create_queue = partial(BalanceQueue, QueueType.FIFO, True)
+
+        queue = create_queue()
+        expected = [queue.trade(trade) for order, trade in self.trades]
+
+        for workers in (None, 2):
+            sell_infos = calculate_sell_infos(self.trades, create_queue, workers=workers)
+
+            self.assertListEqual([sell_info.pl for sell_info in expected], [sell_info.pl for sell_info in sell_infos])
+            for (order, trade), sell_info, expected_sell_info in zip(self.trades, sell_infos, expected):
+                self.assertIs(trade, sell_info.sell_trade)
+                self.assertListEqual([item.trade for item in expected_sell_info.buy_items],
+                                     [item.trade for item in sell_info.buy_items])
+
+    def test_calculate_sell_infos_per_exchange(self):
+        sell_infos = calculate_sell_infos(self.trades, partial(BalanceQueue, QueueType.FIFO, True),
+                                          pool_per_exchange=True, workers=2)
+
+        # the BTC sold on bitstamp was bought on kraken, so it is unaccounted on bitstamp
+        self.assertListEqual([None], [item.trade for item in sell_infos[4].buy_items])
+        self.assertEqual(Decimal('99.5'), sell_infos[4].pl)
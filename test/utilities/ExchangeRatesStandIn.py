@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from src.bo.ExchangeRate import ExchangeRate
+from src.bo.ExchangeRateSource import ExchangeRateSource
+
+
+class ExchangeRatesStandIn:
+    """
+    Can be used instead of ExchangeRates in unit tests: returns the same rate for a currency at any time,
+    and records the requests.
+    """
+
+    def __init__(self, rates):
+        """
+        :param rates: dictionary currency -> rate to the quote currency of the requests (no rate for other currencies)
+        """
+
+        self.rates = rates
+        self.requests = []
+        self.source = ExchangeRateSource('test', 'test source', 'test source')
+
+    def get_exchange_rates(self, requests):
+        """
+        See ExchangeRates.get_exchange_rates.
+        """
+
+        self.requests.extend(requests)
+        results = []
+        for base_currency, quote_currency, timestamp in requests:
+            if base_currency not in self.rates:
+                results.append((None, None))
+                continue
+            rate = Decimal(self.rates[base_currency])
+            results.append((ExchangeRate(base_currency, quote_currency, rate, timestamp, self.source), rate))
+        return results